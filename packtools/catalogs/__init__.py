@@ -59,6 +59,12 @@ default_catalog = {
         'CURRENTLY_SUPPORTED_VERSIONS': os.environ.get(
             'PACKTOOLS_SUPPORTED_SPS_VERSIONS', 'sps-1.8:sps-1.9').split(':'),
 
+        # Directory where the validation XSLTs compiled from Schematron schemas
+        # are persisted across processes. The cache is disabled unless it is
+        # set.
+        'SCHEMATRON_CACHE_DIR': os.environ.get(
+            'PACKTOOLS_SCHEMATRON_CACHE_DIR') or None,
+
         'ALLOWED_PUBLIC_IDS': (
             '-//NLM//DTD JATS (Z39.96) Journal Publishing DTD v1.0 20120330//EN',
             '-//NLM//DTD JATS (Z39.96) Journal Publishing DTD v1.1 20151215//EN',
@@ -5,16 +5,39 @@ import itertools
 import json
 
 import plumber
+from lxml import etree
 
 from packtools.style_errors import StyleError
 
 LOGGER = logging.getLogger(__name__)
 
 
-def ISO3166_CODES_SET():
+_ISO3166_CODES_SET = None
+
+
+def reload_iso3166_codes():
+    """Reads the ISO 3166 alpha-2 codes from the catalog and replaces the
+    lookup shared by all the checks.
+    """
+    global _ISO3166_CODES_SET
+
     from . import ISO3166_CODES
     with open(ISO3166_CODES) as f:
-        return set(json.load(f))
+        _ISO3166_CODES_SET = frozenset(json.load(f))
+
+    return _ISO3166_CODES_SET
+
+
+def ISO3166_CODES_SET():
+    """Returns the immutable set of ISO 3166 alpha-2 codes.
+
+    The codes are read once and reused until :func:`reload_iso3166_codes` is
+    called.
+    """
+    if _ISO3166_CODES_SET is None:
+        return reload_iso3166_codes()
+
+    return _ISO3166_CODES_SET
 
 
 # --------------------------------
@@ -45,6 +68,128 @@ def StyleCheckingPipeline():
     return plumber.Pipeline(setup, funding_group, doctype, country_code, teardown)
 
 
+def FusedStyleCheckingPipeline(*extra_checks):
+    """Factory for style checking pipelines that run all the checks during a
+    single traversal of the document. See :func:`walk`.
+
+    Produces the same errors as :func:`StyleCheckingPipeline`. It pays off
+    when more checks are plugged in, through ``extra_checks`` or the
+    ``packtools_checks`` entry point, since the cost of the traversal is
+    shared by all of them.
+
+    :param extra_checks: subclasses of :class:`ElementCheck`.
+    """
+    return plumber.Pipeline(setup,
+                            walk(FundingGroupCheck, DoctypeCheck,
+                                 CountryCodeCheck, *extra_checks),
+                            teardown)
+
+
+# --------------------------------
+# Single-pass traversal
+# --------------------------------
+class ElementCheck(object):
+    """Base class for the checks run by :func:`walk`.
+
+    A new instance is created for each document. During the traversal, the
+    elements whose tag is listed in ``tags`` or that have any of the
+    attributes listed in ``attributes`` are passed to :meth:`visit`, in
+    document order. Setting ``tags`` to ``None`` matches every element.
+    After the traversal, :meth:`finalize` is called once with the errors list.
+
+    :param et: the etree instance under validation.
+    """
+    tags = ()
+    attributes = ()
+
+    def __init__(self, et):
+        self.et = et
+
+    def visit(self, elem):
+        """Inspect ``elem``, one of the elements this check is interested in.
+        """
+
+    def finalize(self, err_list):
+        """Append the errors found to ``err_list``.
+        """
+
+
+def walk(*checks):
+    """Returns a filter that runs all ``checks`` during a single traversal of
+    the document.
+
+    Elements are dispatched to the checks interested in them, so the document
+    is traversed once no matter how many checks are plugged in.
+
+    :param checks: subclasses of :class:`ElementCheck`.
+    """
+    @plumber.filter
+    def _walk(message):
+        et, err_list = message
+
+        instances = [check(et) for check in checks]
+        visitors_by_tag = {}
+        visitors_by_attribute = {}
+        visitors_of_all = []
+        for instance in instances:
+            if instance.tags is None:
+                visitors_of_all.append(instance.visit)
+                continue
+
+            for tag in instance.tags:
+                visitors_by_tag[tag] = visitors_by_tag.get(tag, ()) + (
+                        instance.visit,)
+            for attribute in instance.attributes:
+                visitors_by_attribute.setdefault(attribute, []).append(
+                        instance.visit)
+
+        if visitors_by_attribute or visitors_of_all:
+            elements = et.iter(etree.Element)
+        elif visitors_by_tag:
+            # let lxml skip the elements that no check is interested in
+            elements = et.iter(*visitors_by_tag)
+        else:
+            elements = ()
+
+        get_tag_visitors = visitors_by_tag.get
+        attribute_visitors = list(visitors_by_attribute.items())
+        for elem in elements:
+            visited = get_tag_visitors(elem.tag, ())
+            for visit in visited:
+                visit(elem)
+
+            for attribute, visitors in attribute_visitors:
+                if elem.get(attribute) is not None:
+                    for visit in visitors:
+                        # each check visits an element at most once
+                        if visit not in visited:
+                            visit(elem)
+                            visited = visited + (visit,)
+
+            for visit in visitors_of_all:
+                visit(elem)
+
+        for instance in instances:
+            instance.finalize(err_list)
+
+        return message
+
+    return _walk
+
+
+def _ancestor_tags(elem):
+    """Returns the tags of the ancestors of ``elem``, nearest first.
+    """
+    return [ancestor.tag for ancestor in elem.iterancestors()]
+
+
+def _is_within(ancestor_tags, tag):
+    """Checks if the ancestors given by ``ancestor_tags`` descend from the
+    root element through ``tag``, i.e. match the path ``tag//``.
+    """
+    return len(ancestor_tags) >= 2 and ancestor_tags[-2] == tag
+
+
 # --------------------------------
 # Funding Group check
 # --------------------------------
@@ -61,9 +206,21 @@ def funding_group(message):
     """
     et, err_list = message
 
-    funding_groups = et.findall('front//funding-group//award-id')
-    financial_disclosures = et.findall(
-            'back//fn[@fn-type="financial-disclosure"]')
+    _check_funding_group(
+            et, err_list,
+            funding_groups=et.findall('front//funding-group//award-id'),
+            financial_disclosures=et.findall(
+                'back//fn[@fn-type="financial-disclosure"]'),
+            award_ids=et.findall('front//funding-group/award-group/award-id'),
+            fn_paragraphs=et.findall(
+                'back//fn[@fn-type="financial-disclosure"]/p'),
+            ack_paragraphs=et.findall('back//ack/p'))
+
+    return message
+
+
+def _check_funding_group(et, err_list, funding_groups, financial_disclosures,
+                         award_ids, fn_paragraphs, ack_paragraphs):
     has_funding_group = bool(all([bool(elem.text)
                                   for elem in funding_groups]))
     has_financial_disclosure = bool(financial_disclosures)
@@ -84,13 +241,10 @@ def funding_group(message):
                 return u''
 
         # only the main document is relevant
-        award_ids = [elem.text for elem in et.findall(
-            'front//funding-group/award-group/award-id')
+        award_ids = [elem.text for elem in award_ids
             if elem.text is not None]
-        fn_occs = [get_text(elem) for elem in et.findall(
-            'back//fn[@fn-type="financial-disclosure"]/p')]
-        ack_occs = [get_text(elem) for elem in et.findall(
-            'back//ack/p')]
+        fn_occs = [get_text(elem) for elem in fn_paragraphs]
+        ack_occs = [get_text(elem) for elem in ack_paragraphs]
 
         def in_there(award_id, texts):
             for text in texts:
@@ -125,7 +279,65 @@ def funding_group(message):
     else:
         LOGGER.info('no contract numbers found in %s', et)
 
-    return message
+
+class FundingGroupCheck(ElementCheck):
+    """Single-pass version of :func:`funding_group`.
+    """
+    tags = ('award-id', 'fn', 'p')
+
+    def __init__(self, et):
+        super(FundingGroupCheck, self).__init__(et)
+        self.funding_groups = []
+        self.financial_disclosures = []
+        self.award_ids = []
+        self.fn_paragraphs = []
+        self.ack_paragraphs = []
+
+    def visit(self, elem):
+        if elem.tag == 'award-id':
+            ancestor_tags = _ancestor_tags(elem)
+            if not _is_within(ancestor_tags, 'front'):
+                return
+
+            # front//funding-group//award-id
+            if 'funding-group' in ancestor_tags[:-2]:
+                self.funding_groups.append(elem)
+
+            # front//funding-group/award-group/award-id
+            if (len(ancestor_tags) >= 4 and
+                    ancestor_tags[:2] == ['award-group', 'funding-group']):
+                self.award_ids.append(elem)
+
+        elif elem.tag == 'fn':
+            # back//fn[@fn-type="financial-disclosure"]
+            if (elem.get('fn-type') == 'financial-disclosure' and
+                    _is_within(_ancestor_tags(elem), 'back')):
+                self.financial_disclosures.append(elem)
+
+        else:
+            parent = elem.getparent()
+            if parent is None:
+                return
+            elif parent.tag == 'ack':
+                paragraphs = self.ack_paragraphs
+            elif (parent.tag == 'fn' and
+                    parent.get('fn-type') == 'financial-disclosure'):
+                paragraphs = self.fn_paragraphs
+            else:
+                return
+
+            # back//fn[@fn-type="financial-disclosure"]/p or back//ack/p
+            if _is_within(_ancestor_tags(elem), 'back'):
+                paragraphs.append(elem)
+
+    def finalize(self, err_list):
+        _check_funding_group(
+                self.et, err_list,
+                funding_groups=self.funding_groups,
+                financial_disclosures=self.financial_disclosures,
+                award_ids=self.award_ids,
+                fn_paragraphs=self.fn_paragraphs,
+                ack_paragraphs=self.ack_paragraphs)
 
 
 @plumber.filter
@@ -142,20 +354,51 @@ def doctype(message):
     return message
 
 
+class DoctypeCheck(ElementCheck):
+    """Single-pass version of :func:`doctype`.
+    """
+    def finalize(self, err_list):
+        doctype((self.et, err_list))
+
+
 @plumber.filter
 def country_code(message):
     """Check country codes against iso3166 alpha-2 list.
     """
     et, err_list = message
+    iso3166_codes = ISO3166_CODES_SET()
 
     elements = et.findall('//*[@country]')
     for elem in elements:
-        value = elem.attrib['country']
-        if value not in ISO3166_CODES_SET():
-            err = StyleError()
-            err.line = elem.sourceline
-            err.message = "Element '%s', attribute country: Invalid country code \"%s\"." % (elem.tag, value)
-            err_list.append(err)
+        _check_country_code(elem, iso3166_codes, err_list)
 
     return message
 
+
+def _check_country_code(elem, iso3166_codes, err_list):
+    value = elem.attrib['country']
+    if value not in iso3166_codes:
+        err = StyleError()
+        err.line = elem.sourceline
+        err.message = "Element '%s', attribute country: Invalid country code \"%s\"." % (elem.tag, value)
+        err_list.append(err)
+
+
+class CountryCodeCheck(ElementCheck):
+    """Single-pass version of :func:`country_code`.
+    """
+    attributes = ('country',)
+
+    def __init__(self, et):
+        super(CountryCodeCheck, self).__init__(et)
+        self.iso3166_codes = ISO3166_CODES_SET()
+        self.errors = []
+
+    def visit(self, elem):
+        # //*[@country] doesn't match the root element
+        if elem.getparent() is not None:
+            _check_country_code(elem, self.iso3166_codes, self.errors)
+
+    def finalize(self, err_list):
+        err_list.extend(self.errors)
+
@@ -10,6 +10,7 @@ validation behaviour and packaging functionality, respectively.
 from __future__ import unicode_literals
 import logging
 from copy import deepcopy
+from concurrent import futures
 try:
     import reprlib
 except ImportError:
@@ -164,8 +165,8 @@ class SchematronValidator(object):
         Returns a tuple comprising the validation status and the errors list.
         """
         result = self.sch.validate(xmlfile)
-        errors = [style_errors.SchematronStyleError(err, label=self.label)
-                  for err in self.sch.error_log]
+        errors = list(style_errors.iter_schematron_errors(self.sch.error_log,
+                label=self.label))
 
         return result, errors
 
@@ -362,22 +363,39 @@ class XMLValidator(object):
     def _annotate_error(self, element, error):
         """Add an annotation prior to `element`, with `error` as the content.
 
-        The annotation is a comment added prior to `element`.
+        The annotation is a comment added prior to `element`, and is returned.
 
         :param element: etree instance to be annotated.
         :param error: string of the error.
         """
-        notice_element = etree.Element('SPS-ERROR')
-        notice_element.text = error
-        element.addprevious(
-            etree.Comment(
-                ' SPS-ERROR: %s ' % error.replace("--", "- -"))
-        )
+        notice = etree.Comment(' SPS-ERROR: %s ' % error.replace("--", "- -"))
+        element.addprevious(notice)
+        return notice
+
+    def _get_error_pairs(self, doc, errors):
+        """Returns a list of tuples with the apparent element, at `doc`, and
+        the message of each error.
+        """
+        err_pairs = []
+        # the elements of all errors are located before any annotation is
+        # added to `doc`.
+        index = style_errors.ElementIndex(doc)
+        for error in errors:
+            try:
+                err_element = style_errors.get_apparent_element(
+                    error, doc, index)
+            except ValueError:
+                err_element = doc.getroot()
+
+            err_pairs.append((err_element, error.message))
+
+        return err_pairs
 
     def annotate_errors(self, fail_fast=False):
         """Add notes on all elements that have errors.
 
         The errors list is generated as the result of calling :meth:`validate_all`.
+        The notes are added to a copy of the source XML, which is returned.
         """
         status, errors = self.validate_all(fail_fast=fail_fast)
         mutating_xml = deepcopy(self.lxml)
@@ -385,20 +403,41 @@ class XMLValidator(object):
         if status is True:
             return mutating_xml
 
-        err_pairs = []
-        for error in errors:
-            try:
-                err_element = error.get_apparent_element(mutating_xml)
-            except ValueError:
-                err_element = mutating_xml.getroot()
-
-            err_pairs.append((err_element, error.message))
-
-        for el, em in err_pairs:
+        for el, em in self._get_error_pairs(mutating_xml, errors):
             self._annotate_error(el, em)
 
         return mutating_xml
 
+    def write_annotated(self, buff, fail_fast=False, encoding=None,
+                        pretty_print=True):
+        """Write the XML, with notes on all elements that have errors, to the
+        file-object `buff`.
+
+        The notes are the same added by :meth:`annotate_errors`, but the source
+        XML is not copied: they are added to it only while it is serialized,
+        and removed afterwards. For this reason, the source XML must not be
+        used concurrently.
+
+        :param buff: file-object opened in binary mode.
+        :param encoding: (optional) the default value is the XML encoding.
+        """
+        status, errors = self.validate_all(fail_fast=fail_fast)
+
+        notices = []
+        try:
+            if status is not True:
+                for el, em in self._get_error_pairs(self.lxml, errors):
+                    notices.append(self._annotate_error(el, em))
+
+            self.lxml.write(buff, pretty_print=pretty_print,
+                    encoding=encoding or self.encoding, xml_declaration=True)
+        finally:
+            # moving the notices to a detached element removes them from the
+            # tree, including those added at the document level.
+            trash = etree.Element('trash')
+            for notice in notices:
+                trash.append(notice)
+
     def __repr__(self):
         arg_names = [u'lxml', u'sps_version', u'dtd']
         arg_values = [reprlib.repr(getattr(self, arg)) for arg in arg_names]
@@ -584,35 +623,25 @@ class HTMLGenerator(object):
     def __iter__(self):
         """Iterates thru all languages and generates the HTML for each one.
         """
+        return self.generate_all(max_workers=1)
+
+    def _get_expected_languages(self):
         if self.gs_abstract:
-            languages = self.abstract_languages
+            return self.abstract_languages
         else:
-            languages = self.languages
-        for lang in languages:
-            res_html = self.generate(lang)
-            yield lang, res_html
-
-    def generate(self, lang):
-        """Generates the HTML in the language ``lang``.
+            return self.languages
 
-        :param lang: 2-digit ISO 639-1 text string.
-        """
+    def _get_main_language(self):
         main_language = self.language
         if main_language is None:
             raise exceptions.HTMLGenerationError('main document language is '
                                                  'undefined.')
+        return main_language
 
-        expected_langs = self.languages
-        if self.gs_abstract:
-            expected_langs = self.abstract_languages
-        if lang not in expected_langs:
-            raise ValueError('unrecognized language: "%s"' % lang)
-
-        is_translation = lang != main_language
-        return self.xslt(
-                self.lxml,
-                article_lang=etree.XSLT.strparam(lang),
-                is_translation=etree.XSLT.strparam(str(is_translation)),
+    def _get_shared_params(self):
+        """The XSLT params that are the same for all languages.
+        """
+        return dict(
                 bibliographic_legend=etree.XSLT.strparam(self._get_bibliographic_legend()),
                 issue_label=etree.XSLT.strparam(self._get_issue_label()),
                 styles_css_path=etree.XSLT.strparam(self.css or ''),
@@ -623,9 +652,61 @@ class HTMLGenerator(object):
                 permlink=etree.XSLT.strparam(self.permlink or ''),
                 url_article_page=etree.XSLT.strparam(self.url_article_page or ''),
                 url_download_ris=etree.XSLT.strparam(self.url_download_ris or ''),
-                gs_abstract_lang=etree.XSLT.strparam(self.gs_abstract and lang or ''),
                 output_style=etree.XSLT.strparam(self.output_style or ''),
                 math_elem_preference=etree.XSLT.strparam(self.math_elem_preference or ''),
                 math_js=etree.XSLT.strparam(self.math_js or ''),
                 design_system_static_img_path=etree.XSLT.strparam(self.design_system_static_img_path or ''),
         )
+
+    def _generate(self, lang, main_language, shared_params):
+        is_translation = lang != main_language
+        return self.xslt(
+                self.lxml,
+                article_lang=etree.XSLT.strparam(lang),
+                is_translation=etree.XSLT.strparam(str(is_translation)),
+                gs_abstract_lang=etree.XSLT.strparam(self.gs_abstract and lang or ''),
+                **shared_params
+        )
+
+    def generate(self, lang):
+        """Generates the HTML in the language ``lang``.
+
+        :param lang: 2-digit ISO 639-1 text string.
+        """
+        main_language = self._get_main_language()
+
+        if lang not in self._get_expected_languages():
+            raise ValueError('unrecognized language: "%s"' % lang)
+
+        return self._generate(lang, main_language, self._get_shared_params())
+
+    def generate_all(self, max_workers=None):
+        """Generates the HTML for all languages, concurrently.
+
+        Returns a generator of ``(lang, html)`` pairs, in the same order
+        produced by iterating over the instance. The XSLT transformations
+        run on a pool of threads, since lxml releases the GIL during them.
+
+        :param max_workers: (optional) the maximum number of threads, by
+                            default one per language. If ``1``, the
+                            languages are rendered one at a time.
+        """
+        languages = self._get_expected_languages()
+        if not languages:
+            return
+
+        main_language = self._get_main_language()
+        shared_params = self._get_shared_params()
+
+        if max_workers == 1 or len(languages) == 1:
+            for lang in languages:
+                yield lang, self._generate(lang, main_language, shared_params)
+            return
+
+        with futures.ThreadPoolExecutor(
+                max_workers=max_workers or len(languages)) as executor:
+            results = executor.map(
+                    lambda lang: self._generate(lang, main_language, shared_params),
+                    languages)
+            for lang, res_html in zip(languages, results):
+                yield lang, res_html
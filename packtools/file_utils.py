@@ -3,6 +3,7 @@ import logging
 import re
 import shutil
 import tempfile
+import threading
 
 from zipfile import ZipFile, ZIP_DEFLATED
 
@@ -76,6 +77,106 @@ def files_list_from_zipfile(zip_path):
         return zf.namelist()
 
 
+class ArchiveReader:
+    """
+    Reader of the files of a folder or of a zip file, shared by the packages
+    found in it.
+
+    Lê os arquivos de uma pasta ou de um arquivo zip. Enquanto o leitor está
+    aberto, o arquivo zip é aberto uma única vez e compartilhado pelas
+    leituras. Fora do contexto, cada leitura abre o arquivo zip.
+
+    Example:
+
+    ```
+    with ArchiveReader("package.zip") as reader:
+        for name in reader.namelist():
+            content = reader.read(name)
+    ```
+
+    Parameters
+    ----------
+    source : str
+        folder or zip file path
+    """
+
+    def __init__(self, source):
+        self._source = source
+        self._zip_file = None
+        self._namelist = None
+        self._users = 0
+        self._lock = threading.Lock()
+
+    @property
+    def source(self):
+        return self._source
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """
+        Open the zip file, which is kept open until `close` is called as many
+        times as `open`
+        """
+        with self._lock:
+            if self._users == 0 and is_zipfile(self._source):
+                self._zip_file = ZipFile(self._source)
+            self._users += 1
+
+    def close(self):
+        """
+        Close the zip file, if `close` was called as many times as `open`.
+        Calls without a matching `open` are ignored
+        """
+        with self._lock:
+            if self._users == 0:
+                return
+            self._users -= 1
+            if self._users == 0 and self._zip_file is not None:
+                self._zip_file.close()
+                self._zip_file = None
+
+    def namelist(self):
+        """
+        Return the files of the folder or of the zip file
+        """
+        if self._namelist is None:
+            if is_folder(self._source):
+                self._namelist = os.listdir(self._source)
+            elif self._zip_file is not None:
+                self._namelist = self._zip_file.namelist()
+            else:
+                self._namelist = files_list_from_zipfile(self._source)
+        return list(self._namelist)
+
+    def read(self, file_path):
+        """
+        Return the content of `file_path`
+
+        Parameters
+        ----------
+        file_path : str
+            file path, if the source is a folder, or the name of the file in
+            the zip file
+
+        Returns
+        -------
+        bytes
+        """
+        if is_folder(self._source):
+            with open(file_path, "rb") as fp:
+                return fp.read()
+        zip_file = self._zip_file
+        if zip_file is None:
+            return read_from_zipfile(self._source, file_path)
+        return zip_file.read(file_path)
+
+
 def write_file(path, source, mode="w"):
     dirname = os.path.dirname(path)
     if not os.path.isdir(dirname):
@@ -5,6 +5,8 @@ import sys
 import pkg_resources
 import logging
 import os
+import functools
+from concurrent import futures
 
 from lxml import etree
 
@@ -20,6 +22,31 @@ class XMLError(Exception):
     """
 
 
+def parse_xml(xmlpath, no_network, no_checks):
+    """Parses the XML at `xmlpath` and, unless `no_checks` is set, validates
+    it against the SciELO PS spec.
+
+    Raises :class:`XMLError` if the XML cannot be read or is not valid.
+    """
+    try:
+        parsed_xml = packtools.XML(xmlpath, no_network=no_network)
+    except IOError as e:
+        raise XMLError('Error reading %s. Make sure it is a valid file-path or URL.' % xmlpath)
+    except etree.XMLSyntaxError as e:
+        raise XMLError('Error reading %s. Syntax error: %s' % (xmlpath, e))
+
+    if not no_checks:
+        try:
+            is_valid, _ = packtools.XMLValidator.parse(parsed_xml).validate_all()
+        except ValueError as e:
+            raise XMLError('Error reading %s. %s.' % (xmlpath, e))
+
+        if not is_valid:
+            raise XMLError('Error reading %s. invalid XML.' % xmlpath)
+
+    return parsed_xml
+
+
 def get_htmlgenerator(
     xmlpath, no_network, no_checks, css, print_css, js,
     math_elem_preference, math_js,
@@ -31,8 +58,13 @@ def get_htmlgenerator(
     bootstrap_css,
     article_css,
     design_system_static_img_path,
+    parsed_xml=None,
 ):
+    """Returns an instance of ``packtools.HTMLGenerator``.
 
+    If `parsed_xml` is given, it is used as the already parsed and validated
+    XML at `xmlpath`.
+    """
     if xslt == "3.0":
         if bootstrap_css and article_css and os.path.isfile(css):
             css = os.path.dirname(css)
@@ -44,17 +76,12 @@ def get_htmlgenerator(
                 )
             )
 
-    try:
-        parsed_xml = packtools.XML(xmlpath, no_network=no_network)
-    except IOError as e:
-        raise XMLError('Error reading %s. Make sure it is a valid file-path or URL.' % xmlpath)
-    except etree.XMLSyntaxError as e:
-        raise XMLError('Error reading %s. Syntax error: %s' % (xmlpath, e))
+    if parsed_xml is None:
+        parsed_xml = parse_xml(xmlpath, no_network, no_checks)
 
     try:
-        valid_only = not no_checks
         generator = packtools.HTMLGenerator.parse(
-            parsed_xml, valid_only=valid_only, css=css,
+            parsed_xml, valid_only=False, css=css,
             print_css=print_css, js=js,
             math_elem_preference=math_elem_preference, math_js=math_js,
             permlink=permlink,
@@ -120,6 +147,8 @@ def main():
                         help='filesystem path or URL to the XML')
     parser.add_argument('--version', action='version', version=packtools_version)
     parser.add_argument('--loglevel', default='WARNING')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of worker processes used to generate the files in parallel.')
     args = parser.parse_args()
 
     logging.basicConfig(level=getattr(logging, args.loglevel.upper()))
@@ -130,16 +159,57 @@ def main():
         xslt_versions = [args.xslt]
     else:
         xslt_versions = ["2.0", "3.0"]
-    for xml in packtools.utils.flatten(args.XML):
-        LOGGER.info('starting generation of %s' % (xml,))
+    xmls = packtools.utils.flatten(args.XML)
+
+    if args.jobs <= 1:
+        generate = functools.partial(generate_document_files, args,
+                                     xslt_versions)
+        for xml in xmls:
+            generate(xml)
+    else:
+        # each process already keeps one CPU busy, so the documents are
+        # rendered without threads inside the worker processes.
+        generate = functools.partial(generate_document_files, args,
+                                     xslt_versions, max_workers=1)
+        with futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            for _ in executor.map(generate, xmls):
+                pass
+
+
+def generate_document_files(config, xslt_versions, xml, max_workers=None):
+    """Generates the HTML files of `xml` for each XSLT version.
+
+    The XML is parsed and validated once. Unless `max_workers` is ``1``,
+    the XSLT versions are rendered concurrently, each one rendering its
+    languages in turn, or, if there is a single XSLT version, its languages
+    are rendered concurrently. Thread pools are never nested.
+    """
+    LOGGER.info('starting generation of %s' % (xml,))
+
+    try:
+        parsed_xml = parse_xml(xml, config.nonetwork, config.nochecks)
+    except XMLError as e:
+        LOGGER.debug(e)
+        LOGGER.warning('Error generating %s. Skipping. Run with DEBUG for more info.', xml)
+        return
 
+    if max_workers == 1 or len(xslt_versions) == 1:
         for xslt_version in xslt_versions:
-            generate_html_files(args, xslt_version, xml)
+            generate_html_files(config, xslt_version, xml=xml,
+                                parsed_xml=parsed_xml, max_workers=max_workers)
+    else:
+        generate = functools.partial(generate_html_files, config, xml=xml,
+                                     parsed_xml=parsed_xml, max_workers=1)
+        with futures.ThreadPoolExecutor(
+                max_workers=len(xslt_versions)) as executor:
+            for _ in executor.map(generate, xslt_versions):
+                pass
 
-        LOGGER.info('finished generating %s' % (xml,))
+    LOGGER.info('finished generating %s' % (xml,))
 
 
-def generate_html_files(config, xslt_version, xml):
+def generate_html_files(config, xslt_version, xml, parsed_xml=None,
+                        max_workers=None):
     try:
         html_generator = get_htmlgenerator(
             xml, config.nonetwork, config.nochecks,
@@ -152,6 +222,7 @@ def generate_html_files(config, xslt_version, xml):
             config.bootstrap_css,
             config.article_css,
             config.design_system_static_img_path,
+            parsed_xml=parsed_xml,
         )
         LOGGER.debug('HTMLGenerator repr: %s' % repr(html_generator))
     except XMLError as e:
@@ -162,7 +233,8 @@ def generate_html_files(config, xslt_version, xml):
     try:
         abstract_suffix = config.gs_abstract and '.abstract' or ''
         version = xslt_version.replace(".", "_")
-        for lang, trans_result in html_generator:
+        for lang, trans_result in html_generator.generate_all(
+                max_workers=max_workers):
             # nome do arquivo a ser criado
             fname, fext = xml.rsplit('.', 1)
             if xslt_version == "2.0":
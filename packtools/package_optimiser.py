@@ -31,6 +31,40 @@ def main():
         action='store_true',
         help='stop execution if an error occurs',
     )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=None,
+        help='number of threads used to produce the web images concurrently '
+        '(default: the number of processors, up to %s). each thread holds one '
+        'decoded image in memory.' % packtools.utils.DEFAULT_MAX_WORKERS,
+    )
+    parser.add_argument(
+        '--imagecache',
+        default=None,
+        help='directory where the web images are cached, so that images already '
+        'processed are not produced again.',
+    )
+    parser.add_argument(
+        '--imagecachesize',
+        type=int,
+        default=None,
+        help='maximum size of the web images cache, in megabytes.',
+    )
+    parser.add_argument(
+        '--streaming',
+        action='store_true',
+        help='read the images from streams and write the web images to temporary '
+        'files, instead of holding the files in memory. the decoded images are '
+        'still held in memory; only jpeg thumbnails are decoded reduced.',
+    )
+    parser.add_argument(
+        '--maximagepixels',
+        type=int,
+        default=None,
+        help='maximum number of pixels of the images to optimise. larger images are '
+        'handled as errors, before they are decoded.',
+    )
     parser.add_argument("--version", action="version", version=packtools_version)
     parser.add_argument("--loglevel", default="WARNING")
     args = parser.parse_args()
@@ -44,15 +78,32 @@ def main():
     else:
         new_package_file_path = os.path.splitext(args.SPPackage)[0] + "_optimised.zip"
 
+    if args.imagecache:
+        image_cache = packtools.utils.WebImageCache(
+            args.imagecache,
+            max_size=args.imagecachesize and args.imagecachesize * 1024 * 1024,
+        )
+    else:
+        image_cache = None
+
     package = packtools.SPPackage.from_file(
         args.SPPackage,
         os.path.splitext(args.SPPackage)[0],
         stop_if_error=args.stopiferror,
+        max_workers=args.jobs,
+        image_cache=image_cache,
+        streaming=args.streaming,
+        max_image_pixels=args.maximagepixels,
     )
     package.optimise(
         new_package_file_path=new_package_file_path, preserve_files=args.preservefiles
     )
 
+    if image_cache is not None:
+        LOGGER.info(
+            "web images cache: %s hits, %s misses", image_cache.hits, image_cache.misses
+        )
+
 
 if __name__ == "__main__":
     main()
@@ -58,6 +58,14 @@ class SPSHTTPServiceUnavailableError(Exception):
     """
 
 
+class SPSDownloadError(Exception):
+    """ To handle file download failures.
+    """
+    def __init__(self, *args: object, status=None):
+        super().__init__(*args)
+        self.status = status
+
+
 class SPSDownloadXMLError(Exception):
     """ To handle XML file download failures.
     """
@@ -2,9 +2,19 @@ import asyncio
 import aiohttp
 import logging
 import os
+import shutil
 import tempfile
+import threading
+import time
 
-from tenacity import retry, wait_exponential
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+
+from packtools.sps import exceptions
 
 
 LOGGER_FORMAT = u"%(asctime)s %(levelname)-5.5s %(message)s"
@@ -12,63 +22,284 @@ logging.basicConfig(format=LOGGER_FORMAT, level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
-@retry(wait=wait_exponential(multiplier=1, min=4, max=20))
-async def _get(session, uri):
+# tamanho dos blocos lidos da resposta HTTP e gravados em disco
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# quantidade máxima de conexões simultâneas com um mesmo servidor, menor que
+# a de downloads simultâneos (`semaphore_value`), para que um lote de
+# recursos de um mesmo servidor não ocupe todas as conexões
+DEFAULT_LIMIT_PER_HOST = 8
+
+# quantidade máxima de tentativas de download de cada recurso
+DEFAULT_MAX_ATTEMPTS = 3
+
+# status HTTP que indicam falhas temporárias, para as quais há retentativa
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def _create_temporary_file(file_path):
     """
-    Obtém um recurso com acesso HTTP.
+    Cria um arquivo temporário na mesma pasta de `file_path`, para que
+    possa ser renomeado atomicamente ao final da gravação.
+    """
+    folder, filename = os.path.split(file_path)
+    fd, temp_file_path = tempfile.mkstemp(
+        prefix=".%s." % filename, suffix=".part", dir=folder)
+    return os.fdopen(fd, "wb"), temp_file_path
+
+
+def _discard_temporary_file(fp, temp_file_path):
+    fp.close()
+    try:
+        os.unlink(temp_file_path)
+    except OSError:
+        pass
+
 
-    Retentativas: Aguarde 2 ^ x * 1 segundo entre cada nova tentativa,
-                  começando com 4 segundos, depois até 10 segundos e 10
-                  segundos depois
+def _commit_temporary_file(fp, temp_file_path, file_path):
+    fp.close()
+    os.replace(temp_file_path, file_path)
+
+
+def _copy_file(source_path, file_path):
+    fp, temp_file_path = _create_temporary_file(file_path)
+    try:
+        with open(source_path, "rb") as source:
+            shutil.copyfileobj(source, fp)
+        _commit_temporary_file(fp, temp_file_path, file_path)
+    except BaseException:
+        _discard_temporary_file(fp, temp_file_path)
+        raise
+    return os.path.getsize(file_path)
+
+
+def _is_retryable(exc):
+    """
+    Indica se o download pode ser retentado após a exceção `exc`: falhas de
+    conexão (sem status) ou status HTTP de falha temporária.
+    """
+    if not isinstance(exc, exceptions.SPSDownloadError):
+        return False
+    return exc.status is None or exc.status in RETRY_STATUS
+
+
+async def _write_chunks(response, fp, chunk_size):
+    """
+    Lê o conteúdo de `response` em blocos de `chunk_size` bytes e os grava
+    em `fp`, fora do event loop. Enquanto um bloco é gravado, o seguinte é
+    lido.
+
+    Retornos:
+        tupla com a quantidade de bytes gravados e o pico de memória, a
+        maior quantidade de bytes do recurso lidos e ainda não gravados ao
+        mesmo tempo (sem contar o buffer de leitura do aiohttp).
+    """
+    loop = asyncio.get_running_loop()
+    size = 0
+    in_memory = 0
+    peak_memory = 0
+    # gravação do bloco anterior, em andamento: (future, tamanho do bloco)
+    pending = None
+    try:
+        async for chunk in response.content.iter_chunked(chunk_size):
+            if pending is not None and pending[0].done():
+                await pending[0]
+                in_memory -= pending[1]
+                pending = None
+            in_memory += len(chunk)
+            peak_memory = max(peak_memory, in_memory)
+            if pending is not None:
+                await pending[0]
+                in_memory -= pending[1]
+            pending = (loop.run_in_executor(None, fp.write, chunk), len(chunk))
+            size += len(chunk)
+        if pending is not None:
+            await pending[0]
+    except BaseException:
+        # o arquivo não pode ser descartado durante a gravação
+        if pending is not None:
+            await asyncio.wait([pending[0]])
+        raise
+    return size, peak_memory
+
+
+async def _get_to_file(
+    session, uri, file_path, chunk_size=DEFAULT_CHUNK_SIZE, cache=None,
+):
+    """
+    Obtém um recurso com acesso HTTP e o grava em `file_path`, bloco a bloco.
+
+    O conteúdo é gravado em um arquivo temporário, que é renomeado para
+    `file_path` somente quando o download termina com sucesso. As operações
+    de disco são executadas fora do event loop (`run_in_executor`).
 
     Args:
         session: http session object(aiohttp), sessão http
-        uri: Endereço para URL contento uma posição de interpolação.
+        uri: Endereço do recurso.
+        file_path: caminho do arquivo de destino.
+        chunk_size: tamanho dos blocos lidos da resposta HTTP.
+        cache: http_cache.HTTPCache, se informado, o recurso é obtido por
+            meio do cache e copiado para `file_path`.
     Retornos:
-        Retorno o corpo da resposta HTTP.
+        dict com `status`, `path`, `size` e `peak_memory` (ver
+        `_write_chunks`).
     Exceções:
-        Trata a exceções de conexão com o endpoint HTTP.
+        SPSDownloadError: status HTTP diferente de 200 ou falha de conexão,
+        neste caso, com `status` igual a None.
     """
     logger.info("Obtendo recurso com a uri: %s" % uri)
 
+    if cache is not None:
+        return await _get_to_file_through_cache(
+            session, uri, file_path, chunk_size, cache)
+
+    loop = asyncio.get_running_loop()
     try:
         async with session.get(uri) as response:
             if response.status != 200:
-                logger.error(
-                    "Recurso não encontrado '%s'" %
-                    uri,
+                raise exceptions.SPSDownloadError(
+                    "Unable to get %s: HTTP status %s" % (uri, response.status),
+                    status=response.status,
                 )
-                return None
 
-            return await response.content.read()
-    except Exception as e:
-        logger.error(
-            "Erro ao obter o recurso: %s, retentando...., erro: %s" %
-            (uri, e))
+            fp, temp_file_path = await loop.run_in_executor(
+                None, _create_temporary_file, file_path)
+            try:
+                size, peak_memory = await _write_chunks(
+                    response, fp, chunk_size)
+                await loop.run_in_executor(
+                    None, _commit_temporary_file, fp, temp_file_path, file_path)
+            except BaseException:
+                await loop.run_in_executor(
+                    None, _discard_temporary_file, fp, temp_file_path)
+                raise
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise exceptions.SPSDownloadError(
+            "Unable to get %s: %s" % (uri, str(e) or type(e).__name__))
+
+    return {
+        "status": response.status,
+        "path": file_path,
+        "size": size,
+        "peak_memory": peak_memory,
+    }
+
+
+async def _get_to_file_through_cache(session, uri, file_path, chunk_size, cache):
+    """
+    Obtém `uri` por meio de `cache` (ver `_get_to_file`): com requisição
+    condicional, se `uri` está no cache, ou retomando um download
+    interrompido.
+    """
+    loop = asyncio.get_running_loop()
+    download = await loop.run_in_executor(None, cache.begin, uri)
+    peak_memory = 0
+    try:
+        async with session.get(uri, headers=download.headers) as response:
+            status = response.status
+            if status == 304:
+                path = await loop.run_in_executor(None, download.not_modified)
+            elif status in (200, 206):
+                fp = await loop.run_in_executor(
+                    None, download.open, status, response.headers)
+                _, peak_memory = await _write_chunks(response, fp, chunk_size)
+                path = await loop.run_in_executor(None, download.commit)
+            else:
+                raise exceptions.SPSDownloadError(
+                    "Unable to get %s: HTTP status %s" % (uri, status),
+                    status=status,
+                )
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise exceptions.SPSDownloadError(
+            "Unable to get %s: %s" % (uri, str(e) or type(e).__name__))
+    finally:
+        await loop.run_in_executor(None, download.release)
+
+    if path is None:
+        # a entrada foi removida do cache durante a requisição
+        return await _get_to_file(session, uri, file_path, chunk_size)
 
+    size = await loop.run_in_executor(None, _copy_file, path, file_path)
+    return {
+        "status": status,
+        "path": file_path,
+        "size": size,
+        "peak_memory": peak_memory,
+    }
 
-async def _download_file(session, uri, download_filename, download_folder):
+
+async def _download_file(
+    session, uri, download_filename, download_folder,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    max_attempts=DEFAULT_MAX_ATTEMPTS,
+    retry_wait=None,
+    cache=None,
+):
     """
+    Grava o recurso `uri` em `download_folder` com o nome `download_filename`.
+
+    Falhas de conexão e status HTTP de `RETRY_STATUS` são retentados até
+    `max_attempts` vezes, aguardando `retry_wait` entre as tentativas (por
+    padrão, espera exponencial com jitter).
+
+    Retornos:
+        dict com `uri`, `name`, `status`, `path` (None se o download falhou),
+        `size`, `peak_memory` (bytes), `elapsed` (segundos), `attempts` e
+        `error`.
     """
-    content = await _get(session, uri)
-    if content:
-        download_file_path = os.path.join(download_folder, download_filename)
-        with open(download_file_path, "wb") as fp:
-            fp.write(content)
+    result = {
+        "uri": uri,
+        "name": download_filename,
+        "status": None,
+        "path": None,
+        "size": 0,
+        "peak_memory": 0,
+        "elapsed": None,
+        "attempts": 0,
+        "error": None,
+    }
+    download_file_path = os.path.join(download_folder, download_filename)
+    retrying = AsyncRetrying(
+        stop=stop_after_attempt(max_attempts),
+        wait=retry_wait or wait_exponential_jitter(initial=1, max=20),
+        retry=retry_if_exception(_is_retryable),
+        reraise=True,
+    )
+    started = time.monotonic()
+    try:
+        async for attempt in retrying:
+            with attempt:
+                result["attempts"] = attempt.retry_state.attempt_number
+                result.update(
+                    await _get_to_file(
+                        session, uri, download_file_path, chunk_size, cache)
+                )
+    except Exception as e:
+        result["status"] = getattr(e, "status", None)
+        result["error"] = str(e)
+        logger.error(
+            "Erro ao obter o recurso: %s, tentativas: %s, erro: %s",
+            uri, result["attempts"], e)
+    else:
+        logger.info(
+            "Recurso %s gravado em %s: %s bytes, pico de memória %s bytes",
+            uri, download_file_path, result["size"], result["peak_memory"])
+    result["elapsed"] = time.monotonic() - started
+    return result
 
 
-async def _bound_download_file(sem, session, uri, download_filename, download_folder):
+async def _bound_download_file(sem, session, *args, **kwargs):
     """
     Responsável por envolver a função de obter os artigos por um semáforo.
 
     Args:
-        fetcher: callable, função responsável por obter os dados da URL
-        session: http session object(aiohttp), sessão http
         sem: semaphore object, um objeto semáforo para envolver a função.
+        session: http session object(aiohttp), sessão http
+        args, kwargs: argumentos de `_download_file`
     """
 
     async with sem:
-        await _download_file(session, uri, download_filename, download_folder)
+        return await _download_file(session, *args, **kwargs)
 
 
 async def _download_files(
@@ -76,57 +307,153 @@ async def _download_files(
     downloads_path,
     ssl=False,
     semaphore_value=20,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    limit_per_host=DEFAULT_LIMIT_PER_HOST,
+    max_attempts=DEFAULT_MAX_ATTEMPTS,
+    retry_wait=None,
+    cache=None,
 ):
     """
-    """
+    Obtém os recursos de `uris_names` ({"uri": str, "name": str}) e os grava
+    em `downloads_path`.
+
+    São feitos até `semaphore_value` downloads simultâneos, com até
+    `limit_per_host` conexões por servidor (0 para não limitar as conexões
+    por servidor além de `semaphore_value`). Se `cache`
+    (`http_cache.HTTPCache`) é informado, os recursos são obtidos por meio
+    do cache.
 
-    tasks = []
+    Retornos:
+        lista com o resultado de cada download (ver `_download_file`), na
+        ordem de `uris_names`.
+    """
     sem = asyncio.Semaphore(semaphore_value)
+    connector = aiohttp.TCPConnector(
+        ssl=ssl, limit=semaphore_value, limit_per_host=limit_per_host)
 
-    try:
-        async with aiohttp.ClientSession(
-            connector=aiohttp.TCPConnector(ssl=False)
-        ) as session:
-
-            for uri_name in uris_names:
-                tasks.append(
-                    _bound_download_file(
-                        sem,
-                        session,
-                        uri_name['uri'],
-                        uri_name['name'],
-                        downloads_path,
-                    )
-                )
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = [
+            _bound_download_file(
+                sem,
+                session,
+                uri_name['uri'],
+                uri_name['name'],
+                downloads_path,
+                chunk_size=chunk_size,
+                max_attempts=max_attempts,
+                retry_wait=retry_wait,
+                cache=cache,
+            )
+            for uri_name in uris_names
+        ]
+        logger.info("Qty tasks: %s", len(tasks))
+        return await asyncio.gather(*tasks)
 
-            if tasks:
-                logger.info("Qty tasks: %s", len(tasks))
-                responses = asyncio.gather(*tasks)
-                await responses
 
-    except Exception as e:
-        logger.error("Erro: %s.", e)
-        logger.exception(e)
+_background_loop = None
+_background_loop_lock = threading.Lock()
 
 
-def _get_or_create_eventloop():
+def _get_background_loop():
+    """
+    Retorna o event loop executado em uma thread dedicada, usado por
+    `run_coroutine` em todas as chamadas síncronas.
     """
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever,
+                name="packtools-async-download",
+                daemon=True,
+            ).start()
+            _background_loop = loop
+        return _background_loop
+
 
+def run_coroutine(coro):
     """
-    # https://techoverflow.net/2020/10/01/how-to-fix-python-asyncio-runtimeerror-there-is-no-current-event-loop-in-thread/
+    Executa `coro` e retorna o seu resultado, de forma síncrona.
+
+    `coro` é executada no event loop da thread dedicada, que dura enquanto
+    o processo durar. Assim, o event loop da thread atual não é alterado:
+    nem criado, nem fechado, como faria `asyncio.run`, e a chamada funciona
+    também em uma thread que já executa um event loop (por exemplo, em um
+    serviço aiohttp ou no Jupyter). A thread atual fica bloqueada até o fim
+    da execução; código assíncrono deve aguardar diretamente as funções
+    `*_async`.
+    """
+    loop = _get_background_loop()
     try:
-        return asyncio.get_event_loop()
-    except RuntimeError as ex:
-        if "There is no current event loop in thread" in str(ex):
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            return asyncio.get_event_loop()
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        coro.close()
+        raise RuntimeError(
+            "run_coroutine cannot be called from the coroutines it runs")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
 
 
-def download_files(uris_and_names, downloads_path=None):
+async def download_files_with_results_async(
+    uris_and_names,
+    downloads_path=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    limit_per_host=DEFAULT_LIMIT_PER_HOST,
+    max_attempts=DEFAULT_MAX_ATTEMPTS,
+    retry_wait=None,
+    cache=None,
+):
+    """
+    Obtém os recursos de `uris_and_names` e os grava em `downloads_path`
+    (por padrão, uma pasta temporária), por meio de `cache`
+    (`http_cache.HTTPCache`), se informado.
+
+    Retornos:
+        lista com um dict por recurso, na ordem de `uris_and_names`, com
+        `uri`, `name`, `status`, `path` (None se o download falhou), `size`,
+        `peak_memory`, `elapsed`, `attempts` e `error`.
+    """
     downloads_path = downloads_path or tempfile.mkdtemp()
-    loop = _get_or_create_eventloop()
-    loop.run_until_complete(
-        _download_files(uris_and_names, downloads_path))
-    return [os.path.join(downloads_path, f)
-            for f in os.listdir(downloads_path)]
+    return await _download_files(
+        uris_and_names,
+        downloads_path,
+        chunk_size=chunk_size,
+        limit_per_host=limit_per_host,
+        max_attempts=max_attempts,
+        retry_wait=retry_wait,
+        cache=cache,
+    )
+
+
+async def download_files_async(uris_and_names, downloads_path=None, **kwargs):
+    """
+    Obtém os recursos de `uris_and_names` e retorna os caminhos dos arquivos
+    obtidos com sucesso. Os parâmetros opcionais são os de
+    `download_files_with_results_async`.
+    """
+    return [
+        result["path"]
+        for result in await download_files_with_results_async(
+            uris_and_names, downloads_path, **kwargs)
+        if result["path"]
+    ]
+
+
+def download_files_with_results(uris_and_names, downloads_path=None, **kwargs):
+    """
+    Versão síncrona de `download_files_with_results_async`.
+    """
+    return run_coroutine(
+        download_files_with_results_async(
+            uris_and_names, downloads_path, **kwargs)
+    )
+
+
+def download_files(uris_and_names, downloads_path=None, **kwargs):
+    """
+    Versão síncrona de `download_files_async`.
+    """
+    return run_coroutine(
+        download_files_async(uris_and_names, downloads_path, **kwargs))
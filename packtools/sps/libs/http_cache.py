@@ -0,0 +1,366 @@
+"""
+Cache de respostas HTTP em disco, compartilhado por `reqs` e `async_download`.
+
+Para cada URI, o cache mantém o conteúdo obtido (`<chave>`) e os seus
+validadores (`<chave>.json`, com ETag e Last-Modified), usados em requisições
+condicionais (`If-None-Match`, `If-Modified-Since`). Downloads interrompidos
+são mantidos (`<chave>.part`) e retomados com requisições `Range`. Quando o
+tamanho total do cache excede `max_size`, as entradas usadas há mais tempo são
+removidas.
+
+Uso::
+
+    cache = HTTPCache("/tmp/http-cache")
+    with cache.begin(uri) as download:
+        response = get(uri, headers=download.headers)
+        if response.status == 304:
+            path = download.not_modified()
+        else:
+            fp = download.open(response.status, response.headers)
+            for chunk in response:
+                fp.write(chunk)
+            path = download.commit()
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+
+from packtools.sps import exceptions
+
+
+logger = logging.getLogger(__name__)
+
+
+# tamanho máximo do cache, em bytes
+DEFAULT_MAX_SIZE = 1024 ** 3
+
+# sufixo dos arquivos de downloads em andamento
+TEMP_SUFFIX = ".tmp"
+
+# sufixos dos arquivos de uma entrada do cache
+ENTRY_SUFFIXES = ("", ".json", ".part", ".part.json")
+
+CONTENT_RANGE_START_PATTERN = re.compile(r"bytes\s+(\d+)-")
+
+
+def _get_key(uri):
+    return hashlib.sha1(uri.encode("utf-8")).hexdigest()
+
+
+def _read_json(file_path):
+    try:
+        with open(file_path) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(file_path, data):
+    fd, temp_file_path = tempfile.mkstemp(
+        dir=os.path.dirname(file_path), suffix=TEMP_SUFFIX)
+    with os.fdopen(fd, "w") as fp:
+        json.dump(data, fp)
+    os.replace(temp_file_path, file_path)
+
+
+def _get_size(file_path):
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+def _remove(file_path):
+    try:
+        os.unlink(file_path)
+    except OSError:
+        pass
+
+
+def _get_validators(headers):
+    return {
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+    }
+
+
+def _get_if_range(validators):
+    """
+    Retorna o valor de `If-Range` para os `validators` ou None. ETags fracos
+    não podem ser usados em `If-Range`.
+    """
+    etag = validators.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return validators.get("last_modified")
+
+
+def _get_content_range_start(headers):
+    match = CONTENT_RANGE_START_PATTERN.match(headers.get("Content-Range") or "")
+    if match:
+        return int(match.group(1))
+
+
+class HTTPCache:
+    """
+    Cache de respostas HTTP em disco.
+
+    Parameters
+    ----------
+    folder : str
+        pasta do cache, criada se não existir
+    max_size : int
+        tamanho máximo do cache, em bytes; None para não limitar
+
+    O tamanho total do cache é obtido da pasta na primeira remoção de
+    entradas e, depois, atualizado a cada download; a pasta é percorrida
+    novamente somente quando o tamanho excede `max_size`.
+    """
+
+    def __init__(self, folder, max_size=DEFAULT_MAX_SIZE):
+        self.folder = folder
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._size = None
+        os.makedirs(folder, exist_ok=True)
+
+    def _get_path(self, key, suffix=""):
+        return os.path.join(self.folder, key + suffix)
+
+    def _get_entry_size(self, key):
+        return sum(
+            _get_size(self._get_path(key, suffix)) for suffix in ENTRY_SUFFIXES)
+
+    @contextlib.contextmanager
+    def _changing(self, key):
+        """
+        Bloqueia o cache enquanto os arquivos da entrada `key` são alterados,
+        atualizando o seu tamanho total.
+        """
+        with self._lock:
+            if self._size is None:
+                yield
+                return
+            size = self._get_entry_size(key)
+            try:
+                yield
+            finally:
+                self._size += self._get_entry_size(key) - size
+
+    def _scan(self):
+        """
+        Retorna as entradas da pasta do cache, {chave: (tamanho, último uso)}.
+        """
+        entries = {}
+        for name in os.listdir(self.folder):
+            if name.endswith(TEMP_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.folder, name))
+            except OSError:
+                continue
+            key = name.split(".", 1)[0]
+            size, used = entries.get(key, (0, 0))
+            entries[key] = (size + stat.st_size, max(used, stat.st_mtime))
+        return entries
+
+    def get(self, uri):
+        """
+        Retorna os metadados da entrada de `uri` (`uri`, `etag`,
+        `last_modified`, `size` e `path`) ou None, marcando a entrada como
+        usada.
+        """
+        key = _get_key(uri)
+        entry = _read_json(self._get_path(key, ".json"))
+        if not entry or not os.path.isfile(self._get_path(key)):
+            return None
+        try:
+            os.utime(self._get_path(key, ".json"))
+        except OSError:
+            pass
+        entry["path"] = self._get_path(key)
+        return entry
+
+    def begin(self, uri):
+        """
+        Inicia o download de `uri` por meio do cache.
+
+        Returns
+        -------
+        CachedDownload
+        """
+        return CachedDownload(self, uri)
+
+    def evict(self, keep=None):
+        """
+        Remove as entradas usadas há mais tempo até que o tamanho do cache
+        não exceda `max_size`. A entrada de chave `keep` não é removida.
+        """
+        if self.max_size is None:
+            return
+
+        with self._lock:
+            if self._size is not None and self._size <= self.max_size:
+                return
+
+            entries = self._scan()
+            total = sum(size for size, used in entries.values())
+            for key, (size, used) in sorted(
+                    entries.items(), key=lambda item: item[1][1]):
+                if total <= self.max_size:
+                    break
+                if key == keep:
+                    continue
+                logger.debug("Removendo %s do cache", key)
+                for suffix in ENTRY_SUFFIXES:
+                    _remove(self._get_path(key, suffix))
+                total -= size
+            self._size = total
+
+
+class CachedDownload:
+    """
+    Download de `uri` por meio de `cache`.
+
+    `headers` contém os cabeçalhos da requisição: condicionais, se há uma
+    entrada para `uri` no cache, e `Range`, se há um download interrompido,
+    que é retomado a partir de `offset`.
+
+    O download interrompido é reservado para esta instância até `commit`,
+    `not_modified` ou `release`, então, downloads simultâneos da mesma `uri`
+    não gravam no mesmo arquivo.
+    """
+
+    def __init__(self, cache, uri):
+        self.cache = cache
+        self.uri = uri
+        self.headers = {}
+        self.offset = 0
+        self._key = _get_key(uri)
+        self._fp = None
+        self._done = False
+
+        entry = _read_json(cache._get_path(self._key, ".json"))
+        if entry:
+            if entry.get("etag"):
+                self.headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                self.headers["If-Modified-Since"] = entry["last_modified"]
+
+        fd, self._temp_file_path = tempfile.mkstemp(
+            dir=cache.folder, prefix=self._key + ".", suffix=TEMP_SUFFIX)
+        os.close(fd)
+        self._validators = self._claim_partial_download()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def _claim_partial_download(self):
+        part_path = self.cache._get_path(self._key, ".part")
+        with self.cache._changing(self._key):
+            try:
+                os.replace(part_path, self._temp_file_path)
+            except OSError:
+                return {}
+
+            validators = _read_json(part_path + ".json") or {}
+            _remove(part_path + ".json")
+        if_range = _get_if_range(validators)
+        self.offset = os.path.getsize(self._temp_file_path)
+        if if_range and self.offset:
+            self.headers["Range"] = "bytes=%s-" % self.offset
+            self.headers["If-Range"] = if_range
+            # os bytes do intervalo devem ser os do recurso, sem compressão
+            self.headers["Accept-Encoding"] = "identity"
+        else:
+            self.offset = 0
+        return validators
+
+    def open(self, status, headers):
+        """
+        Retorna o arquivo em que o conteúdo da resposta deve ser gravado, de
+        acordo com o `status` e os `headers` da resposta: 200, desde o
+        início, ou 206, a partir de `offset`.
+        """
+        if (status == 206 and self.offset and
+                _get_content_range_start(headers) == self.offset):
+            mode = "ab"
+        elif status == 200:
+            mode = "wb"
+            self.offset = 0
+            self._validators = _get_validators(headers)
+        else:
+            raise exceptions.SPSDownloadError(
+                "Unexpected response for %s: HTTP status %s" % (
+                    self.uri, status),
+                status=status,
+            )
+        self._fp = open(self._temp_file_path, mode)
+        return self._fp
+
+    def commit(self):
+        """
+        Finaliza o download, registrando-o no cache.
+
+        Returns
+        -------
+        str
+            caminho do conteúdo no cache
+        """
+        self._fp.close()
+        path = self.cache._get_path(self._key)
+        size = os.path.getsize(self._temp_file_path)
+        # o conteúdo e os seus validadores são substituídos juntos, sem que
+        # a entrada seja removida entre as duas operações
+        with self.cache._changing(self._key):
+            os.replace(self._temp_file_path, path)
+            _write_json(
+                self.cache._get_path(self._key, ".json"),
+                dict(uri=self.uri, size=size, **self._validators),
+            )
+        self._done = True
+        self.cache.evict(keep=self._key)
+        return path
+
+    def not_modified(self):
+        """
+        Finaliza o download cuja resposta foi 304 (Not Modified).
+
+        Returns
+        -------
+        str
+            caminho do conteúdo no cache ou None, se não está mais no cache
+        """
+        self.release()
+        entry = self.cache.get(self.uri)
+        return entry and entry["path"]
+
+    def release(self):
+        """
+        Libera o download sem registrá-lo no cache, mantendo o conteúdo já
+        obtido para que o download possa ser retomado.
+        """
+        if self._done:
+            return
+        self._done = True
+        if self._fp is not None:
+            self._fp.close()
+
+        if (os.path.isfile(self._temp_file_path) and
+                os.path.getsize(self._temp_file_path) and
+                _get_if_range(self._validators)):
+            part_path = self.cache._get_path(self._key, ".part")
+            with self.cache._changing(self._key):
+                _write_json(part_path + ".json", self._validators)
+                os.replace(self._temp_file_path, part_path)
+            self.cache.evict(keep=self._key)
+        else:
+            _remove(self._temp_file_path)
@@ -1,32 +1,170 @@
+import threading
+from concurrent import futures
+
 from packtools.sps import exceptions
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
-def requests_get_content(uri, timeout=10):
-    try:
-        response = requests.get(uri, timeout=timeout)
-        response.raise_for_status()
-    except requests.exceptions.HTTPError:
-        _handle_http_error(response.status_code)
-    except requests.exceptions.ConnectionError:
-        raise exceptions.SPSConnectionError()
-    else:
-        return response.content.decode("utf-8")
+# tamanho dos blocos lidos da resposta HTTP e gravados no cache
+CHUNK_SIZE = 64 * 1024
+
+# quantidade de servidores e de conexões por servidor mantidas no pool
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 20
+
+# retentativas de falhas de conexão e de status de falha temporária
+MAX_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# quantidade de downloads simultâneos em `get_many`
+DEFAULT_MAX_WORKERS = 8
+
+_adapter = None
+_adapter_lock = threading.Lock()
+_local = threading.local()
+
+
+def _get_adapter():
+    """
+    Retorna o `HTTPAdapter` compartilhado por todas as sessões, cujo pool de
+    conexões (urllib3) é thread-safe e mantém as conexões abertas
+    (keep-alive) entre as requisições.
+    """
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            _adapter = HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=Retry(
+                    total=MAX_RETRIES,
+                    backoff_factor=RETRY_BACKOFF_FACTOR,
+                    status_forcelist=RETRY_STATUS,
+                    raise_on_status=False,
+                ),
+            )
+        return _adapter
 
 
-def requests_get(uri, timeout=10):
+def get_session():
+    """
+    Retorna a `requests.Session` da thread atual. As sessões das threads
+    compartilham o mesmo pool de conexões.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = _get_adapter()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+
+def get_pool_stats():
+    """
+    Retorna as estatísticas dos pools de conexões, um dict por servidor, com
+    `scheme`, `host`, `port`, `num_connections` (conexões criadas),
+    `num_requests`, `idle` (conexões disponíveis) e `maxsize`.
+    """
+    pools = _get_adapter().poolmanager.pools
+    stats = []
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        stats.append({
+            "scheme": pool.scheme,
+            "host": pool.host,
+            "port": pool.port,
+            "num_connections": pool.num_connections,
+            "num_requests": pool.num_requests,
+            "idle": pool.pool.qsize() if pool.pool else 0,
+            "maxsize": pool.pool.maxsize if pool.pool else 0,
+        })
+    return stats
+
+
+def requests_get_content(uri, timeout=10, cache=None):
+    return requests_get(uri, timeout=timeout, cache=cache).decode("utf-8")
+
+
+def requests_get(uri, timeout=10, cache=None):
+    """
+    Obtém o conteúdo de `uri`. Se `cache` (`http_cache.HTTPCache`) é
+    informado, o conteúdo é obtido por meio do cache.
+    """
+    if cache is not None:
+        return _requests_get_through_cache(uri, timeout, cache)
     try:
-        response = requests.get(uri, timeout=timeout)
+        response = get_session().get(uri, timeout=timeout)
         response.raise_for_status()
     except requests.exceptions.HTTPError:
         _handle_http_error(response.status_code)
-    except requests.exceptions.ConnectionError:
+    except (requests.exceptions.ConnectionError,
+            requests.exceptions.ChunkedEncodingError):
         raise exceptions.SPSConnectionError()
     else:
         return response.content
 
 
+def _requests_get_through_cache(uri, timeout, cache):
+    with cache.begin(uri) as download:
+        try:
+            with get_session().get(
+                uri, timeout=timeout, headers=download.headers, stream=True,
+            ) as response:
+                if response.status_code == 304:
+                    path = download.not_modified()
+                else:
+                    response.raise_for_status()
+                    fp = download.open(response.status_code, response.headers)
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        fp.write(chunk)
+                    path = download.commit()
+        except requests.exceptions.HTTPError:
+            _handle_http_error(response.status_code)
+        except exceptions.SPSDownloadError as e:
+            # resposta 2xx inesperada, por exemplo, 206 com outro intervalo
+            _handle_http_error(e.status)
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError):
+            # a conexão pode ser interrompida durante a leitura do conteúdo
+            raise exceptions.SPSConnectionError()
+
+    if path is None:
+        # a entrada foi removida do cache durante a requisição
+        return requests_get(uri, timeout=timeout)
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+def get_many(uris, max_workers=DEFAULT_MAX_WORKERS, timeout=10, cache=None):
+    """
+    Obtém o conteúdo de `uris` simultaneamente, com até `max_workers`
+    threads, por meio do pool de conexões compartilhado.
+
+    Returns
+    -------
+    list
+        um dict por uri, na ordem de `uris`, com `uri`, `content` (bytes ou
+        None) e `error` (a exceção ou None)
+    """
+    def _get(uri):
+        try:
+            content = requests_get(uri, timeout=timeout, cache=cache)
+        except Exception as e:
+            return {"uri": uri, "content": None, "error": e}
+        return {"uri": uri, "content": content, "error": None}
+
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_get, uris))
+
+
 def _handle_http_error(status_code):
     if status_code == 403:
         raise exceptions.SPSHTTPForbiddenError()
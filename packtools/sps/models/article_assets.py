@@ -1,5 +1,7 @@
 import os
 
+from lxml import etree
+
 
 class AssetReplacementError(Exception):
     ...
@@ -45,45 +47,76 @@ class ArticleAssets:
         return self._assets_which_have_no_id
 
     def _discover_assets(self):
-        self._discover_assets_which_have_id()
-        self._discover_assets_which_have_no_id()
-    
-    def _discover_assets_which_have_id(self):
+        """
+        Discover the assets in one traversal of the document.
+
+        An asset belongs to its outermost ancestor which has `@id`, except
+        `sub-article`, and is numbered in the order of the assets of that
+        ancestor. The first element which has `@id` and no children, such as
+        `supplementary-material`, gets the assets left, i.e., the ones which
+        do not belong to an ancestor that precedes it, numbered in the order
+        of the document. If there is no such element, the assets left have
+        no `@id` ancestor.
+        """
         self._assets_which_have_id = []
-        _visited_nodes = []
-        
-        for node in self.xmltree.xpath(".//*[@id]"):
-            if node.tag == "sub-article":
+
+        root = self.xmltree
+        if hasattr(root, "getroot"):
+            root = root.getroot()
+
+        node_with_id = None
+        node_with_id_precedes_leaf = False
+        leaf_node_with_id = None
+        nodes_left = []
+        i = 0
+        for event, node in etree.iterwalk(root, events=("start", "end")):
+            if node is root:
                 continue
-        
-            i = 0
-            for child_node in self._asset_nodes(node):
-                if child_node not in _visited_nodes:
+
+            if event == "end":
+                if node is node_with_id:
+                    node_with_id = None
+                    node_with_id_precedes_leaf = False
+                continue
+
+            if (
+                node.tag in ArticleAssets.ASSET_TAGS
+                and node.get("{http://www.w3.org/1999/xlink}href") is not None
+            ):
+                if node_with_id_precedes_leaf:
                     self._assets_which_have_id.append(Asset(
-                        node=child_node, 
+                        node=node,
                         parent_map=self._parent_map,
-                        parent_node_with_id=node, 
+                        parent_node_with_id=node_with_id,
                         number=i))
-                    _visited_nodes.append(child_node)
                     i += 1
+                else:
+                    nodes_left.append(node)
 
-    def _discover_assets_which_have_no_id(self):
-        self._assets_which_have_no_id = []
-        _visited_nodes = []
-
-        nodes_which_have_id = [i.node for i in self._assets_which_have_id]
-
-        i = 0
-        for child_node in self._asset_nodes():
-            if child_node not in nodes_which_have_id:
-                if child_node not in _visited_nodes:
-                    self._assets_which_have_no_id.append(Asset(
-                        node=child_node,
-                        parent_map=self._parent_map,
-                        number=i
-                    ))
-                    _visited_nodes.append(child_node)
-                    i += 1
+            if node.tag == "sub-article" or node.get("id") is None:
+                continue
+            if leaf_node_with_id is None and len(node) == 0:
+                leaf_node_with_id = node
+            if node_with_id is None:
+                node_with_id = node
+                node_with_id_precedes_leaf = leaf_node_with_id is None
+                i = 0
+
+        if leaf_node_with_id is not None:
+            self._assets_which_have_id.extend(
+                Asset(
+                    node=node,
+                    parent_map=self._parent_map,
+                    parent_node_with_id=leaf_node_with_id,
+                    number=i)
+                for i, node in enumerate(nodes_left)
+            )
+            nodes_left = []
+
+        self._assets_which_have_no_id = [
+            Asset(node=node, parent_map=self._parent_map, number=i)
+            for i, node in enumerate(nodes_left)
+        ]
 
     def _asset_nodes(self, node=None):
         _assets = []
@@ -2,21 +2,29 @@ import logging
 import os
 
 from packtools import file_utils
-from zipfile import ZipFile
 
 
 logger = logging.getLogger(__name__)
 
 
 class Package:
-    def __init__(self, source, name):
+    def __init__(self, source, name, reader=None):
         self._source = source
         self._xml = None
         self._assets = {}
         self._renditions = {}
         self._name = name
+        self._reader = reader or file_utils.ArchiveReader(source)
         self.zip_file_path = file_utils.is_zipfile(source) and source
 
+    @property
+    def reader(self):
+        """
+        `file_utils.ArchiveReader` used to read the files of the package, which
+        may be shared by the packages of the same source
+        """
+        return self._reader
+
     @property
     def assets(self):
         return self._assets
@@ -46,6 +54,11 @@ class Package:
         except KeyError:
             return
 
+    def get_asset_content(self, basename):
+        file_path = self.get_asset(basename)
+        if file_path:
+            return self._reader.read(file_path)
+
     def add_rendition(self, lang, file_path):
         """
         {
@@ -61,6 +74,11 @@ class Package:
         except KeyError:
             return
 
+    def get_rendition_content(self, lang):
+        file_path = self.get_rendition(lang)
+        if file_path:
+            return self._reader.read(file_path)
+
     @property
     def source(self):
         return self._source
@@ -79,11 +97,7 @@ class Package:
 
     @property
     def xml_content(self):
-        if file_utils.is_folder(self._source):
-            with open(self.xml, "rb") as fp:
-                return fp.read()
-        with ZipFile(self._source) as zf:
-            return zf.read(self.xml)
+        return self._reader.read(self.xml)
 
 
 def select_filenames_by_prefix(prefix, files):
@@ -135,16 +149,30 @@ def match_file_by_prefix(prefix, file_path):
     return False
 
 
-def explore_source(source):
-    packages = _explore_zipfile(source)
+def explore_source(source, reader=None):
+    """
+    Get packages' data from folder or zip file
+
+    Parameters
+    ----------
+    source : str
+        folder or zip file path
+    reader : file_utils.ArchiveReader
+        reader of `source` shared by the packages. While it is open, the zip
+        file is opened once for all the reads of the packages.
+    Returns
+    -------
+    dict
+    """
+    packages = _explore_zipfile(source, reader)
     if not packages:
-        packages = _explore_folder(source)
+        packages = _explore_folder(source, reader)
     if not packages:
         raise ValueError("%s: Invalid value for `source`" % source)
     return packages
 
 
-def _explore_folder(folder):
+def _explore_folder(folder, reader=None):
     """
     Get packages' data from folder
 
@@ -154,20 +182,25 @@ def _explore_folder(folder):
     ----------
     folder : str
         Folder of the package
+    reader : file_utils.ArchiveReader
+        reader of `folder` shared by the packages
     Returns
     -------
     dict
     """
     if file_utils.is_folder(folder):
+        reader = reader or file_utils.ArchiveReader(folder)
+        files = reader.namelist()
         data = _group_files_by_xml_filename(
             folder,
-            file_utils.xml_files_list(folder),
-            file_utils.files_list(folder),
+            [f for f in files if f.endswith(".xml")],
+            files,
+            reader,
         )
         return data
 
 
-def _explore_zipfile(zip_path):
+def _explore_zipfile(zip_path, reader=None):
     """
     Get packages' data from zip_path
 
@@ -177,21 +210,26 @@ def _explore_zipfile(zip_path):
     ----------
     zip_path : str
         zip file path
+    reader : file_utils.ArchiveReader
+        reader of `zip_path` shared by the packages
     Returns
     -------
     dict
     """
     if file_utils.is_zipfile(zip_path):
-        with ZipFile(zip_path, 'r'):
-            data = _group_files_by_xml_filename(
-                zip_path,
-                file_utils.xml_files_list_from_zipfile(zip_path),
-                file_utils.files_list_from_zipfile(zip_path),
-            )
-            return data
+        reader = reader or file_utils.ArchiveReader(zip_path)
+        with reader:
+            files = reader.namelist()
+        data = _group_files_by_xml_filename(
+            zip_path,
+            [f for f in files if os.path.splitext(f)[-1] == ".xml"],
+            files,
+            reader,
+        )
+        return data
 
 
-def _group_files_by_xml_filename(source, xmls, files):
+def _group_files_by_xml_filename(source, xmls, files, reader=None):
     """
     Group files by their XML basename
 
@@ -203,6 +241,8 @@ def _group_files_by_xml_filename(source, xmls, files):
         XML filenames
     files : list
         list of files in the folder or zipfile
+    reader : file_utils.ArchiveReader
+        reader of `source` shared by the packages
 
     Returns
     -------
@@ -210,35 +250,71 @@ def _group_files_by_xml_filename(source, xmls, files):
         key: name of the XML files
         value: Package
     """
+    reader = reader or file_utils.ArchiveReader(source)
     docs = {}
     for xml in xmls:
         basename = os.path.basename(xml)
         prefix, ext = os.path.splitext(basename)
 
-        docs.setdefault(prefix, Package(source, prefix))
+        docs.setdefault(prefix, Package(source, prefix, reader))
 
         # XML
         docs[prefix].xml = xml
 
-        for file in select_filenames_by_prefix(prefix, files):
-            # avalia arquivo do pacote, se é asset ou rendition
-            component = _eval_file(prefix, file)
-            if not component:
-                continue
-
-            # resultado do avaliação do pacote
-            ftype = component.get("ftype")
-            file_path = component["file_path"]
-            comp_id = component["component_id"]
-
-            if ftype:
-                docs[prefix].add_asset(comp_id, file_path)
-            else:
-                docs[prefix].add_rendition(comp_id, file_path)
-            files.remove(file)
+    # cada arquivo pertence ao primeiro XML, na ordem de `xmls`, cujo nome
+    # é prefixo do nome do arquivo
+    prefixes = {prefix: i for i, prefix in enumerate(docs)}
+    files_left = []
+    for file in files:
+        prefix = _get_file_prefix(os.path.basename(file), prefixes)
+        # avalia arquivo do pacote, se é asset ou rendition
+        component = prefix is not None and _eval_file(prefix, file)
+        if not component:
+            files_left.append(file)
+            continue
+
+        # resultado do avaliação do pacote
+        ftype = component.get("ftype")
+        file_path = component["file_path"]
+        comp_id = component["component_id"]
+
+        if ftype:
+            docs[prefix].add_asset(comp_id, file_path)
+        else:
+            docs[prefix].add_rendition(comp_id, file_path)
+    # os arquivos agrupados são removidos de `files`
+    files[:] = files_left
     return docs
 
 
+def _get_file_prefix(basename, prefixes):
+    """
+    Get the prefix of `basename` which belongs to a document package
+
+    Retorna o prefixo de `basename`, seguido de "-" ou ".", que está em
+    `prefixes`. Se há mais de um, retorna o de menor ordem.
+
+    Parameters
+    ----------
+    basename : str
+        File basename
+    prefixes : dict
+        key: filename prefix
+        value: order of the prefix
+
+    Returns
+    -------
+    str
+        prefix or None
+    """
+    candidates = [
+        basename[:i]
+        for i, char in enumerate(basename)
+        if char in "-." and basename[:i] in prefixes
+    ]
+    return min(candidates, key=prefixes.get, default=None)
+
+
 def _eval_file(prefix, file_path):
     """
     Identifica o tipo de arquivo do pacote: `asset` ou `rendition`.
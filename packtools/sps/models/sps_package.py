@@ -13,7 +13,8 @@ class SPS_Package:
     def __init__(self, xml, original_filename=None):
         self.xmltree = xml_utils.get_xml_tree(xml)
         self._original_filename = original_filename
-        self._assets = SPS_Assets(self.xmltree, self.scielo_pid_v3)
+        # os assets são indexados no primeiro acesso
+        self._assets = None
 
     @property
     def xmltree(self):
@@ -48,6 +49,8 @@ class SPS_Package:
             item["name"]: item["uri"]
             for item in uris_and_names
         }
+        # os assets são indexados antes da alteração de xlink:href
+        self.assets
         for node in self.xmltree.xpath(
                 ".//*[@xlink:href]",
                 namespaces={"xlink": "http://www.w3.org/1999/xlink"}):
@@ -96,6 +99,8 @@ class SPS_Package:
 
     @scielo_pid_v3.setter
     def scielo_pid_v3(self, value):
+        # os assets são indexados com o valor anterior
+        self.assets
         self.identity.scielo_pid_v3 = value
 
     @property
@@ -116,6 +121,8 @@ class SPS_Package:
 
     @property
     def assets(self):
+        if self._assets is None:
+            self._assets = SPS_Assets(self.xmltree, self.scielo_pid_v3)
         return self._assets
 
     @property
@@ -677,9 +684,68 @@ class SPS_Assets:
     def __init__(self, xml_tree, v3):
         self._xml_tree = xml_tree
         self._v3 = v3
-        self._assets_uri_and_node = self.get_assets_uri_and_node()
-        self._get_assets_which_have_id()
-        self._get_assets_which_have_no_id()
+        self._index_assets()
+
+    def _index_assets(self):
+        """
+        Index the assets in one traversal of the document.
+
+        Each asset is listed once for each of its ancestors which have `@id`,
+        except `sub-article`, and numbered in the order of the assets of that
+        ancestor. An element which has `@id` and no children lists all the
+        assets of the document. The assets which are not listed are numbered
+        in the order of the document, starting from 1.
+        """
+        root = self._xml_tree
+        if hasattr(root, "getroot"):
+            root = root.getroot()
+
+        self._assets_uri_and_node = []
+        # (node, assets) dos elementos que têm `@id`, na ordem do documento
+        nodes_with_id = []
+        # elementos que têm `@id` e contém o elemento atual
+        open_nodes_with_id = []
+        for event, node in etree.iterwalk(root, events=("start", "end")):
+            if node is root:
+                continue
+
+            if event == "end":
+                if open_nodes_with_id and open_nodes_with_id[-1][0] is node:
+                    open_nodes_with_id.pop()
+                continue
+
+            href = node.get("{http://www.w3.org/1999/xlink}href")
+            if href is not None and self._is_valid_sps_asset_uri(href):
+                self._assets_uri_and_node.append((href, node))
+                for _, asset_nodes in open_nodes_with_id:
+                    asset_nodes.append(node)
+
+            if node.tag == "sub-article" or node.get("id") is None:
+                continue
+            if len(node) == 0:
+                nodes_with_id.append((node, None))
+            else:
+                nodes_with_id.append((node, []))
+                open_nodes_with_id.append(nodes_with_id[-1])
+
+        self._assets_which_have_id = []
+        for node, asset_nodes in nodes_with_id:
+            if asset_nodes is None:
+                asset_nodes = [item[1] for item in self._assets_uri_and_node]
+            self._assets_which_have_id.extend(
+                SPS_Asset(child_node, node, _id=i)
+                for i, child_node in enumerate(asset_nodes)
+            )
+
+        has_id = set(item.asset_node for item in self._assets_which_have_id)
+        self._assets_which_have_no_id = [
+            SPS_Asset(node, _id=i)
+            for i, node in enumerate(
+                (node for uri, node in self._assets_uri_and_node
+                 if node not in has_id),
+                start=1,
+            )
+        ]
 
     def get_assets_uri_and_node(self, node=None):
         """
@@ -718,18 +784,6 @@ class SPS_Assets:
         """
         return self._assets_uri_and_node
 
-    def _get_assets_which_have_id(self):
-        self._assets_which_have_id = []
-        for node in self._xml_tree.xpath(".//*[@id]"):
-            if node.tag == "sub-article":
-                continue
-            i = 0
-            for uri, child_node in self.get_assets_uri_and_node(node):
-                self._assets_which_have_id.append(
-                    SPS_Asset(child_node, node, _id=i)
-                )
-                i += 1
-
     @property
     def assets_which_have_id(self):
         return self._assets_which_have_id
@@ -738,18 +792,6 @@ class SPS_Assets:
     def assets_which_have_no_id(self):
         return self._assets_which_have_no_id
 
-    def _get_assets_which_have_no_id(self):
-        has_id = [item.asset_node for item in self.assets_which_have_id]
-
-        i = 0
-        self._assets_which_have_no_id = []
-        for uri, node in self.assets_uri_and_node:
-            if node not in has_id:
-                i += 1
-                self._assets_which_have_no_id.append(
-                    SPS_Asset(node, _id=i)
-                )
-
     @property
     def items(self):
         return self.assets_which_have_id + self.assets_which_have_no_id
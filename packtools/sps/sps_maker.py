@@ -1,3 +1,5 @@
+import asyncio
+
 from packtools.sps.models import packages, sps_package
 from packtools.sps.libs import async_download, reqs
 from packtools import file_utils, file_utils_mimetype
@@ -72,11 +74,35 @@ def make_package_from_paths(paths, zip_folder=None):
     return package_metadata
 
 
-def make_package_from_uris(xml_uri, renditions_uris_and_names=[], zip_folder=None):
+def make_package_from_uris(xml_uri, renditions_uris_and_names=[], zip_folder=None, cache=None):
+    """
+    Versão síncrona de `make_package_from_uris_async`, que pode ser chamada
+    inclusive de dentro de um event loop em execução
+    (ver `async_download.run_coroutine`).
+    """
+    return async_download.run_coroutine(
+        make_package_from_uris_async(
+            xml_uri, renditions_uris_and_names, zip_folder, cache)
+    )
+
+
+async def make_package_from_uris_async(xml_uri, renditions_uris_and_names=[], zip_folder=None, cache=None):
+    """
+    Constrói pacote a partir de URIs. Se `cache`
+    (`packtools.sps.libs.http_cache.HTTPCache`) é informado, o XML e os
+    demais arquivos são obtidos por meio do cache, que evita obter novamente
+    os arquivos que não foram modificados.
+
+    As operações bloqueantes (obtenção do XML e criação do ZIP) são
+    executadas fora do event loop, então, vários pacotes podem ser
+    construídos simultaneamente em um mesmo event loop.
+    """
     package_metadata = {}
+    loop = asyncio.get_running_loop()
 
     try:
-        sps_package = _get_xml_sps_from_uri(xml_uri)
+        sps_package = await loop.run_in_executor(
+            None, _get_xml_sps_from_uri, xml_uri, cache)
     except exceptions.SPSDownloadXMLError:
         raise
 
@@ -95,18 +121,18 @@ def make_package_from_uris(xml_uri, renditions_uris_and_names=[], zip_folder=Non
     zip_filename = _get_zip_filename(sps_package)
 
     # cria um arquivo ZIP temporário com os arquivos das uris baixados
-    package_metadata['zip'] = _zip_files_from_uris_and_names(zip_filename, uris_and_names, zip_folder)
+    package_metadata['zip'] = await _zip_files_from_uris_and_names_async(zip_filename, uris_and_names, zip_folder, cache)
 
     return package_metadata
 
 
-def _get_xml_sps_from_uri(xml_uri):
+def _get_xml_sps_from_uri(xml_uri, cache=None):
     if xml_uri == '':
         raise exceptions.SPSXMLLinkError('XML URI is empty. Please, informe a link address.')
 
     if 'http' in xml_uri:
         try:
-            content = reqs.requests_get_content(xml_uri)
+            content = reqs.requests_get_content(xml_uri, cache=cache)
         except exceptions.SPSHTTPError as e:
             raise exceptions.SPSDownloadXMLError(f'It was not possible to download the XML file {xml_uri}. Status code {e}')
 
@@ -172,12 +198,19 @@ def _get_zip_filename(xml_sps, output_filename=None):
         return output_filename
 
 
-def _zip_files_from_uris_and_names(zip_name, uris_and_names, zip_folder=None):
+def _zip_files_from_uris_and_names(zip_name, uris_and_names, zip_folder=None, cache=None):
     uris_and_names = _remove_invalid_uris(uris_and_names)
-    downloaded_files = async_download.download_files(uris_and_names)
+    downloaded_files = async_download.download_files(uris_and_names, cache=cache)
     return file_utils.create_zip_file(downloaded_files, zip_name, zip_folder)
 
 
+async def _zip_files_from_uris_and_names_async(zip_name, uris_and_names, zip_folder=None, cache=None):
+    uris_and_names = _remove_invalid_uris(uris_and_names)
+    downloaded_files = await async_download.download_files_async(uris_and_names, cache=cache)
+    return await asyncio.get_running_loop().run_in_executor(
+        None, file_utils.create_zip_file, downloaded_files, zip_name, zip_folder)
+
+
 def _remove_invalid_uris(uris_and_names):
     """
     Remove as URIs inválidas, isto é, que não inicializam com o termo http.
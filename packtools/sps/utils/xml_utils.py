@@ -6,6 +6,7 @@ from lxml import etree
 from packtools import validations
 from packtools.sps import exceptions
 from packtools import file_utils
+from packtools.utils import get_xml_parser
 
 
 logger = logging.getLogger(__name__)
@@ -82,7 +83,7 @@ def _get_xml_content(xml):
 
 
 def get_xml_tree(content):
-    parser = etree.XMLParser(remove_blank_text=True, no_network=True)
+    parser = get_xml_parser(remove_blank_text=True, no_network=True)
     try:
         content = _get_xml_content(content)
         xml_tree = etree.XML(content, parser)
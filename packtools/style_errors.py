@@ -18,6 +18,11 @@ LOGGER = logging.getLogger(__name__)
 EXPOSE_ELEMENTNAME_PATTERN = re.compile(r"(?<=Element )'.*?'")
 
 
+# xpath expressions in the form ``//name`` that can be answered by the
+# element index, where ``name`` has no namespace prefix.
+DESCENDANT_BY_NAME_PATTERN = re.compile(r"^//([A-Za-z_][\w.\-]*)$")
+
+
 def search_element_name(message):
     """Try to locate in `message` the element name pointed as error.
 
@@ -40,7 +45,11 @@ def search_element_name(message):
 def search_element(doc, xpath, line=None):
     """Try to locate in `doc` the element expressed as `xpath`.
     """
-    for elem in doc.xpath(xpath):
+    return _first_at_line(doc.xpath(xpath), xpath, line)
+
+
+def _first_at_line(elements, xpath, line=None):
+    for elem in elements:
         if line is None:
             return elem
 
@@ -55,6 +64,87 @@ def search_element(doc, xpath, line=None):
     raise ValueError('could not find element "%s"' % xpath)
 
 
+class ElementIndex(object):
+    """Lookup tables for the nodes of ``doc``, so that locating the element
+    of each error doesn't require traversing the whole document.
+
+    The tables are built on first use, and assume ``doc`` is not modified
+    afterwards, so an index must be used only while the errors of a single
+    validation are resolved, e.g., during a call to ``summarize`` or
+    ``annotate_errors``, and then discarded.
+
+    :param doc: etree instance.
+    """
+    def __init__(self, doc):
+        self.doc = doc
+        self._by_line = None
+        self._by_tag = {}
+        self._by_tag_and_line = {}
+        self._xpath_results = {}
+
+    def element_at_line(self, line):
+        """The first node, in document order, at ``line``.
+        """
+        if self._by_line is None:
+            by_line = {}
+            for node in self.doc.iter():
+                by_line.setdefault(node.sourceline, node)
+            self._by_line = by_line
+
+        try:
+            return self._by_line[line]
+        except KeyError:
+            LOGGER.info("cannot find element at the line %s", line)
+            raise ValueError("cannot find element at the line %s" % line)
+
+    def elements_by_tag(self, tagname):
+        """All the elements named ``tagname``, in document order.
+        """
+        try:
+            return self._by_tag[tagname]
+        except KeyError:
+            elements = self._by_tag[tagname] = list(self.doc.iter(tagname))
+            return elements
+
+    def search(self, xpath, line=None):
+        """Like :func:`search_element`, but reuses the results of previous
+        lookups.
+        """
+        match = DESCENDANT_BY_NAME_PATTERN.match(xpath)
+        if match is None:
+            try:
+                elements = self._xpath_results[xpath]
+            except KeyError:
+                elements = self._xpath_results[xpath] = self.doc.xpath(xpath)
+
+        elif line is None:
+            elements = self.elements_by_tag(match.group(1))
+
+        else:
+            tagname = match.group(1)
+            try:
+                by_line = self._by_tag_and_line[tagname]
+            except KeyError:
+                by_line = self._by_tag_and_line[tagname] = {}
+                for elem in reversed(self.elements_by_tag(tagname)):
+                    by_line[elem.sourceline] = elem
+
+            elem = by_line.get(line)
+            elements = [] if elem is None else [elem]
+
+        return _first_at_line(elements, xpath, line)
+
+
+def _get_element_index(doc, index=None):
+    """Returns ``index`` if it was built for ``doc``, or a new
+    :class:`ElementIndex` otherwise.
+    """
+    if index is not None and index.doc is doc:
+        return index
+
+    return ElementIndex(doc)
+
+
 #--------------------------------
 # adapters for XML style errors
 #--------------------------------
@@ -66,11 +156,14 @@ class StyleErrorBase(object):
     line = message = level = None
     label = u''
 
-    def get_apparent_element(self, doc):
+    def get_apparent_element(self, doc, index=None):
         """The apparent element presenting the error at doc.
 
         This base implementation tries to discover the element name by
         searching the string pattern `Element 'element name'` on message.
+
+        :param index: (optional) :class:`ElementIndex` of ``doc``, shared by
+                      the errors resolved against it.
         """
         return NotImplemented
 
@@ -80,14 +173,15 @@ class StyleError(StyleErrorBase):
     """
     level = u'Style Error'
 
-    def get_apparent_element(self, doc):
+    def get_apparent_element(self, doc, index=None):
         """The apparent element presenting the error at doc.
 
         This base implementation tries to discover the element name by
         searching the string pattern `Element 'element name'` on message.
         """
         tagname = search_element_name(self.message)
-        return search_element(doc, '//' + tagname, line=self.line)
+        return _get_element_index(doc, index).search('//' + tagname,
+                                                     line=self.line)
 
 
 class SchemaStyleError(StyleErrorBase):
@@ -101,13 +195,8 @@ class SchemaStyleError(StyleErrorBase):
         self.line = self._err.line
         self.label = label
 
-    def get_apparent_element(self, doc):
-        for elem in doc.iter():
-            if elem.sourceline == self.line:
-                return elem
-
-        LOGGER.info("cannot find element at the line %s", self.line)
-        raise ValueError("cannot find element at the line %s" % self.line)
+    def get_apparent_element(self, doc, index=None):
+        return _get_element_index(doc, index).element_at_line(self.line)
 
 
 class SchematronStyleError(StyleErrorBase):
@@ -115,12 +204,12 @@ class SchematronStyleError(StyleErrorBase):
     """
     level = u'Style Error'
 
-    def __init__(self, err_object, label=u''):
+    def __init__(self, err_object, label=u'', location=None):
         self._err = err_object
         self.label = label
-
-        byte_string = io.BytesIO(self._err.message.encode('utf-8'))
-        self._parsed_message = etree.parse(byte_string)
+        # the SVRL payload is parsed only if the location is needed and was
+        # not informed, e.g., by :func:`iter_schematron_errors`.
+        self._location = location
 
     @property
     def message(self):
@@ -133,12 +222,68 @@ class SchematronStyleError(StyleErrorBase):
 
         return text.strip()
 
-    def get_apparent_element(self, doc):
-        query_res = self._parsed_message.xpath('@location')
-        try:
-            tagname = query_res[0]
-        except IndexError:
-            raise ValueError('cannot get context info')
+    def _get_location(self):
+        if self._location is None:
+            byte_string = io.BytesIO(self._err.message.encode('utf-8'))
+            parsed_message = etree.parse(byte_string)
+            query_res = parsed_message.xpath('@location')
+            try:
+                self._location = query_res[0]
+            except IndexError:
+                raise ValueError('cannot get context info')
+
+        return self._location
+
+    def get_apparent_element(self, doc, index=None):
+        tagname = self._get_location()
+        return _get_element_index(doc, index).search(tagname)
+
 
-        return search_element(doc, tagname)
+# implementations of ``get_apparent_element`` that accept an ``index``.
+_INDEXED_GET_APPARENT_ELEMENT = frozenset([
+    StyleErrorBase.get_apparent_element,
+    StyleError.get_apparent_element,
+    SchemaStyleError.get_apparent_element,
+    SchematronStyleError.get_apparent_element,
+])
+
+
+def get_apparent_element(error, doc, index):
+    """The apparent element presenting ``error`` at ``doc``, located by means
+    of ``index`` when ``error`` uses one of the implementations of this module.
+
+    Subclasses that override ``get_apparent_element(doc)``, without the
+    ``index`` parameter, keep being called with ``doc`` only.
+    """
+    method = getattr(type(error), 'get_apparent_element', None)
+    if method in _INDEXED_GET_APPARENT_ELEMENT:
+        return error.get_apparent_element(doc, index)
+
+    return error.get_apparent_element(doc)
+
+
+def iter_schematron_errors(error_log, label=u''):
+    """Returns a generator of :class:`SchematronStyleError` for each entry
+    of the schematron `error_log`.
+
+    The SVRL payloads of all entries are parsed at once, instead of one at a
+    time, and the location of each error is taken from the result. If this
+    is not possible, the payloads will be parsed on demand.
+
+    :param error_log: the error log of an `isoschematron.Schematron` instance.
+    :param label: (optional) the label of the errors.
+    """
+    entries = list(error_log)
+    report = '<report>%s</report>' % ''.join(err.message for err in entries)
+    try:
+        parsed_report = etree.fromstring(report.encode('utf-8'))
+    except etree.XMLSyntaxError as exc:
+        LOGGER.info('cannot parse the schematron report: %s', exc)
+        locations = [None] * len(entries)
+    else:
+        locations = [elem.get('location') for elem in parsed_report]
+        if len(locations) != len(entries):
+            locations = [None] * len(entries)
 
+    for err, location in zip(entries, locations):
+        yield SchematronStyleError(err, label=label, location=location)
@@ -7,12 +7,15 @@ import pkg_resources
 import json
 import logging
 import pathlib
+import functools
+from concurrent import futures
 
 from lxml import etree
 
 import packtools
 from packtools import exceptions
 from packtools import catalogs
+from packtools import style_errors
 
 __all__ = ['summarize', 'annotate']
 
@@ -37,6 +40,24 @@ AVAILABLE_SCHEMAS = ', '.join(sorted(['@'+key
     for key in catalogs.SCH_SCHEMAS.keys()]))
 
 
+def _get_extra_schemas(extra_sch):
+    """Returns a list of ``isoschematron.Schematron`` for the paths or
+    references in ``extra_sch``.
+
+    The returned list is cached due to performance reasons.
+    """
+    cache = packtools.utils.setdefault(_get_extra_schemas, 'cache', lambda: {})
+    key = tuple(extra_sch)
+
+    if key not in cache:
+        paths = [packtools.utils.resolve_schematron_filepath(path_or_ref)
+                 for path_or_ref in key]
+        cache[key] = [packtools.utils.get_schematron_from_filepath(path)
+                      for path in paths]
+
+    return cache[key]
+
+
 def get_xmlvalidator(xmlpath, no_network, extra_sch):
     """ Get an instance of ``packtools.XMLValidator``.
 
@@ -47,10 +68,7 @@ def get_xmlvalidator(xmlpath, no_network, extra_sch):
     parsed_xml = packtools.XML(xmlpath, no_network=no_network)
     _extra_sch = list(extra_sch)
     if _extra_sch:
-        paths = [packtools.utils.resolve_schematron_filepath(path_or_ref)
-                 for path_or_ref in _extra_sch]
-        schemas = [packtools.utils.get_schematron_from_filepath(path)
-                   for path in paths]
+        schemas = _get_extra_schemas(_extra_sch)
         labeled_schemas = zip(schemas, _extra_sch)
     else:
         labeled_schemas = None
@@ -61,15 +79,15 @@ def get_xmlvalidator(xmlpath, no_network, extra_sch):
 
 def annotate(validator, buff, encoding=None):
     _encoding = encoding or validator.encoding
-    err_xml = validator.annotate_errors()
-
-    buff.write(etree.tostring(err_xml, pretty_print=True,
-        encoding=_encoding, xml_declaration=True))
+    validator.write_annotated(buff, encoding=_encoding)
 
 
 def summarize(validator, assets_basedir=None):
     """Produce a summarized result of the validation.
     """
+    # shared by the errors of this call only
+    index = style_errors.ElementIndex(validator.lxml)
+
     def _make_err_message(err):
         """ An error message is comprised of the message itself and the
         element sourceline.
@@ -77,7 +95,8 @@ def summarize(validator, assets_basedir=None):
         err_msg = {'message': err.message}
 
         try:
-            err_element = err.get_apparent_element(validator.lxml)
+            err_element = style_errors.get_apparent_element(
+                err, validator.lxml, index)
         except ValueError:
             LOGGER.info('could not find the element name in message')
             err_element = None
@@ -156,6 +175,107 @@ def validate_zip_package(filepath):
             yield (xml, summary, exc_type, exc_value)
 
 
+def _validate_file(xml, no_network, extra_sch, annotated, assetsdir):
+    """Validates the XML at ``xml``.
+
+    Returns a 5-tuple in the form:
+    (<xml>, <exit_status>, <summary>, <out_message>, <err_message>)
+    where ``summary`` is ``None`` if the XML was annotated or could not be
+    validated, and the messages, if any, must be written to stdout and stderr
+    respectively.
+    """
+    LOGGER.info('starting validation of "%s"', xml)
+
+    try:
+        validator = get_xmlvalidator(xml, no_network, extra_sch)
+
+    except (etree.XMLSyntaxError, exceptions.XMLDoctypeError,
+            exceptions.XMLSPSVersionError) as exc:
+        LOGGER.exception(exc)
+        return (xml, 1, None, None,
+                ERR_MESSAGE.format(filename=xml, details=exc))
+
+    if annotated:
+
+        fname, fext = xml.rsplit('.', 1)
+        out_fname = '.'.join([fname, 'annotated', fext])
+
+        with open(out_fname, 'wb') as fp:
+            annotate(validator, fp)
+
+        is_valid, _ = validator.validate_all()
+        status = 1 if is_valid is False else 0
+
+        LOGGER.info('finished validating "%s"', xml)
+        return (xml, status, None, 'Annotated XML file: "%s"' % out_fname,
+                None)
+
+    # remote XML will not lookup for assets
+    if xml.startswith(('http:', 'https:')):
+        LOGGER.info('disabling assets lookup since "%s" is a '
+                    'remote file', xml)
+        assetsdir_files = []
+    else:
+        assetsdir = assetsdir or os.path.dirname(xml)
+        assetsdir_files = os.listdir(assetsdir)  # list of files in dir
+
+    try:
+        summary = summarize(validator, assets_basedir=assetsdir_files)
+    except TypeError as exc:
+        LOGGER.exception(exc)
+        LOGGER.info(
+                'error validating "%s". Skipping. '
+                'run with option `--loglevel INFO` for more info',
+                xml)
+        return (xml, 0, None, None, None)
+
+    # set the exit status to 1 if the xml is not valid
+    status = 1 if summary['is_valid'] is False else 0
+
+    LOGGER.info('finished validating "%s"', xml)
+    return (xml, status, summary, None, None)
+
+
+def _init_worker(extra_sch):
+    """Warms-up the schematron caches of a worker process, so that the cost
+    of loading the schemas is paid once per worker instead of once per file.
+
+    The DTD is not warmed-up: libxml2 loads the external DTD while parsing
+    each document, so there is nothing to be reused across files.
+    """
+    for sps_version in catalogs.CURRENTLY_SUPPORTED_VERSIONS:
+        try:
+            packtools.domain.StdSchematron(sps_version)
+        except ValueError as exc:
+            LOGGER.info('cannot warm-up schematron cache: %s', exc)
+
+    if extra_sch:
+        _get_extra_schemas(extra_sch)
+
+
+def _iter_results(func, xmls, jobs=1, unordered=False, initargs=()):
+    """Produces the results of ``func`` applied to each item of ``xmls``.
+
+    When ``jobs > 1`` the items are processed by a pool of worker processes,
+    each one initialized by :func:`_init_worker` with ``initargs``. The
+    results are produced in input order, unless ``unordered`` is set.
+    """
+    if jobs <= 1:
+        for xml in xmls:
+            yield func(xml)
+        return
+
+    with futures.ProcessPoolExecutor(max_workers=jobs,
+            initializer=_init_worker, initargs=initargs) as executor:
+        if unordered:
+            pending = [executor.submit(func, xml) for xml in xmls]
+            for future in futures.as_completed(pending):
+                yield future.result()
+        else:
+            for result in executor.map(func, xmls):
+                yield result
+
+
 @packtools.utils.config_xml_catalog
 def _main():
     exit_status = 0
@@ -184,6 +304,10 @@ def _main():
                         help='runs an extra validation using an external schematron schema. built-in schemas are available through the prefix `@`: %s.' % AVAILABLE_SCHEMAS)
     parser.add_argument('--sysinfo', action='store_true',
                         help='show program\'s installation info and exit.')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of worker processes used to validate the files in parallel.')
+    parser.add_argument('--unordered', action='store_true',
+                        help='when running with --jobs, the results are written as soon as they are ready instead of in input order.')
     parser.add_argument('file', nargs='*',
                         help='filesystem path or URL to the XML')
     args = parser.parse_args()
@@ -203,55 +327,21 @@ def _main():
 
     LOGGER.info('running with catalog: %s', catalogs.NAME)
 
-    for xml in packtools.utils.flatten(input_args):
-        LOGGER.info('starting validation of "%s"', xml)
+    validate = functools.partial(_validate_file,
+            no_network=args.nonetwork, extra_sch=args.extrasch,
+            annotated=args.annotated, assetsdir=args.assetsdir)
+    results = _iter_results(validate, packtools.utils.flatten(input_args),
+            jobs=args.jobs, unordered=args.unordered,
+            initargs=(args.extrasch,))
 
-        try:
-            validator = get_xmlvalidator(xml, args.nonetwork, args.extrasch)
-
-        except (etree.XMLSyntaxError, exceptions.XMLDoctypeError,
-                exceptions.XMLSPSVersionError) as exc:
-            LOGGER.exception(exc)
-            print(ERR_MESSAGE.format(filename=xml, details=exc),
-                    file=sys.stderr)
-            exit_status = 1
-            continue
-
-        if args.annotated:
-
-            fname, fext = xml.rsplit('.', 1)
-            out_fname = '.'.join([fname, 'annotated', fext])
-
-            with open(out_fname, 'wb') as fp:
-                annotate(validator, fp)
+    for xml, status, summary, out_message, err_message in results:
+        if err_message:
+            print(err_message, file=sys.stderr)
 
-            is_valid, _ = validator.validate_all()
-            if is_valid is False:
-                exit_status = 1
-
-            print('Annotated XML file: "%s"' % out_fname)
-
-        else:
-            # remote XML will not lookup for assets
-            if xml.startswith(('http:', 'https:')):
-                LOGGER.info('disabling assets lookup since "%s" is a '
-                            'remote file', xml)
-                assetsdir = ''
-                assetsdir_files = []
-            else:
-                assetsdir = args.assetsdir or os.path.dirname(xml)
-                assetsdir_files = os.listdir(assetsdir)  # list of files in dir
-
-            try:
-                summary = summarize(validator, assets_basedir=assetsdir_files)
-            except TypeError as exc:
-                LOGGER.exception(exc)
-                LOGGER.info(
-                        'error validating "%s". Skipping. '
-                        'run with option `--loglevel INFO` for more info',
-                        xml)
-                continue
+        if out_message:
+            print(out_message)
 
+        if summary is not None:
             summary['_xml'] = xml
 
             if args.raw:
@@ -259,11 +349,8 @@ def _main():
             else:
                 summary_list.append(summary)
 
-            # set the exit status to 1 if the xml is not valid
-            if summary['is_valid'] is False:
-                exit_status = 1
-
-        LOGGER.info('finished validating "%s"', xml)
+        if status:
+            exit_status = 1
 
     if summary_list:
         print(packtools.utils.prettify(summary_list, colorize=args.nocolors))
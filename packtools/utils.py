@@ -3,6 +3,7 @@ from __future__ import unicode_literals
 import logging
 import functools
 import itertools
+import bisect
 import os
 import glob
 import sys
@@ -10,6 +11,12 @@ import json
 import unicodedata
 import zipfile
 import io
+import copy
+import shutil
+import hashlib
+import tempfile
+import threading
+from concurrent import futures
 
 from lxml import etree, isoschematron
 from PIL import Image, ImageFile
@@ -84,7 +91,42 @@ def get_static_assets(xml_et):
     return [element.attrib['{http://www.w3.org/1999/xlink}href'] for element in elements]
 
 
-def XML(file, no_network=True, load_dtd=True):
+_XML_PARSERS = threading.local()
+
+
+def get_xml_parser(no_network=True, load_dtd=False, remove_blank_text=False,
+                   collect_ids=True, huge_tree=False):
+    """Returns an ``etree.XMLParser`` instance configured with the given
+    options.
+
+    Parsers are reused for each set of options, to avoid the cost of setting
+    up a new one for each document. lxml parsers must not be shared between
+    threads, so each thread has its own registry.
+
+    :param no_network: (optional) prevent network access for external DTD.
+    :param load_dtd: (optional) load DTD during parse-time.
+    :param remove_blank_text: (optional) discard blank text nodes.
+    :param collect_ids: (optional) collect the XML IDs in a hash table.
+    :param huge_tree: (optional) disable the security restrictions on very
+                      deep trees and very long text content.
+    """
+    try:
+        parsers = _XML_PARSERS.registry
+    except AttributeError:
+        parsers = _XML_PARSERS.registry = {}
+
+    key = (no_network, load_dtd, remove_blank_text, collect_ids, huge_tree)
+    try:
+        return parsers[key]
+    except KeyError:
+        parser = parsers[key] = etree.XMLParser(no_network=no_network,
+                load_dtd=load_dtd, remove_blank_text=remove_blank_text,
+                collect_ids=collect_ids, huge_tree=huge_tree)
+        return parser
+
+
+def XML(file, no_network=True, load_dtd=True, collect_ids=True,
+        huge_tree=False):
     """Parses `file` to produce an etree instance.
 
     The XML can be retrieved given its filesystem path,
@@ -93,28 +135,157 @@ def XML(file, no_network=True, load_dtd=True):
     :param file: Path to the XML file, URL or file-object.
     :param no_network: (optional) prevent network access for external DTD.
     :param load_dtd: (optional) load DTD during parse-time.
+    :param collect_ids: (optional) collect the XML IDs in a hash table.
+    :param huge_tree: (optional) allow very deep trees and long text content.
     """
-    parser = etree.XMLParser(remove_blank_text=True,
-                             load_dtd=load_dtd,
-                             no_network=no_network)
+    parser = get_xml_parser(remove_blank_text=True,
+                            load_dtd=load_dtd,
+                            no_network=no_network,
+                            collect_ids=collect_ids,
+                            huge_tree=huge_tree)
     xml = etree.parse(file, parser)
 
     return xml
 
 
-def get_schematron_from_buffer(buff, parser=NOIDS_XMLPARSER):
+class SchematronLogEntry(object):
+    """An entry of the error log of :class:`PrecompiledSchematron`, with the
+    attributes of the ``lxml`` log entries that are used by packtools.
+    """
+    def __init__(self, message, filename, line=0):
+        self.message = message
+        self.filename = filename
+        self.line = line
+
+    def __repr__(self):
+        return '<SchematronLogEntry %r>' % self.message
+
+
+class PrecompiledSchematron(object):
+    """A Schematron validator built straight from its validation XSLT.
+
+    The include, expand and compile steps of the ISO skeleton implementation
+    are skipped, which makes it cheap to instantiate. Only the public
+    ``etree.XSLT`` API is used, and the interface of
+    ``isoschematron.Schematron`` used by packtools is provided: ``validate``,
+    ``__call__``, ``error_log`` and ``validator_xslt``. Like in
+    ``isoschematron.Schematron``, only failed asserts are reported.
+
+    :param validator_xslt: etree instance of the validation XSLT, as produced
+                           by ``isoschematron.Schematron(..., store_xslt=True)``.
+    """
+    def __init__(self, validator_xslt):
+        self.validator_xslt = validator_xslt
+        self.error_log = []
+        self._validator = etree.XSLT(validator_xslt)
+
+    def __call__(self, doc):
+        """Validates ``doc``. Returns ``True`` if it is valid and ``False``
+        otherwise, and the errors are available at ``error_log``.
+        """
+        report = self._validator(doc)
+        errors = isoschematron.svrl_validation_errors(report)
+        if not errors:
+            self.error_log = []
+            return True
+
+        if etree.iselement(doc):
+            filename = doc.getroottree().docinfo.URL or '<file>'
+        else:
+            filename = doc.docinfo.URL or '<file>'
+        self.error_log = [
+            SchematronLogEntry(etree.tostring(error, encoding='unicode'),
+                               filename)
+            for error in errors]
+        return False
+
+    validate = __call__
+
+
+def _write_file_atomically(filepath, data):
+    """Writes ``data``, bytes or a file-object, to ``filepath`` so that
+    concurrent readers never see a partially written file.
+    """
+    dirname = os.path.dirname(filepath)
+    os.makedirs(dirname, exist_ok=True)
+
+    fd, tmp_filepath = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            if hasattr(data, 'read'):
+                shutil.copyfileobj(data, fp)
+            else:
+                fp.write(data)
+        os.replace(tmp_filepath, filepath)
+    except:
+        os.unlink(tmp_filepath)
+        raise
+
+
+def _get_cached_schematron(xmlschema_doc, cache_dir):
+    """Returns an ``isoschematron.Schematron`` for ``xmlschema_doc``, reusing
+    the validation XSLT persisted at ``cache_dir`` when it is available.
+
+    The cache key is the digest of the schema after its inclusions are
+    processed, so changes on included schemas are detected as well.
+    """
+    included_doc = isoschematron.iso_dsdl_include(xmlschema_doc)
+
+    digest = hashlib.sha256(etree.tostring(included_doc))
+    digest.update(repr(etree.LXML_VERSION).encode('ascii'))
+    cache_filepath = os.path.join(cache_dir, digest.hexdigest() + '.xsl')
+
+    try:
+        validator_xslt = etree.parse(cache_filepath, NOIDS_XMLPARSER)
+    except (IOError, etree.XMLSyntaxError):
+        LOGGER.info('cache miss for schematron validator "%s"', cache_filepath)
+    else:
+        LOGGER.info('loading schematron validator from "%s"', cache_filepath)
+        return PrecompiledSchematron(validator_xslt)
+
+    schematron = isoschematron.Schematron(included_doc, include=False,
+                                          store_xslt=True)
+    try:
+        _write_file_atomically(cache_filepath,
+                               etree.tostring(schematron.validator_xslt))
+    except (IOError, OSError) as exc:
+        LOGGER.info('cannot write schematron validator to cache: %s', exc)
+
+    return schematron
+
+
+def get_schematron_from_buffer(buff, parser=NOIDS_XMLPARSER, cache_dir=None):
     """Returns an ``isoschematron.Schematron`` for ``buff``.
 
     The default parser doesn't collect ids on a hash table, i.e.:
     ``collect_ids=False``.
+
+    :param cache_dir: (optional) directory where the compiled validation XSLT
+                      is persisted and looked up. The cache is disabled if it
+                      is not set.
     """
     xmlschema_doc = etree.parse(buff, parser)
+    if cache_dir:
+        return _get_cached_schematron(xmlschema_doc, cache_dir)
+
     return isoschematron.Schematron(xmlschema_doc)
 
 
-def get_schematron_from_filepath(filepath):
+def get_schematron_from_filepath(filepath, cache_dir=None):
+    """Returns an ``isoschematron.Schematron`` for the file at ``filepath``.
+
+    :param cache_dir: (optional) directory where the compiled validation XSLT
+                      is persisted. The default value is set by
+                      :data:`packtools.catalogs.SCHEMATRON_CACHE_DIR`, which
+                      is only set through the environment variable
+                      ``PACKTOOLS_SCHEMATRON_CACHE_DIR``, i.e., the cache is
+                      disabled unless it is asked for.
+    """
+    if cache_dir is None:
+        cache_dir = getattr(catalogs, 'SCHEMATRON_CACHE_DIR', None)
+
     with open(filepath, mode='rb') as buff:
-        return get_schematron_from_buffer(buff)
+        return get_schematron_from_buffer(buff, cache_dir=cache_dir)
 
 
 def config_xml_catalog(wrapped):
@@ -286,6 +457,113 @@ def resolve_schematron_filepath(value):
         raise ValueError('could not locate file "%s" (I/O failure)' % value)
 
 
+class WebImageCache(object):
+    """On-disk cache of WEB images, addressed by the digest of their source
+    images and the spec of the WEB images.
+
+    Basic usage:
+
+    .. code-block:: python
+
+        image_cache = WebImageCache(cache_dir, max_size=2 * 1024 ** 3)
+        key = image_cache.get_key(source_digest, ("PNG", None, None))
+        file_bytes = image_cache.get(key)
+        if file_bytes is None:
+            image_cache.set(key, new_file_bytes)
+
+    :param cache_dir: directory where the WEB images are persisted
+    :param max_size: (optional) maximum size of the cache, in bytes. When it is
+        exceeded, the least recently used WEB images are removed.
+    """
+
+    def __init__(self, cache_dir, max_size=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(source_digest, spec):
+        """Return the key of the WEB image described by ``spec``, a tuple of
+        format, size and quality, produced from the source image whose SHA-256
+        hex digest is ``source_digest``."""
+        digest = hashlib.sha256(source_digest.encode("ascii"))
+        digest.update(repr(tuple(spec)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _get_filepath(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        """Return the bytes of the WEB image addressed by ``key``, or None."""
+        filepath = self._get_filepath(key)
+        try:
+            with open(filepath, "rb") as fp:
+                file_bytes = fp.read()
+        except (IOError, OSError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            # the modification time is the last use of the image
+            os.utime(filepath, None)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return file_bytes
+
+    def set(self, key, file_bytes):
+        """Persist the bytes of the WEB image addressed by ``key``. ``file_bytes``
+        may also be a file-object, which is read from its current position."""
+        filepath = self._get_filepath(key)
+        try:
+            _write_file_atomically(filepath, file_bytes)
+            file_size = os.path.getsize(filepath)
+        except (IOError, OSError) as exc:
+            LOGGER.info("cannot write WEB image to cache: %s", exc)
+            return
+
+        if self.max_size is not None:
+            with self._lock:
+                if self._size is None:
+                    self._size = sum(size for _, size, _ in self._list_files())
+                else:
+                    self._size += file_size
+                if self._size > self.max_size:
+                    self._evict()
+
+    def _list_files(self):
+        for dirpath, __, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                filepath = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, filepath
+
+    def _evict(self):
+        # the files are listed again, since the cache may be shared by many
+        # processes
+        files = sorted(self._list_files())
+        self._size = sum(size for _, size, _ in files)
+        for __, size, filepath in files:
+            if self._size <= self.max_size:
+                break
+            try:
+                os.remove(filepath)
+            except OSError:
+                continue
+            LOGGER.debug('evicted "%s" from WEB images cache', filepath)
+            self._size -= size
+
+
 class WebImageGenerator:
     """Generate WEB Images versions of a given Image.
 
@@ -300,13 +578,28 @@ class WebImageGenerator:
     :param image_file_dir: directory where ``image_filename`` is and where new versions
         will be saved
     :param file_bytes: image file bytes
+    :param file_stream: seekable file-object of the image file, read as the image
+        is decoded. It is an alternative to ``file_bytes``, which avoids holding the
+        whole image file in memory.
+    :param max_pixels: (optional) maximum number of pixels of the image. Larger
+        images are refused before they are decoded. It limits the size of the images
+        accepted, not the memory used to decode them: only JPEG images opened from
+        ``file_stream`` are decoded reduced for thumbnails (``Image.draft``), images
+        of other formats, such as TIFF, are decoded in full.
     """
 
-    def __init__(self, image_filename, image_file_dir, file_bytes=None):
+    def __init__(
+        self, image_filename, image_file_dir, file_bytes=None, file_stream=None,
+        max_pixels=None,
+    ):
         self.filename = image_filename
         self.thumbnail_size = (267, 140)
         self.image_file_path = os.path.join(image_file_dir, image_filename)
-        self._image_object = self._get_image_object(file_bytes)
+        self.max_pixels = max_pixels
+        if file_stream is not None:
+            self._image_object = self._open_image_object(file_stream)
+        else:
+            self._image_object = self._get_image_object(file_bytes)
 
     def _get_image_object(self, file_bytes):
         if file_bytes is not None:
@@ -319,8 +612,29 @@ class WebImageGenerator:
                     'Error reading image "%s": %s' % (self.filename, str(exc))
                 )
             else:
+                self._check_image_size(image)
                 return image
 
+    def _open_image_object(self, file_stream):
+        # only the header is read, the pixels are decoded when they are needed
+        try:
+            image = Image.open(file_stream)
+        except (Image.DecompressionBombError, IOError, ValueError) as exc:
+            raise exceptions.WebImageGeneratorError(
+                'Error reading image "%s": %s' % (self.filename, str(exc))
+            )
+        else:
+            self._check_image_size(image)
+            return image
+
+    def _check_image_size(self, image):
+        width, height = image.size
+        if self.max_pixels is not None and width * height > self.max_pixels:
+            raise exceptions.WebImageGeneratorError(
+                'Error reading image "%s": %s pixels exceeds the limit of %s pixels'
+                % (self.filename, width * height, self.max_pixels)
+            )
+
     @property
     def png_filename(self):
         return os.path.splitext(self.filename)[0] + ".png"
@@ -329,6 +643,16 @@ class WebImageGenerator:
     def thumbnail_filename(self):
         return os.path.splitext(self.filename)[0] + ".thumbnail.jpg"
 
+    @property
+    def png_spec(self):
+        """Format, size and quality of the PNG image."""
+        return ("PNG", None, None)
+
+    @property
+    def thumbnail_spec(self):
+        """Format, size and quality of the thumbnail image."""
+        return ("JPEG", self.thumbnail_size, None)
+
     def convert2png(self, destination_path=None):
         """Generate a PNG file from image file with the same name, changing only the
         file extension. If ``destination_path`` is given, the new image is saved in it,
@@ -386,40 +710,112 @@ class WebImageGenerator:
             finally:
                 image_file.close()
 
-    def _get_bytes(self, format):
-        image_file = io.BytesIO()
+    def _get_rgb_image(self):
+        # the image is converted once, releasing the original pixels, so that
+        # every derivative is produced from the same decoded frame.
+        if self._image_object.mode != "RGB":
+            self._image_object = self._image_object.convert("RGB")
+        return self._image_object
+
+    def _write(self, fp, format, size=None):
+        if self._image_object is None:
+            raise exceptions.WebImageGeneratorError(
+                'Error optimising image bytes from "%s": '
+                "no original file bytes was given." % self.filename
+            )
+
         try:
-            self._image_object.convert("RGB").save(image_file, format)
+            if size is not None:
+                # images not decoded yet, e.g. JPEG files opened from streams,
+                # are decoded already reduced to about twice the requested size.
+                # other formats, such as TIFF, ignore it and are decoded in full
+                self._image_object.draft("RGB", (size[0] * 2, size[1] * 2))
+            image = self._get_rgb_image()
+            if size is not None:
+                # the image is resized in place, so thumbnails must be the
+                # last derivatives produced by an instance.
+                image.thumbnail(size)
+            image.save(fp, format)
         except (ValueError, IOError) as exc:
             raise exceptions.WebImageGeneratorError(
                 'Error optimising image bytes from "%s": %s' % (self.filename, str(exc))
             )
-        else:
-            return image_file.getvalue()
+
+    def _get_bytes(self, format, size=None):
+        image_file = io.BytesIO()
+        self._write(image_file, format, size)
+        return image_file.getvalue()
 
     def get_png_bytes(self):
         """Generate a PNG image byte-like object from image file set in
         ``self._image_object``."""
-        if self._image_object is None:
-            raise exceptions.WebImageGeneratorError(
-                'Error optimising image bytes from "%s": '
-                "no original file bytes was given." % self.filename
-            )
-
         return self._get_bytes("PNG")
 
     def get_thumbnail_bytes(self):
         """Generate a thumbnail image byte-like object from image file set in
         ``self._image_object``."""
-        if self._image_object is None:
-            raise exceptions.WebImageGeneratorError(
-                'Error optimising image bytes from "%s": '
-                'no original file bytes was given.'
-                % self.filename
+        return self._get_bytes("JPEG", self.thumbnail_size)
+
+    def write_png(self, fp):
+        """Write a PNG image, from image file set in ``self._image_object``, to the
+        file-object ``fp``."""
+        self._write(fp, "PNG")
+
+    def write_thumbnail(self, fp):
+        """Write a thumbnail image, from image file set in ``self._image_object``, to
+        the file-object ``fp``."""
+        self._write(fp, "JPEG", self.thumbnail_size)
+
+
+class _FilenameIndex(object):
+    """Index of file names, to look them up by name, by TIFF file name without
+    extension and by substring.
+
+    :param filenames: iterable of file names. If many TIFF files have the same
+        name without extension, the first one is looked up.
+    """
+
+    def __init__(self, filenames):
+        self._filenames = list(dict.fromkeys(filenames))
+        self._names = set(self._filenames)
+        self._tiffs_by_root = {}
+        for filename in self._filenames:
+            filename_root, filename_ext = os.path.splitext(filename)
+            if ".tif" in filename_ext:
+                self._tiffs_by_root.setdefault(filename_root, filename)
+        # the file names are joined by a character which is never part of a
+        # file name, so that a substring is searched once in all of them
+        self._joined_filenames = "\0".join(self._filenames)
+        self._offsets = list(
+            itertools.accumulate(
+                [len(filename) + 1 for filename in self._filenames[:-1]], initial=0
             )
+        )
 
-        self._image_object.thumbnail(self.thumbnail_size)
-        return self._get_bytes("JPEG")
+    def __contains__(self, filename):
+        return filename in self._names
+
+    def get_tiff(self, filename_root):
+        """Return the TIFF file name whose name without extension is
+        ``filename_root``, or None if there is none."""
+        return self._tiffs_by_root.get(filename_root)
+
+    def search(self, text):
+        """Generate the file names which contain ``text``."""
+        if not self._filenames or "\0" in text:
+            return
+        position = self._joined_filenames.find(text)
+        while position != -1:
+            index = bisect.bisect_right(self._offsets, position) - 1
+            yield self._filenames[index]
+            if index + 1 == len(self._offsets):
+                break
+            position = self._joined_filenames.find(text, self._offsets[index + 1])
+
+
+# maximum number of threads used by default to produce the WEB images, since each
+# one holds a decoded image in memory
+DEFAULT_MAX_WORKERS = 4
 
 
 class XMLWebOptimiser(object):
@@ -444,16 +840,40 @@ class XMLWebOptimiser(object):
     :param work_dir: directory path to work with image optimization
     :param stop_if_error: (bool) if True, it raises exceptions.XMLWebOptimiserError for
         handled exceptions, otherwise it logs error message.
+    :param max_workers: (int) maximum number of threads used to produce the WEB
+        images concurrently. Defaults to the number of processors, up to
+        ``DEFAULT_MAX_WORKERS``. Each thread holds one decoded source image at a
+        time, so the memory used to produce the WEB images grows with it (about
+        width * height * 3 bytes per image, i.e. ~150 MB for a 7000x7000 TIFF). Use
+        ``max_image_pixels`` to refuse larger images.
+    :param image_cache: (WebImageCache) cache looked up for WEB images before the
+        source images are decoded. The cache is disabled if it is not set.
+    :param open_file: (optional) function to open a file from source as a seekable
+        file-object, which raises exceptions.SPPackageError if an error occurs. If
+        it is given, images are decoded from streams and the WEB images are written
+        to temporary files, which are given instead of bytes, so that the image files
+        are not held in memory. The decoded images still are: JPEG thumbnails are
+        decoded reduced, but TIFF images are decoded in full, see ``max_image_pixels``.
+    :param max_image_pixels: (int) maximum number of pixels of the images to
+        optimise. Larger images are handled as errors, before they are decoded.
     """
 
     def __init__(
-        self, filename, image_filenames, read_file, work_dir, stop_if_error=False
+        self, filename, image_filenames, read_file, work_dir, stop_if_error=False,
+        max_workers=None, image_cache=None, open_file=None, max_image_pixels=None,
     ):
         self.filename = filename
         self.work_dir = work_dir
         self.stop_if_error = stop_if_error
+        self.max_workers = max_workers or min(DEFAULT_MAX_WORKERS, os.cpu_count() or 1)
+        self.image_cache = image_cache
+        self.max_image_pixels = max_image_pixels
+        self._open_file = open_file
         self._optimised_assets = []
         self._assets_thumbnails = []
+        self._derived_thumbnails = {}
+        self._images_to_thumbnail = set()
+        self._pending_derivatives = {}
         if read_file is None:
             raise exceptions.XMLWebOptimiserError(
                 "Error instantiating XMLWebOptimiser: read_file cannot be None"
@@ -462,21 +882,24 @@ class XMLWebOptimiser(object):
         self._xml_file = XML(io.BytesIO(self._read_file(filename)), load_dtd=False)
         self._xml_doctype = self._xml_file.docinfo.doctype
         self._image_filenames = self._get_all_graphic_images_from_xml(image_filenames)
+        self._image_filenames_index = _FilenameIndex(
+            filename for filename in image_filenames
+            if filename in self._image_filenames
+        )
 
     def _get_all_graphic_images_from_xml(self, image_filenames):
         namespaces = {"xlink": "http://www.w3.org/1999/xlink"}
+        image_filenames_index = _FilenameIndex(image_filenames)
         graphic_filename = set()
         for elem in self._xml_file.xpath(
             './/graphic[@xlink:href] | .//inline-graphic[@xlink:href]',
             namespaces=namespaces
         ):
             href_text = elem.attrib.get("{http://www.w3.org/1999/xlink}href")
-            if href_text is not None and href_text in image_filenames:
+            if href_text is not None and href_text in image_filenames_index:
                 graphic_filename.add(href_text)
             else:
-                for image_filename in image_filenames:
-                    if href_text in image_filename:
-                        graphic_filename.add(image_filename)
+                graphic_filename.update(image_filenames_index.search(href_text))
 
         return graphic_filename
 
@@ -535,53 +958,194 @@ class XMLWebOptimiser(object):
                 )
                 yield image_filename, alternatives[0]
 
-    def _get_web_image_generator(self, image_filename):
+    def _derive_web_images(self, image_filename, with_png, with_thumbnail):
+        """Read and decode ``image_filename`` once, producing the requested WEB
+        images.
+
+        Return a dict which maps ``"png"`` and ``"thumbnail"`` to the tuple of
+        file name and bytes of each image, or to the exception raised while
+        producing it. The state of the instance is not changed, so it can run
+        concurrently for many images.
+
+        If ``image_cache`` is set, the WEB images found in it are not produced
+        again, and the image is decoded only if some of them are missing.
+        """
+        web_image_generator = WebImageGenerator(image_filename, self.work_dir)
+        web_images = {}
+        if with_png:
+            web_images["png"] = (
+                web_image_generator.png_filename,
+                web_image_generator.png_spec,
+            )
+        if with_thumbnail:
+            web_images["thumbnail"] = (
+                web_image_generator.thumbnail_filename,
+                web_image_generator.thumbnail_spec,
+            )
+
+        image_file_bytes = image_file_stream = None
         try:
-            image_file_bytes = self._read_file(image_filename)
-        except exceptions.SPPackageError as exc:
-            self._handle_image_exception(exc)
-        else:
-            try:
-                web_image_generator = WebImageGenerator(
-                    image_filename, self.work_dir, image_file_bytes
-                )
-            except exceptions.WebImageGeneratorError as exc:
-                self._handle_image_exception(exc)
+            if self._open_file is not None:
+                image_file_stream = self._open_file(image_filename)
             else:
-                return web_image_generator
+                image_file_bytes = self._read_file(image_filename)
+        except exceptions.SPPackageError as exc:
+            return dict.fromkeys(web_images, exc)
 
-    def _add_optimised_image(self, image_filename):
-        web_image_generator = self._get_web_image_generator(image_filename)
-        if web_image_generator is not None:
+        try:
+            return self._write_web_images(
+                image_filename, web_images, image_file_bytes, image_file_stream
+            )
+        finally:
+            if image_file_stream is not None:
+                image_file_stream.close()
+
+    def _get_source_digest(self, image_file_bytes, image_file_stream):
+        if image_file_stream is None:
+            return hashlib.sha256(image_file_bytes).hexdigest()
+
+        digest = hashlib.sha256()
+        for chunk in iter(functools.partial(image_file_stream.read, 1024 * 1024), b""):
+            digest.update(chunk)
+        image_file_stream.seek(0)
+        return digest.hexdigest()
+
+    def _write_web_images(
+        self, image_filename, web_images, image_file_bytes, image_file_stream
+    ):
+        derivatives = {}
+        cache_keys = {}
+        if self.image_cache is not None:
+            source_digest = self._get_source_digest(image_file_bytes, image_file_stream)
+            for name, (filename, spec) in web_images.items():
+                cache_keys[name] = self.image_cache.get_key(source_digest, spec)
+                file_bytes = self.image_cache.get(cache_keys[name])
+                if file_bytes is not None:
+                    derivatives[name] = (filename, file_bytes)
+            if len(derivatives) == len(web_images):
+                return derivatives
+
+        try:
+            web_image_generator = WebImageGenerator(
+                image_filename,
+                self.work_dir,
+                image_file_bytes,
+                image_file_stream,
+                self.max_image_pixels,
+            )
+        except exceptions.WebImageGeneratorError as exc:
+            for name in web_images:
+                derivatives.setdefault(name, exc)
+            return derivatives
+
+        write = {
+            "png": web_image_generator.write_png,
+            "thumbnail": web_image_generator.write_thumbnail,
+        }
+        # the thumbnail is the last one, since it resizes the decoded image
+        for name, (filename, spec) in web_images.items():
+            if name in derivatives:
+                continue
+            if image_file_stream is None:
+                web_image_file = io.BytesIO()
+            else:
+                web_image_file = tempfile.TemporaryFile()
             try:
-                png_bytes = web_image_generator.get_png_bytes()
+                write[name](web_image_file)
             except exceptions.WebImageGeneratorError as exc:
-                self._handle_image_exception(exc)
+                web_image_file.close()
+                derivatives[name] = exc
+                continue
+
+            if image_file_stream is None:
+                web_image = web_image_file.getvalue()
             else:
-                self._optimised_assets.append(
-                    (web_image_generator.png_filename, png_bytes)
+                web_image = web_image_file
+                web_image.seek(0)
+            derivatives[name] = (filename, web_image)
+            if name in cache_keys:
+                self.image_cache.set(cache_keys[name], web_image)
+                if image_file_stream is not None:
+                    web_image.seek(0)
+        return derivatives
+
+    def _get_derivatives(self, image_filename, with_png=True, with_thumbnail=False):
+        key = (image_filename, with_png, with_thumbnail)
+        future = self._pending_derivatives.pop(key, None)
+        if future is not None:
+            return future.result()
+        return self._derive_web_images(*key)
+
+    def _prefetch_derivatives(self, executor, images, with_png):
+        """Start producing, with ``executor``, the WEB images of ``images``.
+
+        The results are consumed in document order by :meth:`_get_derivatives`,
+        so the XML is changed the same way as if they were produced one at a
+        time.
+        """
+        for image_filename, image_element in images:
+            image_filename = self._find_image_filename(image_filename)
+            if image_filename is None:
+                continue
+            if not with_png and image_filename in self._derived_thumbnails:
+                continue
+            with_thumbnail = not with_png or self._derives_thumbnail(image_element)
+            key = (image_filename, with_png, with_thumbnail)
+            if key not in self._pending_derivatives:
+                self._pending_derivatives[key] = executor.submit(
+                    self._derive_web_images, *key
                 )
-                return web_image_generator.png_filename
+
+    def _derives_thumbnail(self, image_element):
+        """Whether the thumbnail of ``image_element`` is produced along with its PNG
+        image, from the same decoded image. It is, only if the thumbnail will be
+        requested by ``_add_assets_thumbnails``."""
+        return image_element in self._images_to_thumbnail
+
+    def _add_optimised_image(self, image_filename, with_thumbnail=False):
+        derivatives = self._get_derivatives(
+            image_filename, with_png=True, with_thumbnail=with_thumbnail
+        )
+        optimised_asset = derivatives["png"]
+        if isinstance(optimised_asset, Exception):
+            self._handle_image_exception(optimised_asset)
+        else:
+            self._optimised_assets.append(optimised_asset)
+            # the thumbnail was produced from the same decoded image, and is
+            # kept until it is requested by ``_add_assets_thumbnails``
+            asset_thumbnail = derivatives.get("thumbnail")
+            if asset_thumbnail is not None and not isinstance(
+                asset_thumbnail, Exception
+            ):
+                self._derived_thumbnails[image_filename] = asset_thumbnail
+            return optimised_asset[0]
 
     def _add_assets_thumbnails(self, image_filename):
-        web_image_generator = self._get_web_image_generator(image_filename)
-        if web_image_generator is not None:
-            try:
-                thumbnail_bytes = web_image_generator.get_thumbnail_bytes()
-            except exceptions.WebImageGeneratorError as exc:
-                self._handle_image_exception(exc)
-            else:
-                self._assets_thumbnails.append(
-                    (web_image_generator.thumbnail_filename, thumbnail_bytes)
-                )
-                return web_image_generator.thumbnail_filename
+        asset_thumbnail = self._derived_thumbnails.pop(image_filename, None)
+        if asset_thumbnail is None:
+            derivatives = self._get_derivatives(
+                image_filename, with_png=False, with_thumbnail=True
+            )
+            asset_thumbnail = derivatives["thumbnail"]
+
+        if isinstance(asset_thumbnail, Exception):
+            self._handle_image_exception(asset_thumbnail)
+        else:
+            self._assets_thumbnails.append(asset_thumbnail)
+            return asset_thumbnail[0]
+
+    def _find_image_filename(self, image_filename):
+        """Return the name of the package file referenced as ``image_filename``,
+        or None if there is none."""
+        if image_filename in self._image_filenames_index:
+            return image_filename
+        return self._image_filenames_index.get_tiff(image_filename)
 
     def _get_similar_filename(self, image_filename):
-        for filename in self._image_filenames:
-            filename_root, filename_ext = os.path.splitext(filename)
-            if filename_root == image_filename and ".tif" in filename_ext:
-                LOGGER.debug('Found similar file name: "%s"', image_filename)
-                return True, filename
+        filename = self._find_image_filename(image_filename)
+        if filename is not None:
+            LOGGER.debug('Found similar file name: "%s"', image_filename)
+            return True, filename
         else:
             msg_error = 'No file named "%s" in package'
             if self.stop_if_error:
@@ -616,11 +1180,23 @@ class XMLWebOptimiser(object):
             alternative_node.append(new_alternative)
             image_parent.append(alternative_node)
 
-    def get_xml_file(self):
-        """Get a byte-like optimised XML, with WEB alternatives for images."""
+    def _add_optimised_images(self, executor):
+        # the graphics whose thumbnails will be requested, looked up before the
+        # XML is changed
+        self._images_to_thumbnail = {
+            image_element
+            for __, image_element in self._get_all_images_to_thumbnail()
+        }
+        self._prefetch_derivatives(
+            executor, list(self._get_all_images_to_optimise()), with_png=True
+        )
         for image_filename, image_element in self._get_all_images_to_optimise():
+            add_image = functools.partial(
+                self._add_optimised_image,
+                with_thumbnail=self._derives_thumbnail(image_element),
+            )
             new_filename = self._get_optimised_image_with_filename(
-                image_filename, self._add_optimised_image
+                image_filename, add_image
             )
             if new_filename is not None:
                 alternative_attr_values = (
@@ -631,6 +1207,10 @@ class XMLWebOptimiser(object):
                     image_element, alternative_attr_values
                 )
 
+    def _add_images_thumbnails(self, executor):
+        self._prefetch_derivatives(
+            executor, list(self._get_all_images_to_thumbnail()), with_png=False
+        )
         for image_filename, image_element in self._get_all_images_to_thumbnail():
             new_filename = self._get_optimised_image_with_filename(
                 image_filename, self._add_assets_thumbnails
@@ -645,6 +1225,26 @@ class XMLWebOptimiser(object):
                     image_element, alternative_attr_values
                 )
 
+    def get_xml_file(self):
+        """Get a byte-like optimised XML, with WEB alternatives for images.
+
+        The WEB images are produced concurrently, but the XML is changed in
+        document order.
+        """
+        with futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                self._add_optimised_images(executor)
+                self._add_images_thumbnails(executor)
+            finally:
+                for future in self._pending_derivatives.values():
+                    future.cancel()
+                self._pending_derivatives.clear()
+                for __, asset_thumbnail in self._derived_thumbnails.values():
+                    if hasattr(asset_thumbnail, "close"):
+                        asset_thumbnail.close()
+                self._derived_thumbnails.clear()
+                self._images_to_thumbnail.clear()
+
         return etree.tostring(
             self._xml_file,
             doctype=self._xml_doctype or None,
@@ -656,17 +1256,43 @@ class XMLWebOptimiser(object):
 
     def get_optimised_assets(self):
         """Generate tuples of PNG file name and bytes of each image produced by TIFF
-        images referenced in XML content."""
+        images referenced in XML content. If ``open_file`` is set, the bytes are
+        given as file-objects, which must be closed by the caller."""
         for optimised_asset in self._optimised_assets:
             yield optimised_asset
 
     def get_assets_thumbnails(self):
         """Generate tuples of thumbnail file name and bytes of each image produced by
-        images referenced in XML content."""
+        images referenced in XML content. If ``open_file`` is set, the bytes are
+        given as file-objects, which must be closed by the caller."""
         for asset_thumbnail in self._assets_thumbnails:
             yield asset_thumbnail
 
 
+# size of the chunks read from a member of a package and written to the new one
+ZIP_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _copy_zip_member(source, destination, zinfo):
+    """Copy the member ``zinfo`` of the zip file ``source`` to the zip file
+    ``destination``, keeping its name, date, attributes and compression method.
+
+    The member is copied in chunks, so it is never held in memory as a whole. It is
+    decompressed and compressed again, since ``zipfile`` has no public API to copy
+    the raw compressed data.
+    """
+    # ``ZipFile.open`` changes the given ``ZipInfo``, which belongs to ``source``
+    new_zinfo = copy.copy(zinfo)
+    with source.open(zinfo) as source_fp, destination.open(
+        new_zinfo, "w"
+    ) as destination_fp:
+        shutil.copyfileobj(source_fp, destination_fp, ZIP_COPY_CHUNK_SIZE)
+
+
+# maximum size of the files of a package kept in memory while they are optimised
+SPOOLED_FILE_MAX_SIZE = 16 * 1024 * 1024
+
+
 class SPPackage(object):
     """Adapter that manipulate SciELO Publishing Packages.
 
@@ -679,15 +1305,49 @@ class SPPackage(object):
 
     :param package_file: SciELO Publishing Package, instance of ``zipfile.ZipFile``
     :param extracted_package: path to extract package files and optimise them
+    :param max_workers: maximum number of threads used to produce the WEB images of
+        each XML concurrently. Defaults to the number of processors, up to
+        ``DEFAULT_MAX_WORKERS``. See ``XMLWebOptimiser`` for the memory used by each
+        thread.
+    :param image_cache: ``WebImageCache`` instance looked up for WEB images before
+        they are produced. The cache is disabled if it is not set.
+    :param streaming: if True, images are decoded from streams and the WEB images
+        are written to temporary files, from which they are copied to the new
+        package, so that the image files are not held in memory. The decoded images
+        still are, see ``XMLWebOptimiser``.
+    :param max_image_pixels: maximum number of pixels of the images to optimise.
+        Larger images are handled as errors, before they are decoded.
     """
 
-    def __init__(self, package_file, extracted_package, stop_if_error=False):
+    def __init__(
+        self,
+        package_file,
+        extracted_package,
+        stop_if_error=False,
+        max_workers=None,
+        image_cache=None,
+        streaming=False,
+        max_image_pixels=None,
+    ):
         self._package_file = package_file
         self._extracted_package = extracted_package
         self._stop_if_error = stop_if_error
+        self._max_workers = max_workers
+        self._image_cache = image_cache
+        self._streaming = streaming
+        self._max_image_pixels = max_image_pixels
 
     @classmethod
-    def from_file(cls, package_file_path, extracted_package=None, stop_if_error=False):
+    def from_file(
+        cls,
+        package_file_path,
+        extracted_package=None,
+        stop_if_error=False,
+        max_workers=None,
+        image_cache=None,
+        streaming=False,
+        max_image_pixels=None,
+    ):
         """Factory of SPPackage instances.
 
         :param package_file_path: Path to the SciELO Publishing Package file, instance
@@ -700,53 +1360,100 @@ class SPPackage(object):
         package2optimise = zipfile.ZipFile(package_file_path)
         if extracted_package is None:
             extracted_package = os.path.splitext(package_file_path)[0]
-        return cls(package2optimise, extracted_package, stop_if_error)
+        return cls(
+            package2optimise,
+            extracted_package,
+            stop_if_error,
+            max_workers,
+            image_cache,
+            streaming,
+            max_image_pixels,
+        )
+
+    def _write_extracted_file(self, filename, file_bytes):
+        # the same sanitization of paths made by ``ZipFile.extract``
+        arcname = filename.replace("/", os.path.sep)
+        if os.path.altsep:
+            arcname = arcname.replace(os.path.altsep, os.path.sep)
+        arcname = os.path.splitdrive(arcname)[1]
+        arcname = os.path.sep.join(
+            part
+            for part in arcname.split(os.path.sep)
+            if part not in ("", os.path.curdir, os.path.pardir)
+        )
+        file_path = os.path.join(self._extracted_package, arcname)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as fp:
+            if hasattr(file_bytes, "read"):
+                file_bytes.seek(0)
+                shutil.copyfileobj(file_bytes, fp)
+            else:
+                fp.write(file_bytes)
+
+    def _write_file(
+        self, new_zip_file, filename, file_bytes, compress_type=None, extract=False
+    ):
+        LOGGER.debug('Writing file "%s"', filename)
+        if hasattr(file_bytes, "read"):
+            # files are copied to the zip entry in chunks, then closed
+            with file_bytes:
+                with new_zip_file.open(filename, "w") as zip_entry:
+                    shutil.copyfileobj(file_bytes, zip_entry)
+                if extract:
+                    self._write_extracted_file(filename, file_bytes)
+            return
+
+        new_zip_file.writestr(filename, file_bytes, compress_type)
+        if extract:
+            self._write_extracted_file(filename, file_bytes)
 
     def _optimise_to_zipfile(
-        self, new_package_file_path, xml_filename, zipped_filenames
+        self, new_zip_file, xml_filename, zipped_filenames, extract=False
     ):
-        with zipfile.ZipFile(new_package_file_path, "a") as new_zip_file:
-            zipped_files = []
-            xml_web_optimiser = self._get_optimise_web_xml(
-                xml_filename, zipped_filenames
-            )
-            # Write optimised XML to new Zipfile
-            optimised_xml = xml_web_optimiser.get_xml_file()
-            xml_zip_info = self._package_file.getinfo(xml_filename)
-            LOGGER.debug('Writing XML file "%s" in package', xml_filename)
-            new_zip_file.writestr(
-                xml_filename, optimised_xml, xml_zip_info.compress_type
-            )
-            zipped_files.append(xml_filename)
-            # Write optimised assets to new Zipfile
-            LOGGER.debug('Writing asset files in package')
-            for asset_filename, asset_bytes in xml_web_optimiser.get_optimised_assets():
-                if asset_bytes is not None:
-                    LOGGER.debug('Writing file "%s"', asset_filename)
-                    new_zip_file.writestr(asset_filename, asset_bytes)
-                    zipped_files.append(asset_filename)
-            LOGGER.debug('Writing asset thumbnail files in package')
-            for (
-                asset_filename,
-                asset_bytes,
-            ) in xml_web_optimiser.get_assets_thumbnails():
-                if asset_bytes is not None:
-                    LOGGER.debug('Writing file "%s"', asset_filename)
-                    new_zip_file.writestr(asset_filename, asset_bytes)
-                    zipped_files.append(asset_filename)
-            return zipped_files
-
-    def _write_files_left(self, new_package_file_path, files_to_write):
-        # Write files left to new Zipfile
-        with zipfile.ZipFile(new_package_file_path, "a") as new_zip_file:
-            for file_to_write in files_to_write:
-                zip_info = self._package_file.getinfo(file_to_write)
-                LOGGER.debug('Writing file "%s"', file_to_write)
-                new_zip_file.writestr(
-                    file_to_write,
-                    self._package_file.read(file_to_write),
-                    zip_info.compress_type,
+        zipped_files = []
+        xml_web_optimiser = self._get_optimise_web_xml(
+            xml_filename, zipped_filenames
+        )
+        # Write optimised XML to new Zipfile
+        optimised_xml = xml_web_optimiser.get_xml_file()
+        xml_zip_info = self._package_file.getinfo(xml_filename)
+        LOGGER.debug('Writing XML file "%s" in package', xml_filename)
+        self._write_file(
+            new_zip_file,
+            xml_filename,
+            optimised_xml,
+            xml_zip_info.compress_type,
+            extract,
+        )
+        zipped_files.append(xml_filename)
+        # Write optimised assets to new Zipfile
+        LOGGER.debug('Writing asset files in package')
+        for asset_filename, asset_bytes in xml_web_optimiser.get_optimised_assets():
+            if asset_bytes is not None:
+                self._write_file(
+                    new_zip_file, asset_filename, asset_bytes, extract=extract
+                )
+                zipped_files.append(asset_filename)
+        LOGGER.debug('Writing asset thumbnail files in package')
+        for (
+            asset_filename,
+            asset_bytes,
+        ) in xml_web_optimiser.get_assets_thumbnails():
+            if asset_bytes is not None:
+                self._write_file(
+                    new_zip_file, asset_filename, asset_bytes, extract=extract
                 )
+                zipped_files.append(asset_filename)
+        return zipped_files
+
+    def _write_files_left(self, new_zip_file, files_to_write, extract=False):
+        # Copy files left to new Zipfile, in chunks
+        for file_to_write in files_to_write:
+            zip_info = self._package_file.getinfo(file_to_write)
+            LOGGER.debug('Writing file "%s"', file_to_write)
+            _copy_zip_member(self._package_file, new_zip_file, zip_info)
+            if extract:
+                self._package_file.extract(zip_info, self._extracted_package)
 
     def _get_optimise_web_xml(self, xml_filename, xml_related_files):
         image_filenames = [
@@ -760,8 +1467,29 @@ class SPPackage(object):
             self._read_file,
             self._extracted_package,
             self._stop_if_error,
+            self._max_workers,
+            self._image_cache,
+            self._open_file if self._streaming else None,
+            self._max_image_pixels,
         )
 
+    def _open_file(self, filename):
+        """Return a seekable file-object with the content of ``filename``, which is
+        kept in memory up to ``SPOOLED_FILE_MAX_SIZE`` bytes and in a temporary file
+        beyond that."""
+        try:
+            zip_info = self._package_file.getinfo(filename)
+        except KeyError:
+            raise exceptions.SPPackageError(
+                "No file named {} in package".format(filename)
+            )
+
+        spooled_file = tempfile.SpooledTemporaryFile(max_size=SPOOLED_FILE_MAX_SIZE)
+        with self._package_file.open(zip_info) as member:
+            shutil.copyfileobj(member, spooled_file)
+        spooled_file.seek(0)
+        return spooled_file
+
     def _read_file(self, image_to_optimise):
         try:
             image_bytes = self._package_file.read(image_to_optimise)
@@ -780,6 +1508,10 @@ class SPPackage(object):
         with previous content and updates all optimised XMLs and the web images
         versions.
 
+        The new package is written in a single pass. The files which are not
+        changed are copied without being decompressed and compressed again and,
+        if ``preserve_files`` is True, each file is extracted as it is written.
+
         :param new_package_file_path (default=None): Path to optimised SciELO Publishing
             Package file. If not given, it will be the same path and file name of the
             original package file ended with ``_optimised.zip``.
@@ -798,22 +1530,28 @@ class SPPackage(object):
             if os.path.splitext(xml_filename)[-1] == ".xml"
         ]
         optimised_filenames = []
-        for i, xml_filename in enumerate(xmls_filenames):
+        with zipfile.ZipFile(new_package_file_path, "w") as new_zip_file:
+            for i, xml_filename in enumerate(xmls_filenames):
+                LOGGER.info(
+                    "Optimizing XML file %s [%s/%s]",
+                    xml_filename,
+                    i,
+                    len(xmls_filenames),
+                )
+                optimised_filenames += self._optimise_to_zipfile(
+                    new_zip_file, xml_filename, zipped_filenames, preserve_files
+                )
+
             LOGGER.info(
-                "Optimizing XML file %s [%s/%s]", xml_filename, i, len(xmls_filenames)
+                "Writing remained files from package in new SciELO Publishing Package"
             )
-            filename_root, __ = os.path.splitext(xml_filename)
-            optimised_filenames += self._optimise_to_zipfile(
-                new_package_file_path, xml_filename, zipped_filenames
+            optimised_filenames = set(optimised_filenames)
+            self._write_files_left(
+                new_zip_file,
+                [
+                    filename
+                    for filename in dict.fromkeys(zipped_filenames)
+                    if filename not in optimised_filenames
+                ],
+                preserve_files,
             )
-
-        LOGGER.info(
-            "Writing remained files from package in new SciELO Publishing Package"
-        )
-        self._write_files_left(
-            new_package_file_path, set(zipped_filenames) - set(optimised_filenames)
-        )
-
-        if preserve_files:
-            with zipfile.ZipFile(new_package_file_path) as new_zip_file:
-                new_zip_file.extractall(self._extracted_package)
@@ -1,4 +1,6 @@
 # coding: utf-8
+import io
+
 import lxml
 from flask import current_app
 
@@ -56,15 +58,11 @@ def analyze_xml(file, extra_schematron=None):
 
     else:
         status, errors = xml.validate_all()
-        err_xml = lxml.etree.tostring(
-            xml.annotate_errors(),
-            pretty_print=True,
-            encoding="utf-8",
-            xml_declaration=True,
-        )
+        err_xml = io.BytesIO()
+        xml.write_annotated(err_xml, encoding="utf-8")
 
         result = {
-            "annotations": err_xml.decode("utf-8"),
+            "annotations": err_xml.getvalue().decode("utf-8"),
             "validation_errors": None,
             "meta": xml.meta,
             "sps_version": xml.sps_version,
@@ -886,6 +886,34 @@ class ArticleAssetsTest(TestCase):
       self.assertDictEqual(expected, obtained)
 
 
+    def test_article_assets_numbering(self):
+      snippet = """
+      <graphic xlink:href="a.jpg"/>
+      <fig-group id="f01">
+        <fig id="f01a">
+          <graphic xlink:href="b.jpg"/>
+        </fig>
+        <fig id="f01b">
+          <graphic xlink:href="c.jpg"/>
+        </fig>
+      </fig-group>
+      <inline-graphic xlink:href="d.jpg"/>
+      """
+      xmltree = generate_xmltree(snippet)
+      article_assets = ArticleAssets(xmltree)
+
+      self.assertEqual(
+        [('b.jpg', 'f01', 0), ('c.jpg', 'f01', 1), ('figura2.jpg', 'f02', 0)],
+        [(asset.name, asset.id, asset._number)
+         for asset in article_assets.article_assets_which_have_id]
+      )
+      self.assertEqual(
+        [('a.jpg', 0), ('d.jpg', 1)],
+        [(asset.name, asset._number)
+         for asset in article_assets.article_assets_which_have_no_id]
+      )
+
+
 class SupplementaryMaterialsTest(TestCase):
     def _get_xmltree(self, xml):
         return xml_utils.get_xml_tree(xml)
@@ -0,0 +1,305 @@
+import asyncio
+import functools
+import os
+import tempfile
+import threading
+import time
+from http import server
+from unittest import TestCase, mock
+
+from aiohttp import web
+from tenacity import wait_none
+
+from packtools.sps import exceptions
+from packtools.sps.libs import async_download, http_cache
+
+
+CONTENT = os.urandom(300 * 1024)
+
+
+async def _serve(handler, coro_factory):
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        return await coro_factory("http://127.0.0.1:%s" % port)
+    finally:
+        await runner.cleanup()
+
+
+async def _content(request):
+    if request.match_info["name"] == "missing.pdf":
+        raise web.HTTPNotFound()
+    return web.Response(body=CONTENT)
+
+
+class TestDownloadFiles(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def _download(self, names, handler=_content, **kwargs):
+        async def download(base_uri):
+            return await async_download.download_files_with_results_async(
+                [{"uri": "%s/%s" % (base_uri, name), "name": name}
+                 for name in names],
+                self.folder,
+                retry_wait=wait_none(),
+                **kwargs
+            )
+        return asyncio.run(_serve(handler, download))
+
+    def test_download_files_writes_the_content_in_chunks(self):
+        results = self._download(["a.pdf", "b.jpg"], chunk_size=16 * 1024)
+
+        self.assertEqual(["a.pdf", "b.jpg"], sorted(os.listdir(self.folder)))
+        for name, result in zip(["a.pdf", "b.jpg"], results):
+            with open(os.path.join(self.folder, name), "rb") as fp:
+                self.assertEqual(CONTENT, fp.read())
+            self.assertEqual(name, result["name"])
+            self.assertEqual(200, result["status"])
+            self.assertEqual(os.path.join(self.folder, name), result["path"])
+            self.assertEqual(len(CONTENT), result["size"])
+            self.assertEqual(1, result["attempts"])
+            self.assertIsNone(result["error"])
+            self.assertGreaterEqual(result["elapsed"], 0)
+            # o bloco lido e, no máximo, o bloco em gravação
+            self.assertGreater(result["peak_memory"], 0)
+            self.assertLessEqual(result["peak_memory"], 2 * 16 * 1024)
+
+    def test_download_files_reports_the_bytes_waiting_to_be_written(self):
+        create_temporary_file = async_download._create_temporary_file
+
+        class SlowFile:
+            def __init__(self, fp):
+                self.fp = fp
+
+            def write(self, data):
+                time.sleep(0.01)
+                return self.fp.write(data)
+
+            def close(self):
+                self.fp.close()
+
+        def create_slow_temporary_file(file_path):
+            fp, temp_file_path = create_temporary_file(file_path)
+            return SlowFile(fp), temp_file_path
+
+        with mock.patch.object(
+                async_download, "_create_temporary_file",
+                create_slow_temporary_file):
+            result, = self._download(["a.pdf"], chunk_size=16 * 1024)
+
+        with open(os.path.join(self.folder, "a.pdf"), "rb") as fp:
+            self.assertEqual(CONTENT, fp.read())
+        # um bloco é lido enquanto o anterior é gravado
+        self.assertEqual(2 * 16 * 1024, result["peak_memory"])
+
+    def test_download_files_reports_failed_downloads(self):
+        results = self._download(["missing.pdf", "a.pdf"])
+
+        self.assertEqual(404, results[0]["status"])
+        self.assertIsNone(results[0]["path"])
+        self.assertEqual(1, results[0]["attempts"])
+        self.assertIsNotNone(results[0]["error"])
+        self.assertEqual(200, results[1]["status"])
+        self.assertEqual(["a.pdf"], os.listdir(self.folder))
+
+    def test_download_files_retries_temporary_failures(self):
+        calls = []
+
+        async def unavailable_once(request):
+            calls.append(request.path)
+            if len(calls) == 1:
+                raise web.HTTPServiceUnavailable()
+            return web.Response(body=CONTENT)
+
+        results = self._download(["a.pdf"], handler=unavailable_once)
+
+        self.assertEqual(2, len(calls))
+        self.assertEqual(200, results[0]["status"])
+        self.assertEqual(2, results[0]["attempts"])
+
+    def test_download_files_stops_after_max_attempts(self):
+        calls = []
+
+        async def unavailable(request):
+            calls.append(request.path)
+            raise web.HTTPServiceUnavailable()
+
+        results = self._download(
+            ["a.pdf"], handler=unavailable, max_attempts=2)
+
+        self.assertEqual(2, len(calls))
+        self.assertEqual(503, results[0]["status"])
+        self.assertEqual(2, results[0]["attempts"])
+        self.assertEqual([], os.listdir(self.folder))
+
+    def test_download_files_limits_the_connections_per_host(self):
+        running = []
+        max_running = []
+
+        async def slow(request):
+            running.append(request.path)
+            max_running.append(len(running))
+            await asyncio.sleep(0.05)
+            running.remove(request.path)
+            return web.Response(body=b"x")
+
+        results = self._download(
+            ["%s.jpg" % i for i in range(8)], handler=slow, limit_per_host=2)
+
+        self.assertEqual([200] * 8, [result["status"] for result in results])
+        self.assertEqual(2, max(max_running))
+
+    def test_download_files_limits_the_connections_per_host_by_default(self):
+        running = []
+        max_running = []
+
+        async def slow(request):
+            running.append(request.path)
+            max_running.append(len(running))
+            await asyncio.sleep(0.05)
+            running.remove(request.path)
+            return web.Response(body=b"x")
+
+        results = self._download(["%s.jpg" % i for i in range(16)], handler=slow)
+
+        self.assertEqual([200] * 16, [result["status"] for result in results])
+        self.assertEqual(async_download.DEFAULT_LIMIT_PER_HOST, max(max_running))
+
+    def test_get_to_file_discards_incomplete_downloads(self):
+        async def truncated(request):
+            response = web.StreamResponse(
+                headers={"Content-Length": str(len(CONTENT))})
+            await response.prepare(request)
+            await response.write(CONTENT[:1024])
+            request.transport.close()
+            return response
+
+        async def download(base_uri):
+            async with async_download.aiohttp.ClientSession() as session:
+                return await async_download._get_to_file(
+                    session, base_uri + "/a.pdf",
+                    os.path.join(self.folder, "a.pdf"), 512)
+
+        with self.assertRaises(exceptions.SPSDownloadError) as exc:
+            asyncio.run(_serve(truncated, download))
+        self.assertIsNone(exc.exception.status)
+        self.assertEqual([], os.listdir(self.folder))
+
+
+class TestDownloadFilesWithCache(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = http_cache.HTTPCache(tempfile.mkdtemp())
+        self.served = tempfile.mkdtemp()
+        with open(os.path.join(self.served, "a.pdf"), "wb") as fp:
+            fp.write(CONTENT)
+        self.requests = []
+
+    async def _file(self, request):
+        self.requests.append(request.headers)
+        return web.FileResponse(
+            os.path.join(self.served, request.match_info["name"]))
+
+    def _download_twice(self, between):
+        async def download(base_uri):
+            results = []
+            for i in range(2):
+                if i:
+                    between(base_uri + "/a.pdf", results[0][0])
+                results.append(await async_download._download_files(
+                    [{"uri": base_uri + "/a.pdf", "name": "a.pdf"}],
+                    self.folder,
+                    retry_wait=wait_none(),
+                    cache=self.cache,
+                ))
+            return [result[0] for result in results]
+        return asyncio.run(_serve(self._file, download))
+
+    def _read(self):
+        with open(os.path.join(self.folder, "a.pdf"), "rb") as fp:
+            return fp.read()
+
+    def test_download_files_revalidates_cached_files(self):
+        def remove_downloaded_file(uri, result):
+            os.unlink(result["path"])
+
+        first, second = self._download_twice(remove_downloaded_file)
+
+        self.assertEqual(200, first["status"])
+        self.assertEqual(304, second["status"])
+        self.assertIn("If-None-Match", self.requests[1])
+        self.assertEqual(len(CONTENT), second["size"])
+        self.assertGreater(first["peak_memory"], 0)
+        # o conteúdo é copiado do cache, sem ser lido da resposta
+        self.assertEqual(0, second["peak_memory"])
+        self.assertEqual(CONTENT, self._read())
+
+    def test_download_files_resumes_interrupted_downloads(self):
+        def interrupt_download(uri, result):
+            etag = self.cache.get(uri)["etag"]
+            for name in os.listdir(self.cache.folder):
+                os.unlink(os.path.join(self.cache.folder, name))
+            with self.cache.begin(uri) as download:
+                fp = download.open(200, {"ETag": etag})
+                fp.write(CONTENT[:1000])
+
+        first, second = self._download_twice(interrupt_download)
+
+        self.assertEqual(206, second["status"])
+        self.assertEqual("bytes=1000-", self.requests[1]["Range"])
+        self.assertEqual(CONTENT, self._read())
+
+
+class TestDownloadFilesFromRunningLoop(TestCase):
+
+    def setUp(self):
+        self.served = tempfile.mkdtemp()
+        with open(os.path.join(self.served, "a.pdf"), "wb") as fp:
+            fp.write(CONTENT)
+
+        class Handler(server.SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        self.server = server.ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            functools.partial(Handler, directory=self.served))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.uri = "http://127.0.0.1:%s/a.pdf" % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_download_files_outside_a_running_loop(self):
+        folder = tempfile.mkdtemp()
+        paths = async_download.download_files(
+            [{"uri": self.uri, "name": "a.pdf"}], folder)
+        self.assertEqual([os.path.join(folder, "a.pdf")], paths)
+
+    def test_download_files_inside_a_running_loop(self):
+        folder = tempfile.mkdtemp()
+
+        async def main():
+            return async_download.download_files(
+                [{"uri": self.uri, "name": "a.pdf"}], folder)
+
+        self.assertEqual([os.path.join(folder, "a.pdf")], asyncio.run(main()))
+
+    def test_run_coroutine_refuses_to_block_its_own_loop(self):
+        async def inner():
+            return 1
+
+        async def outer():
+            return async_download.run_coroutine(inner())
+
+        with self.assertRaises(RuntimeError):
+            async_download.run_coroutine(outer())
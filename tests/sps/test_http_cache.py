@@ -0,0 +1,193 @@
+import functools
+import os
+import tempfile
+import threading
+from http import server
+from unittest import TestCase, mock
+
+from packtools.sps import exceptions
+from packtools.sps.libs import http_cache, reqs
+
+
+URI = "http://x.org/a.pdf"
+
+
+def _download(cache, status, headers, content, uri=URI):
+    with cache.begin(uri) as download:
+        fp = download.open(status, headers)
+        fp.write(content)
+        return download.commit()
+
+
+class TestHTTPCache(TestCase):
+
+    def setUp(self):
+        self.cache = http_cache.HTTPCache(tempfile.mkdtemp())
+
+    def test_get_returns_none_for_unknown_uri(self):
+        self.assertIsNone(self.cache.get(URI))
+
+    def test_commit_stores_the_content_and_validators(self):
+        path = _download(
+            self.cache, 200, {"ETag": '"v1"', "Last-Modified": "lm"}, b"abc")
+
+        entry = self.cache.get(URI)
+        self.assertEqual(path, entry["path"])
+        self.assertEqual('"v1"', entry["etag"])
+        self.assertEqual("lm", entry["last_modified"])
+        self.assertEqual(3, entry["size"])
+        with open(path, "rb") as fp:
+            self.assertEqual(b"abc", fp.read())
+
+    def test_begin_sends_conditional_headers_for_cached_uri(self):
+        _download(
+            self.cache, 200, {"ETag": '"v1"', "Last-Modified": "lm"}, b"abc")
+
+        with self.cache.begin(URI) as download:
+            self.assertEqual(
+                {"If-None-Match": '"v1"', "If-Modified-Since": "lm"},
+                download.headers)
+            path = download.not_modified()
+        self.assertEqual(self.cache.get(URI)["path"], path)
+
+    def test_interrupted_download_is_resumed(self):
+        with self.cache.begin(URI) as download:
+            fp = download.open(200, {"ETag": '"v1"'})
+            fp.write(b"abc")
+
+        with self.cache.begin(URI) as download:
+            self.assertEqual(3, download.offset)
+            self.assertEqual("bytes=3-", download.headers["Range"])
+            self.assertEqual('"v1"', download.headers["If-Range"])
+            fp = download.open(206, {"Content-Range": "bytes 3-5/6"})
+            fp.write(b"def")
+            path = download.commit()
+
+        with open(path, "rb") as fp:
+            self.assertEqual(b"abcdef", fp.read())
+        self.assertEqual(
+            [os.path.basename(path), os.path.basename(path) + ".json"],
+            sorted(os.listdir(self.cache.folder)))
+
+    def test_interrupted_download_is_restarted_if_server_sends_200(self):
+        with self.cache.begin(URI) as download:
+            fp = download.open(200, {"ETag": '"v1"'})
+            fp.write(b"abc")
+
+        path = _download(self.cache, 200, {"ETag": '"v2"'}, b"xyz")
+
+        with open(path, "rb") as fp:
+            self.assertEqual(b"xyz", fp.read())
+        self.assertEqual('"v2"', self.cache.get(URI)["etag"])
+
+    def test_interrupted_download_without_strong_validator_is_discarded(self):
+        with self.cache.begin(URI) as download:
+            fp = download.open(200, {"ETag": 'W/"v1"'})
+            fp.write(b"abc")
+
+        self.assertEqual([], os.listdir(self.cache.folder))
+
+    def test_interrupted_download_is_claimed_by_one_download(self):
+        with self.cache.begin(URI) as download:
+            fp = download.open(200, {"ETag": '"v1"'})
+            fp.write(b"abc")
+
+        with self.cache.begin(URI) as first:
+            with self.cache.begin(URI) as second:
+                self.assertEqual(3, first.offset)
+                self.assertEqual(0, second.offset)
+                self.assertNotIn("Range", second.headers)
+
+    def test_open_rejects_unexpected_range(self):
+        with self.cache.begin(URI) as download:
+            with self.assertRaises(exceptions.SPSDownloadError):
+                download.open(206, {"Content-Range": "bytes 0-2/3"})
+
+    def test_evict_removes_least_recently_used_entries(self):
+        self.cache.max_size = None
+        for i, uri in enumerate(["http://x.org/1", "http://x.org/2"]):
+            _download(self.cache, 200, {}, b"1234", uri=uri)
+            for name in os.listdir(self.cache.folder):
+                os.utime(os.path.join(self.cache.folder, name), (i, i))
+        # cabem somente duas entradas
+        self.cache.max_size = sum(
+            os.path.getsize(os.path.join(self.cache.folder, name))
+            for name in os.listdir(self.cache.folder)
+        )
+        # marca a primeira entrada como a usada mais recentemente
+        self.assertIsNotNone(self.cache.get("http://x.org/1"))
+
+        _download(self.cache, 200, {}, b"1234", uri="http://x.org/3")
+
+        self.assertIsNotNone(self.cache.get("http://x.org/1"))
+        self.assertIsNone(self.cache.get("http://x.org/2"))
+        self.assertIsNotNone(self.cache.get("http://x.org/3"))
+
+    def test_evict_keeps_the_committed_entry(self):
+        self.cache.max_size = 1
+        path = _download(self.cache, 200, {}, b"1234")
+        self.assertTrue(os.path.isfile(path))
+
+
+    def test_evict_lists_the_folder_only_when_the_cache_is_full(self):
+        with mock.patch.object(
+                http_cache.os, "listdir", wraps=os.listdir) as listdir:
+            for i in range(3):
+                _download(self.cache, 200, {"ETag": '"1"'}, b"1234",
+                          uri="http://x.org/%s" % i)
+            with self.cache.begin("http://x.org/3") as download:
+                download.open(200, {"ETag": '"1"'}).write(b"12")
+            with self.cache.begin("http://x.org/3") as download:
+                pass
+
+        self.assertEqual(1, listdir.call_count)
+        self.assertEqual(
+            sum(os.path.getsize(os.path.join(self.cache.folder, name))
+                for name in os.listdir(self.cache.folder)),
+            self.cache._size,
+        )
+
+
+class TestRequestsGetWithCache(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        with open(os.path.join(self.folder, "a.xml"), "wb") as fp:
+            fp.write(b"<article/>")
+
+        self.requests = []
+        test = self
+
+        class Handler(server.SimpleHTTPRequestHandler):
+            def send_response(self, code, message=None):
+                test.requests.append(code)
+                super().send_response(code, message)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = server.ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            functools.partial(Handler, directory=self.folder))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.uri = "http://127.0.0.1:%s/a.xml" % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_requests_get_content_revalidates_cached_content(self):
+        cache = http_cache.HTTPCache(tempfile.mkdtemp())
+
+        self.assertEqual(
+            "<article/>", reqs.requests_get_content(self.uri, cache=cache))
+        self.assertEqual(
+            "<article/>", reqs.requests_get_content(self.uri, cache=cache))
+        self.assertEqual([200, 304], self.requests)
+
+    def test_requests_get_raises_http_errors(self):
+        cache = http_cache.HTTPCache(tempfile.mkdtemp())
+
+        with self.assertRaises(exceptions.SPSHTTPResourceNotFoundError):
+            reqs.requests_get(self.uri + ".missing", cache=cache)
+        self.assertEqual([], os.listdir(cache.folder))
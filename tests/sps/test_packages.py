@@ -1,5 +1,7 @@
-from unittest import TestCase
+from unittest import TestCase, mock
+from zipfile import ZipFile
 
+from packtools import file_utils
 from packtools.sps.models import packages
 
 
@@ -132,6 +134,38 @@ class Test_group_files_by_xml_filename(TestCase):
         self.assertEqual(pkg1._assets, result["a1"]._assets)
         self.assertEqual(pkg1._renditions, result["a1"]._renditions)
 
+    def test__group_files_by_xml_filename_gives_files_to_the_first_xml(self):
+        xmls = ["a1-b.xml", "a1.xml"]
+        files = [
+            "a1-b-gf01.tif",
+            "a1-b.pdf",
+            "a1-gf01.tif",
+            "a1.pdf",
+            "a1-b.xml",
+            "a1.xml",
+            "b1.pdf",
+        ]
+        result = packages._group_files_by_xml_filename("source", xmls, files)
+        self.assertEqual(
+            {"a1-b-gf01.tif": "a1-b-gf01.tif"}, result["a1-b"]._assets)
+        self.assertEqual({"original": "a1-b.pdf"}, result["a1-b"]._renditions)
+        self.assertEqual({"a1-gf01.tif": "a1-gf01.tif"}, result["a1"]._assets)
+        self.assertEqual({"original": "a1.pdf"}, result["a1"]._renditions)
+        self.assertEqual(["a1-b.xml", "a1.xml", "b1.pdf"], files)
+
+    def test__group_files_by_xml_filename_in_reverse_order(self):
+        xmls = ["a1.xml", "a1-b.xml"]
+        files = ["a1-b-gf01.tif", "a1-b.pdf", "a1-gf01.tif"]
+        result = packages._group_files_by_xml_filename("source", xmls, files)
+        self.assertEqual(
+            {
+                "a1-b-gf01.tif": "a1-b-gf01.tif",
+                "a1-b.pdf": "a1-b.pdf",
+                "a1-gf01.tif": "a1-gf01.tif",
+            },
+            result["a1"]._assets)
+        self.assertEqual({}, result["a1-b"]._assets)
+
 
 class TestZipFile(TestCase):
 
@@ -330,3 +364,54 @@ class TestFolder(TestCase):
             pkg2._renditions,
             result["2318-0889-tinf-33-e200068"]._renditions
         )
+
+
+class TestPackageReader(TestCase):
+
+    def test_packages_of_zipfile_share_the_opened_zipfile(self):
+        source = "./tests/sps/fixtures/package_with_subdir.zip"
+        with mock.patch.object(
+                file_utils, "ZipFile", wraps=ZipFile) as mk_zipfile:
+            with file_utils.ArchiveReader(source) as reader:
+                result = packages.explore_source(source, reader)
+                contents = [pkg.xml_content for pkg in result.values()]
+                pdf = result["2318-0889-tinf-33-e200025"].get_rendition_content(
+                    "original")
+        self.assertEqual(1, mk_zipfile.call_count)
+        self.assertTrue(all(pkg.reader is reader for pkg in result.values()))
+        self.assertTrue(contents[0].startswith(b"<?xml"))
+        self.assertTrue(pdf.startswith(b"%PDF"))
+
+    def test_xml_content_of_zipfile_out_of_reader_context(self):
+        source = "./tests/sps/fixtures/package_with_subdir.zip"
+        result = packages.explore_source(source)
+        pkg = result["2318-0889-tinf-33-e200050"]
+        with ZipFile(source) as zf:
+            self.assertEqual(zf.read(pkg.xml), pkg.xml_content)
+
+    def test_xml_content_of_folder(self):
+        source = "./tests/sps/fixtures/package_folder"
+        result = packages.explore_source(source)
+        pkg = result["2318-0889-tinf-33-e200068"]
+        with open(pkg.xml, "rb") as fp:
+            self.assertEqual(fp.read(), pkg.xml_content)
+        self.assertIsNone(pkg.get_asset_content("missing.tif"))
+
+    def test_nested_reader_contexts_keep_the_zipfile_open(self):
+        reader = file_utils.ArchiveReader(
+            "./tests/sps/fixtures/package_with_subdir.zip")
+        with reader:
+            with reader:
+                pass
+            self.assertIsNotNone(reader._zip_file)
+        self.assertIsNone(reader._zip_file)
+
+    def test_close_without_open_is_ignored(self):
+        reader = file_utils.ArchiveReader(
+            "./tests/sps/fixtures/package_with_subdir.zip")
+        reader.close()
+        with reader:
+            self.assertIsNotNone(reader._zip_file)
+        self.assertIsNone(reader._zip_file)
+        reader.close()
+        self.assertEqual(0, reader._users)
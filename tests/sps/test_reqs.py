@@ -0,0 +1,106 @@
+import tempfile
+import threading
+from http import server
+from unittest import TestCase
+
+from packtools.sps import exceptions
+from packtools.sps.libs import http_cache, reqs
+
+
+class _Handler(server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # caminho: status das respostas seguintes
+    statuses = {}
+
+    def do_GET(self):
+        if self.path == "/truncated.xml":
+            # a conexão é encerrada no meio do conteúdo
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.write(b"9\r\n<article>\r\n")
+            self.close_connection = True
+            return
+        statuses = self.statuses.get(self.path) or [200]
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        body = ("<article>%s</article>" % self.path).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestReqs(TestCase):
+
+    def setUp(self):
+        _Handler.statuses = {}
+        self.server = server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_uri = "http://127.0.0.1:%s" % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _get_pool_stats(self):
+        for stats in reqs.get_pool_stats():
+            if stats["port"] == self.server.server_port:
+                return stats
+
+    def test_requests_get_reuses_connections(self):
+        for i in range(5):
+            reqs.requests_get("%s/%s.xml" % (self.base_uri, i))
+
+        stats = self._get_pool_stats()
+        self.assertEqual("127.0.0.1", stats["host"])
+        self.assertEqual(1, stats["num_connections"])
+        self.assertEqual(5, stats["num_requests"])
+        self.assertEqual(reqs.POOL_MAXSIZE, stats["maxsize"])
+
+    def test_requests_get_retries_temporary_failures(self):
+        _Handler.statuses = {"/a.xml": [503, 200]}
+
+        self.assertEqual(
+            "<article>/a.xml</article>",
+            reqs.requests_get_content(self.base_uri + "/a.xml"))
+
+    def test_requests_get_raises_error_after_max_retries(self):
+        _Handler.statuses = {"/a.xml": [503]}
+        with self.assertRaises(exceptions.SPSHTTPServiceUnavailableError):
+            reqs.requests_get(self.base_uri + "/a.xml")
+
+    def test_get_many_returns_the_results_in_order(self):
+        _Handler.statuses = {"/missing.xml": [404]}
+        uris = ["%s/%s.xml" % (self.base_uri, name)
+                for name in ("a", "missing", "b", "c")]
+
+        results = reqs.get_many(uris, max_workers=3)
+
+        self.assertEqual(uris, [result["uri"] for result in results])
+        self.assertEqual(b"<article>/a.xml</article>", results[0]["content"])
+        self.assertIsNone(results[0]["error"])
+        self.assertIsNone(results[1]["content"])
+        self.assertIsInstance(
+            results[1]["error"], exceptions.SPSHTTPResourceNotFoundError)
+        self.assertEqual(b"<article>/c.xml</article>", results[3]["content"])
+        self.assertLessEqual(self._get_pool_stats()["num_connections"], 3)
+
+    def test_requests_get_raises_connection_error_for_truncated_content(self):
+        with self.assertRaises(exceptions.SPSConnectionError):
+            reqs.requests_get(self.base_uri + "/truncated.xml")
+
+    def test_requests_get_through_cache_raises_connection_error_for_truncated_content(self):
+        cache = http_cache.HTTPCache(tempfile.mkdtemp())
+        with self.assertRaises(exceptions.SPSConnectionError):
+            reqs.requests_get(self.base_uri + "/truncated.xml", cache=cache)
+        self.assertIsNone(cache.get(self.base_uri + "/truncated.xml"))
+
+    def test_requests_get_through_cache_raises_http_error_for_unexpected_status(self):
+        _Handler.statuses = {"/a.xml": [206]}
+        cache = http_cache.HTTPCache(tempfile.mkdtemp())
+        with self.assertRaises(exceptions.SPSHTTPError):
+            reqs.requests_get(self.base_uri + "/a.xml", cache=cache)
+        self.assertIsNone(cache.get(self.base_uri + "/a.xml"))
@@ -3,8 +3,15 @@ from packtools.sps.exceptions import SPSXMLFileError
 from packtools.sps.models import sps_package
 from packtools.sps import sps_maker
 
+import asyncio
 import os
+import tempfile
+import threading
 import zipfile
+from concurrent import futures
+from http import server
+
+from aiohttp import web
 
 
 class Test_get_xml_uri_and_name(TestCase):
@@ -335,3 +342,112 @@ class Test_get_canonical_files_paths(TestCase):
         obtained_file_names = sorted([os.path.basename(f) for f in sps_maker._get_canonical_files_paths(xml_sps, paths)])
 
         self.assertListEqual(expected_files_names, obtained_file_names)
+
+
+class Test_make_package_from_uris_async(TestCase):
+
+    async def _serve(self, coro_factory):
+        with open("./tests/sps/fixtures/document2.xml") as fp:
+            xml = fp.read()
+
+        async def handler(request):
+            if request.path.endswith(".xml"):
+                return web.Response(text=xml.replace(
+                    "https://minio.scielo.br", base_uri))
+            return web.Response(body=request.path.encode("utf-8"))
+
+        app = web.Application()
+        app.router.add_get("/{path:.*}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        base_uri = "http://127.0.0.1:%s" % site._server.sockets[0].getsockname()[1]
+        try:
+            return await coro_factory(base_uri)
+        finally:
+            await runner.cleanup()
+
+    def test_make_package_from_uris_async_builds_packages_concurrently(self):
+        zip_folders = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+
+        async def make_packages(base_uri):
+            return await asyncio.gather(*[
+                sps_maker.make_package_from_uris_async(
+                    base_uri + "/documents/%s.xml" % i, zip_folder=zip_folder)
+                for i, zip_folder in enumerate(zip_folders)
+            ])
+
+        results = asyncio.run(self._serve(make_packages))
+
+        for zip_folder, result in zip(zip_folders, results):
+            with self.subTest(zip_folder):
+                self.assertEqual(zip_folder, os.path.dirname(result["zip"]))
+                with zipfile.ZipFile(result["zip"]) as zf:
+                    self.assertEqual(
+                        sorted([
+                            '1414-431X-bjmbr-54-10-e11439.xml',
+                            '1414-431X-bjmbr-54-10-e11439-gf01.jpg',
+                            '1414-431X-bjmbr-54-10-e11439-gf01-scielo-267x140.jpg',
+                            '1414-431X-bjmbr-54-10-e11439-gf02.jpg',
+                            '1414-431X-bjmbr-54-10-e11439-gf02-scielo-267x140.jpg',
+                        ]),
+                        sorted(zf.namelist()),
+                    )
+
+
+class Test_make_package_from_uris_event_loop(TestCase):
+
+    def setUp(self):
+        with open("./tests/sps/fixtures/document2.xml") as fp:
+            xml = fp.read()
+        test = self
+
+        class Handler(server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.endswith(".xml"):
+                    body = xml.replace(
+                        "https://minio.scielo.br", test.base_uri).encode("utf-8")
+                else:
+                    body = self.path.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_uri = "http://127.0.0.1:%s" % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_make_package_from_uris_keeps_the_event_loop_of_the_thread(self):
+        def make_packages():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                results = [
+                    sps_maker.make_package_from_uris(
+                        self.base_uri + "/documents/%s.xml" % i,
+                        zip_folder=tempfile.mkdtemp())
+                    for i in range(2)
+                ]
+                return results, loop, asyncio.get_event_loop()
+            finally:
+                asyncio.set_event_loop(None)
+                loop.close()
+
+        # uma thread nova, cujo event loop não foi alterado por outros testes
+        with futures.ThreadPoolExecutor(max_workers=1) as executor:
+            results, loop, current_loop = executor.submit(make_packages).result()
+
+        self.assertIs(loop, current_loop)
+        for result in results:
+            with zipfile.ZipFile(result["zip"]) as zf:
+                self.assertIn(
+                    '1414-431X-bjmbr-54-10-e11439.xml', zf.namelist())
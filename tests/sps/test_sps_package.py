@@ -838,6 +838,20 @@ class TestSPS_Package(TestCase):
         self.assertEqual(expected[0][0], result[0].filename)
         self.assertEqual(type(expected[0][1]), type(result[0].asset_node))
 
+    def test_assets_are_indexed_on_first_access(self):
+        self.assertIsNone(self.xml_sps_3._assets)
+        assets = self.xml_sps_3.assets
+        self.assertIs(assets, self.xml_sps_3.assets)
+
+    def test_assets_are_indexed_before_local_to_remote(self):
+        self.xml_sps_3.local_to_remote([
+            {"name": "document3-xdadaf.jpg", "uri": "https://x.org/a.jpg"}
+        ])
+        result = self.xml_sps_3.assets.items
+        self.assertEqual("document3-xdadaf.jpg", result[0].filename)
+        self.assertEqual("https://x.org/a.jpg", result[0].xlink_href)
+
+
 
 class Test_sps_package(TestCase):
 
@@ -3,6 +3,12 @@ from __future__ import unicode_literals
 import os
 import unittest
 import io
+import json
+
+try:
+    from unittest import mock
+except:
+    import mock
 
 from lxml import etree
 
@@ -505,3 +511,123 @@ class CountryCodesTests(unittest.TestCase):
         self.assertEqual(len(err_list), 1)
         self.assertTrue("country" in err_list[0].message)
 
+
+    def test_codes_are_loaded_once(self):
+        affs = b''.join(
+            b'<aff id="aff%d"><country country="BR">Brasil</country></aff>' % i
+            for i in range(200))
+        sample = io.BytesIO(
+            b'<article><front><article-meta>%s</article-meta></front></article>' % affs)
+        et = etree.parse(sample)
+
+        checks.reload_iso3166_codes()
+        with mock.patch.object(checks.json, 'load', wraps=json.load) as load:
+            _, err_list = checks.country_code((et, []))
+
+        self.assertEqual(len(err_list), 0)
+        self.assertEqual(load.call_count, 0)
+
+
+class ISO3166CodesSetTests(unittest.TestCase):
+
+    def test_returns_frozenset(self):
+        self.assertIsInstance(checks.ISO3166_CODES_SET(), frozenset)
+
+    def test_returns_the_same_object(self):
+        self.assertIs(checks.ISO3166_CODES_SET(), checks.ISO3166_CODES_SET())
+
+    def test_reload_replaces_the_shared_set(self):
+        codes = checks.ISO3166_CODES_SET()
+        reloaded = checks.reload_iso3166_codes()
+
+        self.assertIsNot(codes, reloaded)
+        self.assertEqual(codes, reloaded)
+        self.assertIs(checks.ISO3166_CODES_SET(), reloaded)
+
+
+class FusedStyleCheckingPipelineTests(unittest.TestCase):
+
+    def _run(self, pipeline, et):
+        return next(pipeline.run(et, rewrap=True))
+
+    def test_same_errors_as_the_default_pipeline(self):
+        sample = io.BytesIO(b"""
+        <article>
+          <front>
+            <article-meta>
+              <aff id="aff1"><country country="INVALID">Brasil</country></aff>
+              <funding-group>
+                <award-group award-type="contract">
+                  <funding-source>CNPq</funding-source>
+                  <award-id>12345</award-id>
+                </award-group>
+              </funding-group>
+            </article-meta>
+          </front>
+          <back>
+            <fn-group>
+              <fn fn-type="financial-disclosure"><p>Funded by FAPESP</p></fn>
+            </fn-group>
+          </back>
+        </article>
+        """)
+        et = etree.parse(sample)
+
+        expected = self._run(checks.StyleCheckingPipeline(), et)
+        result = self._run(checks.FusedStyleCheckingPipeline(), et)
+
+        self.assertEqual(len(expected), 3)
+        self.assertEqual([(err.message, err.line) for err in result],
+                         [(err.message, err.line) for err in expected])
+
+    def test_extra_checks_visit_elements_in_document_order(self):
+        visited = []
+
+        class CollectXrefs(checks.ElementCheck):
+            tags = ('xref',)
+            attributes = ('rid',)
+
+            def visit(self, elem):
+                visited.append(elem.get('rid'))
+
+        sample = io.BytesIO(b"""
+        <article>
+          <body>
+            <p><xref rid="a1"/></p>
+            <fig rid="a2"/>
+            <p><xref rid="a3"/></p>
+          </body>
+        </article>
+        """)
+        et = etree.parse(sample)
+        self._run(checks.FusedStyleCheckingPipeline(CollectXrefs), et)
+
+        self.assertEqual(visited, ['a1', 'a2', 'a3'])
+
+    def test_extra_checks_report_errors(self):
+
+        class NoBold(checks.ElementCheck):
+            tags = ('bold',)
+
+            def __init__(self, et):
+                super(NoBold, self).__init__(et)
+                self.count = 0
+
+            def visit(self, elem):
+                self.count += 1
+
+            def finalize(self, err_list):
+                if self.count:
+                    err = checks.StyleError()
+                    err.message = "Element 'bold': This element is not allowed."
+                    err_list.append(err)
+
+        sample = io.BytesIO(b"""
+        <!DOCTYPE article PUBLIC "-//NLM//DTD JATS (Z39.96) Journal Publishing DTD v1.0 20120330//EN" "JATS-journalpublishing1.dtd">
+        <article><body><p><bold>x</bold><bold>y</bold></p></body></article>
+        """)
+        et = etree.parse(sample)
+        err_list = self._run(checks.FusedStyleCheckingPipeline(NoBold), et)
+
+        self.assertEqual([err.message for err in err_list],
+                         ["Element 'bold': This element is not allowed."])
@@ -6,7 +6,7 @@ import os
 from tempfile import NamedTemporaryFile
 from lxml import etree
 
-from packtools import domain
+from packtools import domain, exceptions
 
 
 NAMESPACES = {
@@ -150,6 +150,48 @@ class HTMLGeneratorTests(unittest.TestCase):
 
         self.assertRaises(ValueError, lambda: gen.generate('ru'))
 
+    def test_generate_all(self):
+        sample = u"""<article xml:lang="pt">
+                       <sub-article xml:lang="en" article-type="translation" id="S01">
+                       </sub-article>
+                       <sub-article xml:lang="es" article-type="translation" id="S02">
+                       </sub-article>
+                    </article>
+                 """
+        et = get_xml_tree_from_string(sample)
+        gen = domain.HTMLGenerator.parse(et, valid_only=False)
+
+        expected = [(lang, etree.tostring(html)) for lang, html in gen]
+        result = [(lang, etree.tostring(html))
+                  for lang, html in gen.generate_all(max_workers=3)]
+
+        self.assertEqual([lang for lang, _ in result], ['pt', 'en', 'es'])
+        self.assertEqual(result, expected)
+
+    def test_generate_all_yields_the_pairs_of_iter(self):
+        et = get_xml_tree_from_file('article-abstract-en-sub-articles-pt-es.xml')
+        for xslt in ('2.0', '3.0'):
+            gen = domain.HTMLGenerator.parse(et, valid_only=False, xslt=xslt)
+
+            expected = [(lang, etree.tostring(html)) for lang, html in gen]
+            result = [(lang, etree.tostring(html))
+                      for lang, html in gen.generate_all(max_workers=4)]
+
+            self.assertEqual([lang for lang, _ in expected], ['en', 'pt', 'es'])
+            self.assertEqual(result, expected)
+
+    def test_generate_all_missing_main_language(self):
+        sample = u"""<article>
+                       <sub-article xml:lang="en" article-type="translation" id="S01">
+                       </sub-article>
+                    </article>
+                 """
+        et = get_xml_tree_from_string(sample)
+        gen = domain.HTMLGenerator.parse(et, valid_only=False)
+
+        self.assertRaises(exceptions.HTMLGenerationError,
+                          lambda: list(gen.generate_all()))
+
     def test_no_abstract_title_if_there_is_a_title_for_abstract(self):
         sample = u"""<article
                       xmlns:mml="http://www.w3.org/1998/Math/MathML"
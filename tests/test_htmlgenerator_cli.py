@@ -0,0 +1,123 @@
+# coding: utf-8
+from __future__ import unicode_literals
+import unittest
+import argparse
+import io
+import os
+import sys
+import shutil
+import tempfile
+from contextlib import redirect_stdout, redirect_stderr
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from packtools import domain, htmlgenerator
+
+
+SAMPLES_PATH = os.path.join(os.path.dirname(__file__), 'samples')
+
+SAMPLES = [
+    'article-abstract-en-sub-articles-pt-es.xml',
+    '0034-7094-rba-69-03-0227.xml',
+]
+
+
+class MainJobsTests(unittest.TestCase):
+
+    def _copy_samples(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        for name in SAMPLES:
+            shutil.copy(os.path.join(SAMPLES_PATH, name), folder)
+        return folder
+
+    def _main(self, *args):
+        folder = self._copy_samples()
+        argv = ['htmlgenerator', '--nonetwork', '--nochecks'] + list(args)
+        argv += [os.path.join(folder, name) for name in SAMPLES]
+        out = io.StringIO()
+        with mock.patch.object(sys, 'argv', argv), \
+                mock.patch.object(htmlgenerator.pkg_resources,
+                                  'get_distribution'), \
+                redirect_stdout(out), redirect_stderr(io.StringIO()):
+            htmlgenerator.main()
+
+        outputs = {}
+        for name in os.listdir(folder):
+            if name.endswith('.html'):
+                with open(os.path.join(folder, name), 'rb') as fp:
+                    outputs[name] = fp.read()
+        printed = sorted(
+            os.path.basename(line.split()[-1])
+            for line in out.getvalue().splitlines())
+        return outputs, printed
+
+    def test_jobs_output_equals_serial_output(self):
+        serial_outputs, serial_printed = self._main('--jobs', '1')
+        # the worker processes print to their own copies of stdout
+        outputs, _ = self._main('--jobs', '2')
+
+        self.assertEqual(sorted(serial_outputs), serial_printed)
+        self.assertIn('0034-7094-rba-69-03-0227.pt.html', serial_outputs)
+        self.assertIn('0034-7094-rba-69-03-0227.pt.3_0.html', serial_outputs)
+        self.assertEqual(serial_outputs, outputs)
+
+
+class GenerateDocumentFilesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        shutil.copy(os.path.join(SAMPLES_PATH, SAMPLES[0]), self.folder)
+        self.xml = os.path.join(self.folder, SAMPLES[0])
+        self.config = argparse.Namespace(
+            nonetwork=True, nochecks=True, css='', print_css='', js='',
+            math_elem_preference='mml:math', math_js='', permlink='',
+            url_article_page='', url_download_ris='', gs_abstract=False,
+            output_style='', bootstrap_css='', article_css='',
+            design_system_static_img_path='img')
+
+    def _generate(self, max_workers):
+        with mock.patch.object(htmlgenerator, 'parse_xml',
+                               wraps=htmlgenerator.parse_xml) as parse_xml, \
+                redirect_stdout(io.StringIO()):
+            htmlgenerator.generate_document_files(
+                self.config, ['2.0', '3.0'], self.xml,
+                max_workers=max_workers)
+
+        outputs = {}
+        for name in os.listdir(self.folder):
+            if name.endswith('.html'):
+                with open(os.path.join(self.folder, name), 'rb') as fp:
+                    outputs[name] = fp.read()
+                os.unlink(os.path.join(self.folder, name))
+        return parse_xml.call_count, outputs
+
+    def test_xml_is_parsed_once(self):
+        call_count, outputs = self._generate(max_workers=None)
+
+        self.assertEqual(call_count, 1)
+        self.assertEqual(len(outputs), 6)
+
+    def test_threaded_output_equals_sequential_output(self):
+        self.assertEqual(self._generate(max_workers=None),
+                         self._generate(max_workers=1))
+
+    def _generate_all_max_workers(self, xslt_versions):
+        with mock.patch.object(
+                domain.HTMLGenerator, 'generate_all', autospec=True,
+                side_effect=domain.HTMLGenerator.generate_all) as generate_all, \
+                redirect_stdout(io.StringIO()):
+            htmlgenerator.generate_document_files(
+                self.config, xslt_versions, self.xml)
+        return [call[1]['max_workers']
+                for call in generate_all.call_args_list]
+
+    def test_thread_pools_are_not_nested(self):
+        # the versions are rendered concurrently, their languages in turn
+        self.assertEqual(
+            self._generate_all_max_workers(['2.0', '3.0']), [1, 1])
+        # the languages of a single version are rendered concurrently
+        self.assertEqual(self._generate_all_max_workers(['3.0']), [None])
@@ -2,8 +2,12 @@
 from __future__ import unicode_literals
 import unittest
 import io
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
-from lxml import etree
+from lxml import etree, isoschematron
 
 from packtools import style_errors
 
@@ -51,3 +55,135 @@ class SearchElementFunctionTests(unittest.TestCase):
         fp = etree.parse(io.BytesIO(b'<a>\n<b>bar</b>\n</a>'))
         self.assertRaises(ValueError, lambda: style_errors.search_element(fp, 'c', 2))
 
+
+sample_sch = b'''\
+<schema xmlns="http://purl.oclc.org/dsdl/schematron">
+  <pattern id="percent_is_lower_than_50">
+    <rule context="Percent">
+      <assert test=". &lt; 50">Element 'Percent': Value is too high.</assert>
+    </rule>
+  </pattern>
+</schema>
+'''
+
+
+class SchematronStyleErrorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = etree.parse(io.BytesIO(
+            b'<Total><Percent>60</Percent><Percent>70</Percent></Total>'))
+        self.sch = isoschematron.Schematron(
+                etree.parse(io.BytesIO(sample_sch)))
+        self.sch.validate(self.doc)
+
+    def test_message(self):
+        error = style_errors.SchematronStyleError(self.sch.error_log[0])
+        self.assertEqual(error.message, "Element 'Percent': Value is too high.")
+
+    def test_get_apparent_element(self):
+        error = style_errors.SchematronStyleError(self.sch.error_log[1])
+        self.assertEqual(error.get_apparent_element(self.doc).text, '70')
+
+    def test_iter_schematron_errors(self):
+        errors = list(style_errors.iter_schematron_errors(self.sch.error_log,
+            label='foo'))
+        self.assertEqual(len(errors), 2)
+        self.assertEqual([err.label for err in errors], ['foo', 'foo'])
+        self.assertEqual([err.get_apparent_element(self.doc).text
+                          for err in errors], ['60', '70'])
+
+    def test_iter_schematron_errors_locations_are_known(self):
+        errors = list(style_errors.iter_schematron_errors(self.sch.error_log))
+        self.assertEqual([err._location for err in errors],
+                         ['/Total/Percent[1]', '/Total/Percent[2]'])
+
+
+class ElementIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = etree.parse(io.BytesIO(
+            b'<a>\n<b>bar</b>\n<b>baz</b><c/>\n<x:b xmlns:x="ns"/>\n</a>'))
+        self.index = style_errors.ElementIndex(self.doc)
+
+    def test_element_at_line(self):
+        elem = self.index.element_at_line(3)
+        self.assertEqual(elem.tag, 'b')
+        self.assertEqual(elem.text, 'baz')
+
+    def test_element_at_missing_line(self):
+        self.assertRaises(ValueError, lambda: self.index.element_at_line(10))
+
+    def test_search_by_name(self):
+        elem = self.index.search('//b')
+        self.assertEqual(elem.text, 'bar')
+
+    def test_search_by_name_and_line(self):
+        elem = self.index.search('//c', 3)
+        self.assertEqual(elem.tag, 'c')
+
+    def test_search_by_name_ignores_namespaced_elements(self):
+        self.assertRaises(ValueError, lambda: self.index.search('//b', 4))
+
+    def test_search_by_location(self):
+        elem = self.index.search('/a/b[2]')
+        self.assertEqual(elem.text, 'baz')
+
+    def test_search_missing(self):
+        self.assertRaises(ValueError, lambda: self.index.search('//d'))
+
+    def test_same_results_as_search_element(self):
+        for xpath, line in [('//b', None), ('//b', 2), ('//b', 3),
+                            ('/a/c', None), ('//a', 1)]:
+            self.assertIs(self.index.search(xpath, line),
+                          style_errors.search_element(self.doc, xpath, line))
+
+
+class GetApparentElementIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = etree.parse(io.BytesIO(b'<a>\n<b>bar</b>\n</a>'))
+        self.error = style_errors.SchemaStyleError(
+            mock.Mock(message='error', line=2))
+
+    def test_given_index_is_used(self):
+        index = style_errors.ElementIndex(self.doc)
+        with mock.patch.object(index, 'element_at_line') as element_at_line:
+            self.error.get_apparent_element(self.doc, index)
+        element_at_line.assert_called_once_with(2)
+
+    def test_index_of_another_doc_is_not_used(self):
+        other_doc = etree.parse(io.BytesIO(b'<a>\n<c>bar</c>\n</a>'))
+        index = style_errors.ElementIndex(other_doc)
+        elem = self.error.get_apparent_element(self.doc, index)
+        self.assertEqual(elem.tag, 'b')
+
+    def test_no_index_is_kept_between_calls(self):
+        self.assertEqual(self.error.get_apparent_element(self.doc).tag, 'b')
+        self.doc.getroot().remove(self.doc.getroot()[0])
+        self.assertRaises(ValueError,
+                          lambda: self.error.get_apparent_element(self.doc))
+
+
+class GetApparentElementDispatchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = etree.parse(io.BytesIO(b'<a>\n<b>bar</b>\n</a>'))
+        self.index = style_errors.ElementIndex(self.doc)
+
+    def test_index_is_given_to_the_implementations_of_the_module(self):
+        error = style_errors.SchemaStyleError(
+            mock.Mock(message='error', line=2))
+        with mock.patch.object(self.index, 'element_at_line') as element_at_line:
+            style_errors.get_apparent_element(error, self.doc, self.index)
+        element_at_line.assert_called_once_with(2)
+
+    def test_overrides_without_index_are_still_supported(self):
+        class LegacyError(style_errors.StyleErrorBase):
+            message = 'error'
+
+            def get_apparent_element(self, doc):
+                return doc.getroot()
+
+        elem = style_errors.get_apparent_element(
+            LegacyError(), self.doc, self.index)
+        self.assertEqual(elem.tag, 'a')
@@ -0,0 +1,72 @@
+# coding: utf-8
+from __future__ import unicode_literals
+import unittest
+import io
+import os
+import sys
+import shutil
+import tempfile
+from contextlib import redirect_stdout, redirect_stderr
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from packtools import stylechecker
+
+
+SAMPLES_PATH = os.path.join(os.path.dirname(__file__), 'samples')
+SPS_FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'sps', 'fixtures')
+
+
+class MainJobsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        malformed = os.path.join(self.tmpdir, 'malformed.xml')
+        with open(malformed, 'w') as fp:
+            fp.write('<article>')
+
+        self.files = [
+            os.path.join(SAMPLES_PATH, '0034-7094-rba-69-03-0227.xml'),
+            malformed,
+            os.path.join(SAMPLES_PATH,
+                         'article-abstract-en-sub-articles-pt-es.xml'),
+            # unsupported SPS version
+            os.path.join(SAMPLES_PATH, '0034-8910-rsp-48-2-0206.xml'),
+            os.path.join(SPS_FIXTURES_PATH, 'document2.xml'),
+        ]
+
+    def _main(self, *args):
+        argv = ['stylechecker', '--nonetwork', '--nocolors'] + list(args)
+        argv += self.files
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch.object(sys, 'argv', argv), \
+                mock.patch.object(stylechecker.pkg_resources,
+                                  'get_distribution'), \
+                redirect_stdout(out), redirect_stderr(err):
+            status = stylechecker._main()
+        return status, out.getvalue(), err.getvalue()
+
+    def test_jobs_output_equals_serial_output(self):
+        serial = self._main('--jobs', '1')
+        parallel = self._main('--jobs', '2')
+
+        self.assertEqual(serial, parallel)
+        self.assertEqual(serial[0], 1)
+        self.assertIn('malformed.xml', serial[2])
+        self.assertIn('0034-8910-rsp-48-2-0206.xml', serial[2])
+        self.assertIn('document2.xml', serial[1])
+
+    def test_unordered_output_has_the_same_results(self):
+        status, out, err = self._main('--jobs', '1', '--raw')
+        u_status, u_out, u_err = self._main('--jobs', '2', '--raw',
+                                            '--unordered')
+
+        self.assertEqual(status, u_status)
+        self.assertEqual(sorted(out.splitlines()),
+                         sorted(u_out.splitlines()))
+        self.assertEqual(len(out.splitlines()), 3)
+        self.assertEqual(err, u_err)
@@ -6,6 +6,7 @@ import tempfile
 import os
 import io
 import shutil
+import threading
 
 try:
     from unittest import mock
@@ -15,7 +16,7 @@ except:
 from PIL import Image, ImageFile
 from lxml import etree
 
-from packtools import utils, exceptions
+from packtools import utils, exceptions, catalogs
 
 
 BASE_XML = """<?xml version="1.0" encoding="UTF-8"?>
@@ -162,6 +163,29 @@ class XrayTests(unittest.TestCase):
                     {'xml': ['bar.xml', 'jar.XML']})
 
 
+class GetXMLParserTests(unittest.TestCase):
+    def test_parser_is_reused_for_the_same_options(self):
+        self.assertIs(utils.get_xml_parser(remove_blank_text=True),
+                      utils.get_xml_parser(remove_blank_text=True))
+
+    def test_parsers_differ_by_options(self):
+        self.assertIsNot(utils.get_xml_parser(collect_ids=True),
+                         utils.get_xml_parser(collect_ids=False))
+
+    def test_parsers_are_not_shared_between_threads(self):
+        parsers = []
+        thread = threading.Thread(
+                target=lambda: parsers.append(utils.get_xml_parser()))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(parsers[0], utils.get_xml_parser())
+
+    def test_xml_uses_the_parser_options(self):
+        et = utils.XML(io.BytesIO(b'<a>\n  <b>bar</b>\n</a>'))
+        self.assertEqual(etree.tostring(et), b'<a><b>bar</b></a>')
+
+
 class ResolveSchematronFilepathTests(unittest.TestCase):
     def setUp(self):
         from packtools.catalogs import catalog
@@ -189,6 +213,145 @@ class ResolveSchematronFilepathTests(unittest.TestCase):
                 lambda: utils.resolve_schematron_filepath(path))
 
 
+class SchematronCacheTests(unittest.TestCase):
+    sample_sch = b'''\
+<schema xmlns="http://purl.oclc.org/dsdl/schematron">
+  <pattern id="sum_equals_100_percent">
+    <title>Sum equals 100%.</title>
+    <rule context="Total">
+      <assert test="sum(//Percent)=100">Element 'Total': Sum is not 100%.</assert>
+    </rule>
+  </pattern>
+</schema>
+'''
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_validator_xslt_is_persisted(self):
+        utils.get_schematron_from_buffer(io.BytesIO(self.sample_sch),
+                cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_cached_validator_is_reused(self):
+        utils.get_schematron_from_buffer(io.BytesIO(self.sample_sch),
+                cache_dir=self.cache_dir)
+        sch = utils.get_schematron_from_buffer(io.BytesIO(self.sample_sch),
+                cache_dir=self.cache_dir)
+        self.assertIsInstance(sch, utils.PrecompiledSchematron)
+
+    def test_cached_validator_validates(self):
+        utils.get_schematron_from_buffer(io.BytesIO(self.sample_sch),
+                cache_dir=self.cache_dir)
+        sch = utils.get_schematron_from_buffer(io.BytesIO(self.sample_sch),
+                cache_dir=self.cache_dir)
+
+        invalid = etree.fromstring(b'<Total><Percent>20</Percent></Total>')
+        self.assertFalse(sch.validate(invalid))
+        self.assertEqual(len(sch.error_log), 1)
+
+        valid = etree.fromstring(b'<Total><Percent>100</Percent></Total>')
+        self.assertTrue(sch.validate(valid))
+
+    def test_cache_is_disabled_without_cache_dir(self):
+        sch = utils.get_schematron_from_buffer(io.BytesIO(self.sample_sch),
+                cache_dir='')
+        self.assertNotIsInstance(sch, utils.PrecompiledSchematron)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_cached_validator_reports_the_same_errors(self):
+        sch = utils.get_schematron_from_buffer(io.BytesIO(self.sample_sch),
+                cache_dir=self.cache_dir)
+        cached_sch = utils.get_schematron_from_buffer(
+                io.BytesIO(self.sample_sch), cache_dir=self.cache_dir)
+
+        invalid = etree.parse(io.BytesIO(
+            b'<Total><Percent>20</Percent></Total>'))
+        self.assertEqual(sch.validate(invalid), cached_sch.validate(invalid))
+        self.assertEqual([(err.message, err.line) for err in sch.error_log],
+                         [(err.message, err.line)
+                          for err in cached_sch.error_log])
+
+    def test_error_log_is_cleared_on_each_validation(self):
+        utils.get_schematron_from_buffer(io.BytesIO(self.sample_sch),
+                cache_dir=self.cache_dir)
+        sch = utils.get_schematron_from_buffer(io.BytesIO(self.sample_sch),
+                cache_dir=self.cache_dir)
+
+        sch.validate(etree.fromstring(b'<Total><Percent>20</Percent></Total>'))
+        sch.validate(etree.fromstring(b'<Total><Percent>100</Percent></Total>'))
+        self.assertEqual(len(sch.error_log), 0)
+
+    @unittest.skipIf(os.environ.get('PACKTOOLS_SCHEMATRON_CACHE_DIR'),
+                     'the cache is enabled by the environment')
+    def test_cache_is_disabled_by_default(self):
+        self.assertIsNone(catalogs.SCHEMATRON_CACHE_DIR)
+
+    def test_cache_dir_is_set_by_the_catalog(self):
+        sch_path = os.path.join(self.cache_dir, 'sample.sch')
+        with open(sch_path, 'wb') as fp:
+            fp.write(self.sample_sch)
+        xsl_dir = os.path.join(self.cache_dir, 'xsl')
+
+        with mock.patch.object(catalogs.catalog, 'SCHEMATRON_CACHE_DIR',
+                               xsl_dir):
+            utils.get_schematron_from_filepath(sch_path)
+        self.assertEqual(len(os.listdir(xsl_dir)), 1)
+
+
+class WebImageCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_get_missing_image(self):
+        image_cache = utils.WebImageCache(self.cache_dir)
+        key = image_cache.get_key("abc", ("PNG", None, None))
+        self.assertIsNone(image_cache.get(key))
+        self.assertEqual((image_cache.hits, image_cache.misses), (0, 1))
+
+    def test_get_image(self):
+        image_cache = utils.WebImageCache(self.cache_dir)
+        key = image_cache.get_key("abc", ("PNG", None, None))
+        image_cache.set(key, b"image bytes")
+        self.assertEqual(image_cache.get(key), b"image bytes")
+        self.assertEqual((image_cache.hits, image_cache.misses), (1, 0))
+
+    def test_set_image_from_file_object(self):
+        image_cache = utils.WebImageCache(self.cache_dir, max_size=100)
+        key = image_cache.get_key("abc", ("PNG", None, None))
+        image_cache.set(key, io.BytesIO(b"image bytes"))
+        self.assertEqual(image_cache.get(key), b"image bytes")
+        self.assertEqual(image_cache._size, 11)
+
+    def test_keys_differ_by_spec(self):
+        self.assertNotEqual(
+            utils.WebImageCache.get_key("abc", ("PNG", None, None)),
+            utils.WebImageCache.get_key("abc", ("JPEG", (267, 140), None)),
+        )
+
+    def test_least_recently_used_images_are_evicted(self):
+        image_cache = utils.WebImageCache(self.cache_dir, max_size=25)
+        keys = [image_cache.get_key(str(i), ("PNG", None, None)) for i in range(3)]
+        image_cache.set(keys[0], b"0" * 10)
+        image_cache.set(keys[1], b"1" * 10)
+        # makes the first image the most recently used
+        for i, key in enumerate(keys[:2]):
+            filepath = image_cache._get_filepath(key)
+            os.utime(filepath, (1000 - i * 100, 1000 - i * 100))
+        image_cache.get(keys[0])
+        image_cache.set(keys[2], b"2" * 10)
+
+        self.assertIsNotNone(image_cache.get(keys[0]))
+        self.assertIsNone(image_cache.get(keys[1]))
+        self.assertIsNotNone(image_cache.get(keys[2]))
+
+
 class TestWebImageGenerator(unittest.TestCase):
     def setUp(self):
         self.extracted_package = tempfile.mkdtemp(".")
@@ -432,6 +595,101 @@ class TestWebImageGenerator(unittest.TestCase):
         image_copy.save(image_expected, "PNG")
         self.assertEqual(result, image_expected.getvalue())
 
+    def test_get_png_bytes_after_thumbnail_bytes_of_non_rgb_image(self):
+        mocked_image_io = io.BytesIO()
+        mocked_image = Image.new("L", (500, 500))
+        mocked_image.save(mocked_image_io, "TIFF")
+        web_image_generator = utils.WebImageGenerator(
+            "image_tiff_1.tiff", ".", mocked_image_io.getvalue()
+        )
+        png_bytes = web_image_generator.get_png_bytes()
+        thumbnail_bytes = web_image_generator.get_thumbnail_bytes()
+
+        self.assertEqual(Image.open(io.BytesIO(png_bytes)).size, (500, 500))
+        self.assertEqual(Image.open(io.BytesIO(thumbnail_bytes)).size, (140, 140))
+        self.assertEqual(web_image_generator._image_object.mode, "RGB")
+
+    def test_get_png_bytes_from_file_stream(self):
+        mocked_image_io = io.BytesIO()
+        mocked_image = Image.new("L", (500, 500))
+        mocked_image.save(mocked_image_io, "TIFF")
+        expected = utils.WebImageGenerator(
+            "image_tiff_1.tiff", ".", mocked_image_io.getvalue()
+        ).get_png_bytes()
+
+        mocked_image_io.seek(0)
+        web_image_generator = utils.WebImageGenerator(
+            "image_tiff_1.tiff", ".", file_stream=mocked_image_io
+        )
+        png_file = io.BytesIO()
+        web_image_generator.write_png(png_file)
+        self.assertEqual(png_file.getvalue(), expected)
+
+    def test_write_thumbnail_decodes_jpeg_stream_reduced(self):
+        mocked_image_io = io.BytesIO()
+        mocked_image = Image.new("RGB", (2000, 1000))
+        mocked_image.save(mocked_image_io, "JPEG")
+        mocked_image_io.seek(0)
+        web_image_generator = utils.WebImageGenerator(
+            "image_jpg_3.jpg", ".", file_stream=mocked_image_io
+        )
+        image_object = web_image_generator._image_object
+        decoded_sizes = []
+
+        def thumbnail(size):
+            decoded_sizes.append(image_object.size)
+            Image.Image.thumbnail(image_object, size)
+
+        thumbnail_file = io.BytesIO()
+        with mock.patch.object(image_object, "thumbnail", side_effect=thumbnail):
+            web_image_generator.write_thumbnail(thumbnail_file)
+
+        # the image was decoded at half of its size
+        self.assertEqual(decoded_sizes, [(1000, 500)])
+        self.assertEqual(Image.open(thumbnail_file).size, (267, 134))
+
+    def test_write_thumbnail_decodes_tiff_stream_in_full(self):
+        mocked_image_io = io.BytesIO()
+        mocked_image = Image.new("RGB", (2000, 1000))
+        mocked_image.save(mocked_image_io, "TIFF")
+        mocked_image_io.seek(0)
+        web_image_generator = utils.WebImageGenerator(
+            "image_tiff_3.tiff", ".", file_stream=mocked_image_io
+        )
+        image_object = web_image_generator._image_object
+        decoded_sizes = []
+
+        def thumbnail(size):
+            decoded_sizes.append(image_object.size)
+            Image.Image.thumbnail(image_object, size)
+
+        thumbnail_file = io.BytesIO()
+        with mock.patch.object(image_object, "thumbnail", side_effect=thumbnail):
+            web_image_generator.write_thumbnail(thumbnail_file)
+
+        # TIFF has no draft mode, the image is decoded at its size
+        self.assertEqual(decoded_sizes, [(2000, 1000)])
+        self.assertEqual(Image.open(thumbnail_file).size, (267, 134))
+
+    def test_image_larger_than_max_pixels_is_refused(self):
+        mocked_image_io = io.BytesIO()
+        mocked_image = Image.new("RGB", (100, 100))
+        mocked_image.save(mocked_image_io, "TIFF")
+        mocked_image_io.seek(0)
+        for source in (
+            {"file_bytes": mocked_image_io.getvalue()},
+            {"file_stream": mocked_image_io},
+        ):
+            with self.assertRaises(exceptions.WebImageGeneratorError) as exc_info:
+                utils.WebImageGenerator(
+                    "image_tiff_1.tiff", ".", max_pixels=9999, **source
+                )
+            self.assertEqual(
+                str(exc_info.exception),
+                'Error reading image "image_tiff_1.tiff": 10000 pixels exceeds the '
+                "limit of 9999 pixels",
+            )
+
     def test_get_thumbnail_bytes_no_image_object(self):
         web_image_generator = utils.WebImageGenerator(
             "image_tiff_1.tiff", self.extracted_package
@@ -464,6 +722,36 @@ class TestWebImageGenerator(unittest.TestCase):
         self.assertEqual(result, image_expected.getvalue())
 
 
+class FilenameIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.filenames = [
+            "a-gf01.tif",
+            "a-gf01.tiff",
+            "a-gf01.png",
+            "a-gf010.jpg",
+            "a-e01.jpg",
+        ]
+        self.index = utils._FilenameIndex(self.filenames)
+
+    def test_contains(self):
+        self.assertIn("a-gf01.png", self.index)
+        self.assertNotIn("a-gf01", self.index)
+
+    def test_get_tiff_returns_the_first_tiff(self):
+        self.assertEqual(self.index.get_tiff("a-gf01"), "a-gf01.tif")
+        self.assertIsNone(self.index.get_tiff("a-e01"))
+
+    def test_search(self):
+        for text in ("a-gf01", "gf01.", "a-", "-e01.jpg", "f010", "", "x", "tif\0a"):
+            self.assertEqual(
+                list(self.index.search(text)),
+                [filename for filename in self.filenames if text in filename],
+            )
+
+    def test_search_without_filenames(self):
+        self.assertEqual(list(utils._FilenameIndex([]).search("")), [])
+
+
 class TestXMLWebOptimiser(unittest.TestCase):
     def setUp(self):
         graphic_01 = '<graphic xlink:href="1234-5678-rctb-45-05-0110-e01.tif"/>'
@@ -524,6 +812,9 @@ class TestXMLWebOptimiser(unittest.TestCase):
         self.assertEqual(self.xml_web_optimiser._optimised_assets, [])
         self.assertEqual(self.xml_web_optimiser._assets_thumbnails, [])
         self.assertFalse(self.xml_web_optimiser.stop_if_error)
+        self.assertEqual(
+            self.xml_web_optimiser.max_workers, min(4, os.cpu_count() or 1)
+        )
         self.assertEqual(self.xml_web_optimiser._read_file, self.mocked_read_file)
         self.assertEqual(
             etree.tostring(self.xml_web_optimiser._xml_file),
@@ -630,6 +921,216 @@ class TestXMLWebOptimiser(unittest.TestCase):
                     image.attrib["{http://www.w3.org/1999/xlink}href"], expected_href
                 )
 
+    def test_get_xml_file_reads_each_image_once(self):
+        read_file = mock.Mock(side_effect=self.mocked_read_file)
+        self.xml_web_optimiser._read_file = read_file
+        self.xml_web_optimiser.get_xml_file()
+
+        self.assertEqual(
+            sorted(call[0][0] for call in read_file.call_args_list),
+            [
+                "1234-5678-rctb-45-05-0110-e01.tif",
+                "1234-5678-rctb-45-05-0110-e02.tiff",
+                "1234-5678-rctb-45-05-0110-e04.tif",
+            ],
+        )
+        self.assertEqual(self.xml_web_optimiser._derived_thumbnails, {})
+
+    def test_get_xml_file_does_not_derive_thumbnails_not_requested(self):
+        graphic_01 = (
+            '<alternatives>'
+            '<graphic xlink:href="1234-5678-rctb-45-05-0110-e01.tif"/>'
+            '<graphic xlink:href="1234-5678-rctb-45-05-0110-e01.jpg" '
+            'content-type="scielo-267x140"/>'
+            '</alternatives>'
+        )
+        graphic_02 = '<inline-graphic xlink:href="1234-5678-rctb-45-05-0110-e02.tiff"/>'
+        xml_file = BASE_XML.format(graphic_01, graphic_02).encode("utf-8")
+        with open(os.path.join(self.work_dir, self.xml_filename), "wb") as fp:
+            fp.write(xml_file)
+        xml_web_optimiser = utils.XMLWebOptimiser(
+            self.xml_filename,
+            self.image_filenames,
+            self.mocked_read_file,
+            self.work_dir,
+        )
+
+        with mock.patch.object(
+            utils.WebImageGenerator,
+            "write_thumbnail",
+            autospec=True,
+            side_effect=utils.WebImageGenerator.write_thumbnail,
+        ) as mk_write_thumbnail:
+            xml_web_optimiser.get_xml_file()
+
+        self.assertIn(
+            "1234-5678-rctb-45-05-0110-e01.png",
+            [filename for filename, _ in xml_web_optimiser.get_optimised_assets()],
+        )
+        self.assertEqual(list(xml_web_optimiser.get_assets_thumbnails()), [])
+        mk_write_thumbnail.assert_not_called()
+
+    def test_max_workers_default_is_bounded(self):
+        for cpu_count, expected in ((None, 1), (2, 2), (64, utils.DEFAULT_MAX_WORKERS)):
+            with mock.patch.object(utils.os, "cpu_count", return_value=cpu_count):
+                xml_web_optimiser = utils.XMLWebOptimiser(
+                    self.xml_filename,
+                    self.image_filenames,
+                    self.mocked_read_file,
+                    self.work_dir,
+                )
+            self.assertEqual(xml_web_optimiser.max_workers, expected)
+
+    def test_get_xml_file_derives_images_concurrently(self):
+        xml_web_optimiser = utils.XMLWebOptimiser(
+            self.xml_filename,
+            self.image_filenames,
+            self.mocked_read_file,
+            self.work_dir,
+            max_workers=2,
+        )
+        # the first two images are only derived if both run at the same time
+        barrier = threading.Barrier(2, timeout=10)
+        calls = []
+        derive_web_images = xml_web_optimiser._derive_web_images
+
+        def derive_web_images_together(*args):
+            calls.append(args)
+            if len(calls) <= 2:
+                barrier.wait()
+            return derive_web_images(*args)
+
+        with mock.patch.object(
+            xml_web_optimiser,
+            "_derive_web_images",
+            side_effect=derive_web_images_together,
+        ):
+            xml_web_optimiser.get_xml_file()
+
+        self.assertFalse(barrier.broken)
+        self.assertEqual(
+            [filename for filename, _ in xml_web_optimiser.get_optimised_assets()],
+            [
+                "1234-5678-rctb-45-05-0110-e01.png",
+                "1234-5678-rctb-45-05-0110-e02.png",
+                "1234-5678-rctb-45-05-0110-e04.png",
+            ],
+        )
+
+    def test_get_xml_file_same_results_with_many_workers(self):
+        results = []
+        for max_workers in (1, 4):
+            xml_web_optimiser = utils.XMLWebOptimiser(
+                self.xml_filename,
+                self.image_filenames,
+                self.mocked_read_file,
+                self.work_dir,
+                max_workers=max_workers,
+            )
+            results.append(
+                (
+                    xml_web_optimiser.get_xml_file(),
+                    list(xml_web_optimiser.get_optimised_assets()),
+                    list(xml_web_optimiser.get_assets_thumbnails()),
+                )
+            )
+        self.assertEqual(results[0], results[1])
+
+    def test_get_xml_file_stop_if_error(self):
+        with open(
+            os.path.join(self.work_dir, "1234-5678-rctb-45-05-0110-e02.tiff"), "wb"
+        ) as fp:
+            fp.write(b"This is not an image")
+        xml_web_optimiser = utils.XMLWebOptimiser(
+            self.xml_filename,
+            self.image_filenames,
+            self.mocked_read_file,
+            self.work_dir,
+            stop_if_error=True,
+            max_workers=4,
+        )
+        self.assertRaises(
+            exceptions.WebImageGeneratorError, xml_web_optimiser.get_xml_file
+        )
+        self.assertEqual(
+            [filename for filename, _ in xml_web_optimiser.get_optimised_assets()],
+            ["1234-5678-rctb-45-05-0110-e01.png"],
+        )
+
+    def test_get_xml_file_with_image_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        image_cache = utils.WebImageCache(cache_dir)
+        results = []
+        for _ in range(2):
+            xml_web_optimiser = utils.XMLWebOptimiser(
+                self.xml_filename,
+                self.image_filenames,
+                self.mocked_read_file,
+                self.work_dir,
+                max_workers=1,
+                image_cache=image_cache,
+            )
+            with mock.patch.object(
+                utils.WebImageGenerator,
+                "_get_image_object",
+                autospec=True,
+                side_effect=utils.WebImageGenerator._get_image_object,
+            ) as mk_get_image_object:
+                xml = xml_web_optimiser.get_xml_file()
+            decoded = [
+                call[0][1] for call in mk_get_image_object.call_args_list
+                if call[0][1] is not None
+            ]
+            results.append(
+                (
+                    xml,
+                    list(xml_web_optimiser.get_optimised_assets()),
+                    list(xml_web_optimiser.get_assets_thumbnails()),
+                    len(decoded),
+                )
+            )
+
+        self.assertEqual(results[0][:3], results[1][:3])
+        # all the images have the same content, thus only the first is decoded
+        self.assertEqual(results[0][3], 1)
+        self.assertEqual(results[1][3], 0)
+        self.assertEqual((image_cache.hits, image_cache.misses), (6, 2))
+
+    def test_get_xml_file_with_open_file(self):
+        opened_files = []
+
+        def mocked_open_file(filename):
+            opened_files.append(io.BytesIO(self.mocked_read_file(filename)))
+            return opened_files[-1]
+
+        expected = (
+            self.xml_web_optimiser.get_xml_file(),
+            list(self.xml_web_optimiser.get_optimised_assets()),
+            list(self.xml_web_optimiser.get_assets_thumbnails()),
+        )
+        xml_web_optimiser = utils.XMLWebOptimiser(
+            self.xml_filename,
+            self.image_filenames,
+            self.mocked_read_file,
+            self.work_dir,
+            open_file=mocked_open_file,
+        )
+        xml = xml_web_optimiser.get_xml_file()
+        assets = []
+        for get_assets in (
+            xml_web_optimiser.get_optimised_assets,
+            xml_web_optimiser.get_assets_thumbnails,
+        ):
+            files = []
+            for filename, file_object in get_assets():
+                with file_object:
+                    files.append((filename, file_object.read()))
+            assets.append(files)
+
+        self.assertEqual((xml, assets[0], assets[1]), expected)
+        self.assertTrue(all(fp.closed for fp in opened_files))
+
     def test_get_optimised_assets_no_optimised_assets(self):
         self.xml_web_optimiser._optimised_assets = []
         result = self.xml_web_optimiser.get_optimised_assets()
@@ -1092,3 +1593,75 @@ class TestSPPackage(unittest.TestCase):
                     image_element.attrib["{http://www.w3.org/1999/xlink}href"],
                     expected_href,
                 )
+
+    def test_optimise_copies_files_left_keeping_their_zip_info(self):
+        self.sp_package.optimise()
+
+        with zipfile.ZipFile(self.optimised_package) as zf:
+            for filename in (
+                "1234-5678-rctb-45-05-0110.pdf",
+                "1234-5678-rctb-45-05-0110-gf03.tiff",
+            ):
+                zip_info = self.archive.getinfo(filename)
+                new_zip_info = zf.getinfo(filename)
+                self.assertEqual(new_zip_info.compress_type, zip_info.compress_type)
+                self.assertEqual(new_zip_info.compress_size, zip_info.compress_size)
+                self.assertEqual(new_zip_info.date_time, zip_info.date_time)
+                self.assertEqual(zf.read(filename), self.archive.read(filename))
+            self.assertIsNone(zf.testzip())
+
+    def test_optimise_copies_compressed_files_left_in_chunks(self):
+        content = b"<pdf/>" * 1024 * 1024
+        self.archive.close()
+        with zipfile.ZipFile(self.tmp_package, "a") as archive:
+            archive.writestr(
+                "1234-5678-rctb-45-05-0110-en.pdf", content, zipfile.ZIP_DEFLATED
+            )
+        self.archive = zipfile.ZipFile(self.tmp_package)
+        sp_package = utils.SPPackage(self.archive, self.extracted_package)
+
+        with mock.patch.object(
+            utils.zipfile.ZipFile, "read", autospec=True,
+            side_effect=zipfile.ZipFile.read,
+        ) as mk_read:
+            sp_package.optimise()
+
+        self.assertNotIn(
+            "1234-5678-rctb-45-05-0110-en.pdf",
+            [
+                getattr(call[0][1], "filename", call[0][1])
+                for call in mk_read.call_args_list
+            ],
+        )
+        with zipfile.ZipFile(self.optimised_package) as zf:
+            zip_info = zf.getinfo("1234-5678-rctb-45-05-0110-en.pdf")
+            self.assertEqual(zip_info.compress_type, zipfile.ZIP_DEFLATED)
+            self.assertLess(zip_info.compress_size, len(content))
+            self.assertEqual(zf.read("1234-5678-rctb-45-05-0110-en.pdf"), content)
+            self.assertIsNone(zf.testzip())
+
+    def test_optimise_extracts_all_files_of_new_package(self):
+        self.sp_package.optimise()
+
+        with zipfile.ZipFile(self.optimised_package) as zf:
+            self.assertEqual(
+                sorted(os.listdir(self.extracted_package)), sorted(zf.namelist())
+            )
+            for filename in zf.namelist():
+                with open(os.path.join(self.extracted_package, filename), "rb") as fp:
+                    self.assertEqual(fp.read(), zf.read(filename))
+
+    def test_optimise_streaming(self):
+        self.sp_package.optimise()
+        with zipfile.ZipFile(self.optimised_package) as zf:
+            expected = {filename: zf.read(filename) for filename in zf.namelist()}
+
+        new_package_file_path = self.extracted_package + "_streaming.zip"
+        sp_package = utils.SPPackage(
+            self.archive, self.extracted_package + "_streaming", streaming=True
+        )
+        sp_package.optimise(new_package_file_path)
+        with zipfile.ZipFile(new_package_file_path) as zf:
+            result = {filename: zf.read(filename) for filename in zf.namelist()}
+            self.assertIsNone(zf.testzip())
+        self.assertEqual(result, expected)
@@ -129,6 +129,29 @@ class XMLValidatorTests(unittest.TestCase):
 
         self.assertIn(u"<!-- SPS-ERROR: Element 'c': This element is not expected. Expected is ( b ). -->", xml_text.decode())
 
+    def test_write_annotated(self):
+        fp = etree.parse(io.BytesIO(b'<a><c>bar</c></a>'))
+        dtd = etree.XMLSchema(etree.parse(sample_xsd))
+        xml = domain.XMLValidator.parse(fp, no_doctype=True,
+                sps_version='sps-1.1', dtd=dtd)
+
+        buff = io.BytesIO()
+        xml.write_annotated(buff)
+
+        self.assertEqual(buff.getvalue(),
+                etree.tostring(xml.annotate_errors(), pretty_print=True,
+                    encoding=xml.encoding, xml_declaration=True))
+
+    def test_write_annotated_restores_the_source_tree(self):
+        fp = etree.parse(io.BytesIO(b'<a><c>bar</c></a>'))
+        dtd = etree.XMLSchema(etree.parse(sample_xsd))
+        xml = domain.XMLValidator.parse(fp, no_doctype=True,
+                sps_version='sps-1.1', dtd=dtd)
+
+        xml.write_annotated(io.BytesIO())
+
+        self.assertEqual(etree.tostring(fp), b'<a><c>bar</c></a>')
+
     def test_validation_schematron(self):
         fp = etree.parse(io.BytesIO(b'<Total><Percent>70</Percent><Percent>30</Percent></Total>'))
         schema = domain.SchematronValidator(